@@ -0,0 +1,41 @@
+"""
+Benchmark generating a site for a synthetic ancestry with different numbers of worker processes.
+
+Run this from the project's root directory with ``python -m benchmarks.generate``.
+"""
+import asyncio
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from betty.app import App
+from betty.generate import generate
+from betty.model.ancestry import Person, PersonName
+
+_PERSON_COUNT = 2000
+_JOBS = sorted({1, 2, 4, os.cpu_count() or 1})
+
+
+async def _generate(project_directory_path: Path, jobs: int) -> float:
+    app = App()
+    app.project.configuration.configuration_file_path = project_directory_path / 'betty.json'
+    people = []
+    for i in range(_PERSON_COUNT):
+        person = Person(f'I{i}')
+        PersonName(person, f'Jane {i}', 'Doe')
+        if i >= 2:
+            person.parents.append(people[i - 2], people[i - 1])
+        people.append(person)
+    app.project.ancestry.entities.append(*people)
+    with app:
+        start = perf_counter()
+        await generate(app, jobs=jobs)
+        return perf_counter() - start
+
+
+if __name__ == '__main__':
+    with TemporaryDirectory() as working_directory_path_str:
+        for jobs in _JOBS:
+            duration = asyncio.run(_generate(Path(working_directory_path_str), jobs))
+            print(f'Generated {_PERSON_COUNT:,} people with {jobs} job(s) in {duration:.2f} seconds.')
@@ -0,0 +1,74 @@
+"""
+Benchmark loading a synthetic Gramps family tree.
+
+Run this from the project's root directory with ``python -m benchmarks.gramps_loader``.
+"""
+import gzip
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import IO
+
+from betty.gramps.loader import load_gramps
+from betty.model.ancestry import Ancestry
+
+_PERSON_COUNT = 100000
+
+
+def _write_tree(f: IO[str], person_count: int) -> None:
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write('<database xmlns="http://gramps-project.org/xml/1.7.1/">\n')
+    f.write('<header><created date="2019-03-09" version="4.2.8"/></header>\n')
+
+    f.write('<events>\n')
+    for i in range(person_count):
+        f.write(
+            f'<event handle="_E{i}" id="E{i}"><type>Birth</type><dateval val="1970-01-{i % 28 + 1:02d}"/>'
+            f'<place hlink="_P{i % 100}"/><description>Birth of Jane {i}</description>'
+            f'<citationref hlink="_C{i % 100}"/></event>\n'
+        )
+    f.write('</events>\n')
+
+    f.write('<people>\n')
+    for i in range(person_count):
+        f.write(
+            f'<person handle="_I{i}" id="I{i}"><gender>F</gender>'
+            f'<name type="Birth Name"><first>Jane {i}</first><surname>Doe</surname></name>'
+            f'<name alt="1" type="Also Known As"><first>Janet {i}</first><surname prefix="van">Dijk</surname></name>'
+            f'<eventref hlink="_E{i}" role="Primary"/><citationref hlink="_C{i % 100}"/>'
+            f'<url href="https://example.com/{i}" description="Jane {i}"/>'
+            f'<attribute type="betty:privacy" value="public"/></person>\n'
+        )
+    f.write('</people>\n')
+
+    f.write('<families>\n')
+    for i in range(2, person_count, 2):
+        f.write(f'<family handle="_F{i}" id="F{i}"><father hlink="_I{i - 2}"/><mother hlink="_I{i - 1}"/><childref hlink="_I{i}"/></family>\n')
+    f.write('</families>\n')
+
+    f.write('<sources>\n')
+    f.write('<source handle="_S0" id="S0"><stitle>The Source</stitle><sauthor>Jane Doe</sauthor></source>\n')
+    f.write('</sources>\n')
+
+    f.write('<places>\n')
+    for i in range(100):
+        f.write(f'<placeobj handle="_P{i}" id="P{i}" type="City"><pname value="Place {i}"/><coord long="4.9" lat="52.3"/></placeobj>\n')
+    f.write('</places>\n')
+
+    f.write('<citations>\n')
+    for i in range(100):
+        f.write(f'<citation handle="_C{i}" id="C{i}"><page>Page {i}</page><sourceref hlink="_S0"/></citation>\n')
+    f.write('</citations>\n')
+
+    f.write('</database>\n')
+
+
+if __name__ == '__main__':
+    with TemporaryDirectory() as working_directory_path_str:
+        gramps_path = Path(working_directory_path_str) / 'tree.gramps'
+        with gzip.open(gramps_path, 'wt', encoding='utf-8') as f:
+            _write_tree(f, _PERSON_COUNT)
+        start = perf_counter()
+        load_gramps(Ancestry(), gramps_path)
+        duration = perf_counter() - start
+    print(f'Loaded {_PERSON_COUNT:,} people in {duration:.2f} seconds ({_PERSON_COUNT / duration:,.0f} people per second).')
@@ -0,0 +1,71 @@
+"""
+Benchmark deriving thumbnails from large TIFF and PDF scans, with threads and with different numbers of processes.
+
+PDF scans are only included if Poppler is installed.
+
+Run this from the project's root directory with ``python -m benchmarks.image``.
+"""
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+from PIL import Image
+
+from betty.image import derive_image, derive_pdf_image
+
+_SCAN_COUNT = 8
+_SCAN_SIZE = (4000, 3000)
+_THUMBNAIL_SIZES = [(45, 45), (600, 600), (1200, 1200)]
+_JOBS = sorted({1, 2, 4, os.cpu_count() or 1})
+
+
+def _create_scans(scans_directory_path: Path) -> List[Tuple[Callable[..., None], Path]]:
+    scans = []
+    for i in range(_SCAN_COUNT):
+        # Noise does not compress well, which makes the scans as large as real ones.
+        image = Image.effect_noise(_SCAN_SIZE, 64).convert('RGB')
+        tiff_file_path = scans_directory_path / f'scan-{i}.tif'
+        image.save(tiff_file_path)
+        scans.append((derive_image, tiff_file_path))
+        if shutil.which('pdftoppm'):
+            pdf_file_path = scans_directory_path / f'scan-{i}.pdf'
+            image.save(pdf_file_path, resolution=300.0)
+            scans.append((derive_pdf_image, pdf_file_path))
+    return scans
+
+
+def _benchmark(label: str, executor: Executor, scans: List[Tuple[Callable[..., None], Path]], working_directory_path: Path) -> None:
+    cache_directory_path = working_directory_path / 'cache'
+    destination_directory_path = working_directory_path / 'www'
+    start = perf_counter()
+    with executor:
+        futures = [
+            executor.submit(task, file_path, cache_directory_path, destination_directory_path, f'{file_path.name}-{width}x{height}.jpg', width, height)
+            for task, file_path in scans
+            for width, height in _THUMBNAIL_SIZES
+        ]
+        for future in futures:
+            future.result()
+    duration = perf_counter() - start
+    # Remove the source file index along with the cache, so each benchmark reads the scans anew.
+    shutil.rmtree(cache_directory_path)
+    (working_directory_path / 'cache.sqlite3').unlink()
+    shutil.rmtree(destination_directory_path)
+    print(f'{label:<24} {len(futures) / duration:>8,.2f} thumbnails per second')
+
+
+if __name__ == '__main__':
+    with TemporaryDirectory() as working_directory_path_str:
+        working_directory_path = Path(working_directory_path_str)
+        scans_directory_path = working_directory_path / 'scans'
+        scans_directory_path.mkdir()
+        scans = _create_scans(scans_directory_path)
+        print(f'Deriving {len(_THUMBNAIL_SIZES)} thumbnails each from {len(scans)} scans of {_SCAN_SIZE[0]}x{_SCAN_SIZE[1]} pixels.')
+        _benchmark('Threads', ThreadPoolExecutor(), scans, working_directory_path)
+        for jobs in _JOBS:
+            _benchmark(f'{jobs} process(es)', ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('spawn')), scans, working_directory_path)
@@ -0,0 +1,55 @@
+"""
+Benchmark entity construction and entity type resolution.
+
+Run this from the project's root directory with ``python -m benchmarks.model``.
+"""
+from timeit import Timer
+
+from betty.model import get_entity_type, FlattenedEntityCollection, FlattenedEntity
+from betty.model.ancestry import Person, PersonName, Event, Presence, Subject
+from betty.model.event_type import Birth
+
+_REPEAT = 5
+_NUMBER = 10000
+
+
+def _construct_person() -> None:
+    Person(None)
+
+
+def _construct_person_name() -> None:
+    PersonName(None, 'Jane', 'Doe')
+
+
+def _construct_event() -> None:
+    Event(None, Birth())
+
+
+def _construct_presence() -> None:
+    Presence(None, Subject(), None)
+
+
+_PERSON = Person(None)
+
+
+def _get_entity_type() -> None:
+    get_entity_type(_PERSON)
+
+
+def _flatten_person() -> None:
+    FlattenedEntityCollection().add_entity(FlattenedEntity(Person(None)))
+
+
+def _benchmark(label: str, statement) -> None:
+    timer = Timer(statement)
+    best = min(timer.repeat(_REPEAT, _NUMBER))
+    print(f'{label:<32} {_NUMBER / best:>12,.0f} per second')
+
+
+if __name__ == '__main__':
+    _benchmark('Person()', _construct_person)
+    _benchmark('PersonName()', _construct_person_name)
+    _benchmark('Event()', _construct_event)
+    _benchmark('Presence()', _construct_presence)
+    _benchmark('get_entity_type(Person)', _get_entity_type)
+    _benchmark('Flatten a Person', _flatten_person)
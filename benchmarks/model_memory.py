@@ -0,0 +1,41 @@
+"""
+Benchmark the memory used by entities.
+
+Run this from the project's root directory with ``python -m benchmarks.model_memory``.
+"""
+import gc
+import tracemalloc
+from typing import Callable, List, Any
+
+from betty.model.ancestry import Person, PersonName, Event, Presence, Subject, Citation
+from betty.model.event_type import Birth
+
+_COUNT = 20000
+
+
+def _measure(label: str, factory: Callable[[], Any]) -> None:
+    gc.collect()
+    tracemalloc.start()
+    entities: List[Any] = []
+    start, _ = tracemalloc.get_traced_memory()
+    for _ in range(_COUNT):
+        entities.append(factory())
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<40} {(end - start) / _COUNT:>8,.0f} bytes per entity')
+
+
+def _person_with_name_and_birth() -> Person:
+    person = Person(None)
+    PersonName(person, 'Jane', 'Doe')
+    Presence(person, Subject(), Event(None, Birth()))
+    return person
+
+
+if __name__ == '__main__':
+    _measure('Person', lambda: Person(None))
+    _measure('PersonName', lambda: PersonName(None, 'Jane', 'Doe'))
+    _measure('Event', lambda: Event(None, Birth()))
+    _measure('Presence', lambda: Presence(None, Subject(), None))
+    _measure('Citation', lambda: Citation(None, None))
+    _measure('Person with a name and a birth', _person_with_name_and_birth)
@@ -0,0 +1,64 @@
+"""
+Benchmark deriving thumbnails from multi-page PDF scans, by rendering all pages, and by rendering the first page only.
+
+This requires Poppler to be installed.
+
+Run this from the project's root directory with ``python -m benchmarks.pdf_image``.
+"""
+import shutil
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import pdf2image
+from PIL import Image
+
+from betty.image import derive_pdf_image
+
+_PAGE_COUNTS = [1, 10, 100]
+# An A4 page scanned at 300 DPI.
+_PAGE_SIZE = (2480, 3508)
+_THUMBNAIL_SIZE = (600, 600)
+
+
+def _create_pdf(pdf_file_path: Path, page_count: int) -> None:
+    page = Image.linear_gradient('L').resize(_PAGE_SIZE).convert('RGB')
+    page.save(pdf_file_path, resolution=300.0, save_all=True, append_images=[page] * (page_count - 1))
+
+
+def _render_all_pages(pdf_file_path: Path) -> None:
+    # This is how thumbnails used to be derived from PDF files.
+    for image in pdf2image.convert_from_path(pdf_file_path, fmt='jpeg'):
+        image.close()
+
+
+def _render_first_page(pdf_file_path: Path, working_directory_path: Path) -> None:
+    derive_pdf_image(pdf_file_path, working_directory_path / 'cache', working_directory_path / 'www', 'thumbnail.jpg', *_THUMBNAIL_SIZE)
+    shutil.rmtree(working_directory_path / 'cache')
+    (working_directory_path / 'cache.sqlite3').unlink()
+    shutil.rmtree(working_directory_path / 'www')
+
+
+def _benchmark(page_count: int, working_directory_path: Path) -> None:
+    pdf_file_path = working_directory_path / f'scan-{page_count}.pdf'
+    _create_pdf(pdf_file_path, page_count)
+
+    start = perf_counter()
+    _render_all_pages(pdf_file_path)
+    all_pages_duration = perf_counter() - start
+
+    start = perf_counter()
+    _render_first_page(pdf_file_path, working_directory_path)
+    first_page_duration = perf_counter() - start
+
+    print(f'{page_count:>4} page(s): {all_pages_duration:>8.2f} seconds for all pages, {first_page_duration:>6.2f} seconds for the first page only')
+
+
+if __name__ == '__main__':
+    if not shutil.which('pdftoppm'):
+        sys.exit('This benchmark requires Poppler to be installed.')
+    with TemporaryDirectory() as working_directory_path_str:
+        print(f'Deriving {_THUMBNAIL_SIZE[0]}x{_THUMBNAIL_SIZE[1]} thumbnails from PDF scans of {_PAGE_SIZE[0]}x{_PAGE_SIZE[1]} pixels.')
+        for page_count in _PAGE_COUNTS:
+            _benchmark(page_count, Path(working_directory_path_str))
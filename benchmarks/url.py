@@ -0,0 +1,49 @@
+"""
+Benchmark URL generation for entities and paths, for monolingual and multilingual sites.
+
+Run this from the project's root directory with ``python -m benchmarks.url``.
+"""
+from timeit import Timer
+from typing import Any
+
+from betty.app import App
+from betty.model.ancestry import Person, Place, PlaceName
+from betty.project import LocaleConfiguration
+
+_REPEAT = 5
+_NUMBER = 10000
+
+_PERSON = Person('P1')
+_PLACE = Place('P1', [PlaceName('Amsterdam')])
+
+
+def _benchmark(app: App, label: str, resource: Any, media_type: str = 'text/html', absolute: bool = False) -> None:
+    timer = Timer(lambda: app.url_generator.generate(resource, media_type, absolute))
+    best = min(timer.repeat(_REPEAT, _NUMBER))
+    print(f'{label:<40} {_NUMBER / best:>12,.0f} URLs per second')
+
+
+def _benchmark_app(app: App) -> None:
+    _benchmark(app, 'Person, HTML', _PERSON)
+    _benchmark(app, 'Person, JSON', _PERSON, 'application/json')
+    _benchmark(app, 'Place, HTML', _PLACE)
+    _benchmark(app, 'Person, HTML, absolute', _PERSON, absolute=True)
+    _benchmark(app, 'Path', '/index.html')
+
+
+if __name__ == '__main__':
+    print('Monolingual:')
+    with App() as app:
+        _benchmark_app(app)
+
+    print('Multilingual:')
+    app = App()
+    app.project.configuration.root_path = 'betty'
+    app.project.configuration.locales.replace([
+        LocaleConfiguration('en-US', 'en'),
+        LocaleConfiguration('nl-NL', 'nl'),
+        LocaleConfiguration('uk', 'uk'),
+    ])
+    with app:
+        with app.acquire_locale('nl-NL'):
+            _benchmark_app(app)
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+import multiprocessing
 import weakref
 from concurrent.futures._base import Executor
+from concurrent.futures.process import ProcessPoolExecutor
 from concurrent.futures.thread import ThreadPoolExecutor
 from contextlib import contextmanager, ExitStack, suppress
 from gettext import NullTranslations
 from pathlib import Path
-from typing import List, Type, TYPE_CHECKING, Set, Iterator, Optional
+from typing import List, Type, TYPE_CHECKING, Set, Iterator, Optional, Dict, Tuple
 
 import aiohttp
 from babel.core import parse_locale
@@ -46,6 +48,7 @@ except ModuleNotFoundError:  # pragma: no cover
 if TYPE_CHECKING:
     from betty.builtins import _
     from betty.jinja2 import Environment
+    from betty.json import JSONEncoder
     from betty.url import StaticUrlGenerator, ContentNegotiationUrlGenerator
 
 CONFIGURATION_DIRECTORY_PATH = HOME_DIRECTORY_PATH / 'configuration'
@@ -61,9 +64,13 @@ class _AppExtensions(ListExtensions):
 
 
 class AppConfiguration(FileBasedConfiguration):
+    DEFAULT_IMAGE_CACHE_SIZE = 1024
+
     def __init__(self):
         super().__init__()
         self._locale = None
+        self._image_jobs: Optional[int] = None
+        self._image_cache_size = self.DEFAULT_IMAGE_CACHE_SIZE
 
     @property
     def configuration_file_path(self) -> Path:
@@ -90,6 +97,34 @@ class AppConfiguration(FileBasedConfiguration):
             raise ConfigurationValidationError(_('{locale} is not a valid IETF BCP 47 language tag.').format(locale=locale))
         self._locale = locale
 
+    @property
+    @reactive_property
+    def image_jobs(self) -> Optional[int]:
+        """
+        The number of processes to derive images with, or None to use as many as there are CPUs.
+        """
+        return self._image_jobs
+
+    @image_jobs.setter
+    def image_jobs(self, image_jobs: Optional[int]) -> None:
+        if image_jobs is not None and image_jobs < 1:
+            raise ConfigurationValidationError(_('The number of image jobs must be at least 1, but {image_jobs} was given.').format(image_jobs=image_jobs))
+        self._image_jobs = image_jobs
+
+    @property
+    @reactive_property
+    def image_cache_size(self) -> int:
+        """
+        The maximum size of the derived image cache, in megabytes.
+        """
+        return self._image_cache_size
+
+    @image_cache_size.setter
+    def image_cache_size(self, image_cache_size: int) -> None:
+        if image_cache_size < 0:
+            raise ConfigurationValidationError(_('The image cache size must be at least 0 megabytes, but {image_cache_size} was given.').format(image_cache_size=image_cache_size))
+        self._image_cache_size = image_cache_size
+
     def load(self, dumped_configuration: DumpedConfigurationImport, loader: Loader) -> None:
         loader.assert_record(dumped_configuration, {
             'locale': Field(
@@ -97,12 +132,26 @@ class AppConfiguration(FileBasedConfiguration):
                 loader.assert_str,  # type: ignore
                 lambda x: loader.assert_setattr(self, 'locale', x),
             ),
+            'image_jobs': Field(
+                False,
+                loader.assert_int,  # type: ignore
+                lambda x: loader.assert_setattr(self, 'image_jobs', x),
+            ),
+            'image_cache_size': Field(
+                False,
+                loader.assert_int,  # type: ignore
+                lambda x: loader.assert_setattr(self, 'image_cache_size', x),
+            ),
         })
 
     def dump(self) -> DumpedConfigurationExport:
-        dumped_configuration = {}
+        dumped_configuration: Dict[str, DumpedConfigurationExport] = {}
         if self._locale is not None:
             dumped_configuration['locale'] = self.locale
+        if self._image_jobs is not None:
+            dumped_configuration['image_jobs'] = self.image_jobs
+        if self._image_cache_size != self.DEFAULT_IMAGE_CACHE_SIZE:
+            dumped_configuration['image_cache_size'] = self.image_cache_size
 
         return dumped_configuration
 
@@ -128,13 +177,19 @@ class App(Configurable[AppConfiguration], ReactiveInstance):
         self._url_generator = AppUrlGenerator(self)
         self._static_url_generator = StaticPathUrlGenerator(self.project.configuration)
         self._debug = None
-        self._locale: Optional[str] = None
+        # The acquired locales, the last of which is the current locale. Acquiring a locale appends to this list, rather
+        # than setting an attribute, because setting attributes on reactive instances is comparatively slow.
+        self._locales: List[str] = []
         self._translations: Optional[TranslationsRepository] = None
+        # The negotiated locales and translations locales, keyed by the preferred locales they were negotiated for.
+        self._negotiated_locales: Dict[Tuple[str, ...], Tuple[str, str]] = {}
         self._default_translations = None
         self._acquire_contexts = ExitStack()
         self._jinja2_environment = None
+        self._json_encoder: Optional[JSONEncoder] = None
         self._renderer = None
         self._executor = None
+        self._image_executor: Optional[ExceptionRaisingAwaitableExecutor] = None
         self._locks = Locks()
         self._http_client = None
 
@@ -149,6 +204,8 @@ class App(Configurable[AppConfiguration], ReactiveInstance):
     def _wait_for_threads(self) -> None:
         if self._executor:
             self._executor.wait()
+        if self._image_executor:
+            self._image_executor.wait()
 
     def acquire(self) -> None:
         if self._acquired:
@@ -170,6 +227,7 @@ class App(Configurable[AppConfiguration], ReactiveInstance):
         self._acquire_contexts.close()
         del self.http_client
         self._acquired = False
+        self._shutdown_image_executor()
 
     @contextmanager
     def acquire_locale(self, *requested_locales: str | None) -> Iterator[Self]:  # type: ignore
@@ -179,8 +237,22 @@ class App(Configurable[AppConfiguration], ReactiveInstance):
         if not requested_locales:
             requested_locales = (self.configuration.locale,)
         requested_locales = (*requested_locales, 'en-US')
-        preferred_locales = [locale for locale in requested_locales if locale is not None]
+        preferred_locales = tuple(locale for locale in requested_locales if locale is not None)
 
+        # Locales are acquired many times per page, for instance to build links to translations, so negotiate them once.
+        try:
+            negotiated_locale, negotiated_translations_locale = self._negotiated_locales[preferred_locales]
+        except KeyError:
+            negotiated_locale, negotiated_translations_locale = self._negotiated_locales[preferred_locales] = self._negotiate_locales(preferred_locales)
+
+        self._locales.append(negotiated_locale)
+        try:
+            with self.translations[negotiated_translations_locale]:
+                yield self
+        finally:
+            self._locales.pop()
+
+    def _negotiate_locales(self, preferred_locales: Tuple[str, ...]) -> Tuple[str, str]:
         negotiated_locale = negotiate_locale(
             preferred_locales,
             {
@@ -193,25 +265,21 @@ class App(Configurable[AppConfiguration], ReactiveInstance):
         if negotiated_locale is None:
             raise ValueError('None of the requested locales are available.')
 
-        previous_locale = self._locale
-        self._locale = negotiated_locale
-
         negotiated_translations_locale = negotiate_locale(
             preferred_locales,
             set(self.translations.locales),
         )
         if negotiated_translations_locale is None:
             negotiated_translations_locale = 'en-US'
-        with self.translations[negotiated_translations_locale]:
-            yield self
 
-        self._locale = previous_locale
+        return negotiated_locale, negotiated_translations_locale
 
     @property
     def locale(self) -> str:
-        if self._locale is None:
+        try:
+            return self._locales[-1]
+        except IndexError:
             raise RuntimeError(f'No locale has been acquired yet. Use {type(self)}.acquire_locale() to activate a locale.')
-        return self._locale
 
     def __enter__(self) -> App:
         self.acquire()
@@ -279,6 +347,9 @@ class App(Configurable[AppConfiguration], ReactiveInstance):
         self._build_assets()
 
     def _build_assets(self) -> None:
+        # The available translations depend on the assets.
+        self._translations = None
+        self._negotiated_locales.clear()
         self._assets.clear()
         self._assets.prepend(ASSETS_DIRECTORY_PATH, 'utf-8')
         for extension in self.extensions.flatten():
@@ -303,6 +374,15 @@ class App(Configurable[AppConfiguration], ReactiveInstance):
     def static_url_generator(self) -> StaticUrlGenerator:
         return self._static_url_generator
 
+    @property
+    def json_encoder(self) -> JSONEncoder:
+        if self._json_encoder is None:
+            from betty.json import JSONEncoder
+
+            self._json_encoder = JSONEncoder(self)
+
+        return self._json_encoder
+
     @property
     def translations(self) -> TranslationsRepository:
         if self._translations is None:
@@ -344,6 +424,32 @@ class App(Configurable[AppConfiguration], ReactiveInstance):
             self._executor = ExceptionRaisingAwaitableExecutor(ThreadPoolExecutor())
         return self._executor
 
+    @property
+    def image_executor(self) -> Executor:
+        """
+        The executor to derive images with.
+
+        Deriving images is CPU-bound, so by default this runs tasks in a dedicated pool of worker processes.
+        """
+        if self._image_executor is None:
+            # Spawn rather than fork workers, because forking a process with running threads and event loops is unsafe.
+            self._image_executor = ExceptionRaisingAwaitableExecutor(ProcessPoolExecutor(
+                self.configuration.image_jobs,
+                mp_context=multiprocessing.get_context('spawn'),
+            ))
+        return self._image_executor
+
+    @image_executor.setter
+    def image_executor(self, image_executor: Executor) -> None:
+        self._shutdown_image_executor()
+        self._image_executor = ExceptionRaisingAwaitableExecutor(image_executor)
+
+    def _shutdown_image_executor(self) -> None:
+        image_executor = self._image_executor
+        if image_executor is not None:
+            self._image_executor = None
+            image_executor.shutdown()
+
     @property
     def locks(self) -> Locks:
         return self._locks
@@ -1,8 +1,12 @@
 import logging
+import os
 import shutil
+import sqlite3
+import time
 from contextlib import suppress
 from enum import unique, IntFlag, auto
-from typing import TYPE_CHECKING
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Tuple, Iterable, Dict, Optional
 
 from betty import fs
 
@@ -20,3 +24,74 @@ async def clear():
     with suppress(FileNotFoundError):
         shutil.rmtree(fs.CACHE_DIRECTORY_PATH)
     logging.getLogger().info(_('All caches cleared.'))
+
+
+def get_index_file_path(directory_path: Path) -> Path:
+    """
+    Get the path to the SQLite database that indexes a cache directory.
+    """
+    return directory_path.with_name(f'{directory_path.name}.sqlite3')
+
+
+def init_index(connection: sqlite3.Connection) -> None:
+    """
+    Create the tables a cache directory's index needs to record when cache files were last used.
+    """
+    connection.execute('CREATE TABLE IF NOT EXISTS cache_file_uses (name TEXT PRIMARY KEY, used_ns INTEGER)')
+
+
+def record_uses(connection: sqlite3.Connection, file_names: Iterable[str]) -> None:
+    """
+    Record that cache files were used just now.
+
+    Uses are recorded in the index rather than by touching the cache files, because cache files may be hard-linked
+    elsewhere, and touching them would change the modification times of those links, too.
+
+    :param file_names: The paths to the cache files, relative to the cache directory.
+    """
+    used_ns = time.time_ns()
+    connection.executemany('INSERT OR REPLACE INTO cache_file_uses VALUES (?, ?)', ((file_name, used_ns) for file_name in file_names))
+
+
+async def prune(directory_path: Path, max_size: int) -> None:
+    """
+    Remove the least recently used files from a cache directory until the remaining files take up at most max_size bytes.
+
+    A file was last used when :py:func:`betty.cache.record_uses` last recorded it, or else when it was last modified.
+    """
+    connection: Optional[sqlite3.Connection] = None
+    uses: Dict[str, int] = {}
+    index_file_path = get_index_file_path(directory_path)
+    if index_file_path.exists():
+        connection = sqlite3.connect(index_file_path, timeout=60)
+        init_index(connection)
+        uses = dict(connection.execute('SELECT name, used_ns FROM cache_file_uses'))
+    try:
+        cache_files: List[Tuple[int, int, str, str]] = []
+        for directory_path_str, _subdirectory_names, file_names in os.walk(directory_path):
+            for file_name in file_names:
+                file_path = os.path.join(directory_path_str, file_name)
+                cache_file_name = Path(file_path).relative_to(directory_path).as_posix()
+                with suppress(FileNotFoundError):
+                    file_stat = os.stat(file_path)
+                    cache_files.append((uses.get(cache_file_name, file_stat.st_mtime_ns), file_stat.st_size, file_path, cache_file_name))
+
+        size = 0
+        removed_count = 0
+        # Forget about files that no longer exist.
+        forgotten_file_names = set(uses) - {cache_file_name for _used_ns, _file_size, _file_path, cache_file_name in cache_files}
+        for _used_ns, file_size, file_path, cache_file_name in sorted(cache_files, reverse=True):
+            size += file_size
+            if size > max_size:
+                with suppress(FileNotFoundError):
+                    os.remove(file_path)
+                    removed_count += 1
+                forgotten_file_names.add(cache_file_name)
+        if connection is not None:
+            connection.executemany('DELETE FROM cache_file_uses WHERE name = ?', ((file_name,) for file_name in forgotten_file_names))
+            connection.commit()
+    finally:
+        if connection is not None:
+            connection.close()
+    if removed_count:
+        logging.getLogger().info(_('Removed {count} least recently used files from the cache.').format(count=removed_count))
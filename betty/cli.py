@@ -17,7 +17,7 @@ if TYPE_CHECKING:
 import click
 from click import get_current_context, Context, Option
 
-from betty import about, cache, demo, generate, load, serve
+from betty import about, cache, demo, fs, generate, load, serve
 from betty.app import App
 from betty.asyncio import sync
 from betty.error import UserFacingError
@@ -85,6 +85,7 @@ async def _init_ctx(ctx: Context, __: Optional[Option] = None, configuration_fil
 
     app = App()
     ctx.obj['commands'] = {
+        'cache': _cache,
         'clear-caches': _clear_caches,
         'demo': _demo,
         'gui': _gui,
@@ -141,6 +142,30 @@ async def _clear_caches():
         await cache.clear()
 
 
+@click.group(help='Manage caches.')
+def _cache():
+    pass
+
+
+@_cache.command(name='clear', help='Clear all caches.')
+@global_command
+@sync
+async def _cache_clear():
+    with App():
+        await cache.clear()
+
+
+@_cache.command(name='prune', help='Remove the least recently used derived images from the cache, until it fits its maximum size.')
+@click.option('--max-size', type=click.IntRange(min=0), help='The maximum size of the image cache, in megabytes. Defaults to the image_cache_size app configuration.')
+@global_command
+@sync
+async def _cache_prune(max_size: Optional[int]):
+    with App() as app:
+        if max_size is None:
+            max_size = app.configuration.image_cache_size
+        await cache.prune(fs.CACHE_DIRECTORY_PATH / 'image', max_size * 2 ** 20)
+
+
 @click.command(help='Explore a demonstration site.')
 @global_command
 @sync
@@ -168,11 +193,13 @@ async def _gui(configuration_file_path: Optional[str]):
 
 
 @click.command(help='Generate a static site.')
+@click.option('--incremental', is_flag=True, help='Keep the existing site, and render only the pages whose inputs changed since the previous incremental build.')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1, show_default=True, help='The number of processes to render pages in.')
 @app_command
 @sync
-async def _generate(app: App):
+async def _generate(app: App, incremental: bool, jobs: int):
     await load.load(app)
-    await generate.generate(app)
+    await generate.generate(app, incremental=incremental, jobs=jobs)
 
 
 @click.command(help='Serve a generated site.')
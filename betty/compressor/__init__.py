@@ -0,0 +1,116 @@
+import gzip
+import os
+from contextlib import suppress
+from pathlib import Path
+from typing import TYPE_CHECKING, Sequence
+
+from reactives.instance.property import reactive_property
+
+from betty.app.extension import ConfigurableExtension, UserFacingExtension
+from betty.config import Configuration, DumpedConfigurationImport, DumpedConfigurationExport
+from betty.config.load import ConfigurationValidationError, Loader, Field
+from betty.generate import FileVariantWriter
+from betty.os import opener
+
+try:
+    import brotli  # type: ignore
+except ModuleNotFoundError:
+    brotli = None
+
+if TYPE_CHECKING:
+    from betty.builtins import _
+
+
+# Other files, such as images, are compressed already.
+_COMPRESSIBLE_SUFFIXES = {'.css', '.html', '.js', '.json', '.svg', '.txt', '.xml'}
+
+
+class CompressorConfiguration(Configuration):
+    DEFAULT_GZIP_LEVEL = 9
+    DEFAULT_BROTLI_QUALITY = 9
+
+    def __init__(self):
+        super().__init__()
+        self._gzip_level = self.DEFAULT_GZIP_LEVEL
+        self._brotli_quality = self.DEFAULT_BROTLI_QUALITY
+
+    @property
+    @reactive_property
+    def gzip_level(self) -> int:
+        return self._gzip_level
+
+    @gzip_level.setter
+    def gzip_level(self, gzip_level: int) -> None:
+        if not 1 <= gzip_level <= 9:
+            raise ConfigurationValidationError(_('The gzip compression level must be between 1 and 9, but {level} was given.').format(level=gzip_level))
+        self._gzip_level = gzip_level
+
+    @property
+    @reactive_property
+    def brotli_quality(self) -> int:
+        return self._brotli_quality
+
+    @brotli_quality.setter
+    def brotli_quality(self, brotli_quality: int) -> None:
+        if not 0 <= brotli_quality <= 11:
+            raise ConfigurationValidationError(_('The Brotli compression quality must be between 0 and 11, but {quality} was given.').format(quality=brotli_quality))
+        self._brotli_quality = brotli_quality
+
+    def load(self, dumped_configuration: DumpedConfigurationImport, loader: Loader) -> None:
+        loader.assert_record(dumped_configuration, {
+            'gzip_level': Field(
+                False,
+                loader.assert_int,  # type: ignore
+                lambda x: loader.assert_setattr(self, 'gzip_level', x),
+            ),
+            'brotli_quality': Field(
+                False,
+                loader.assert_int,  # type: ignore
+                lambda x: loader.assert_setattr(self, 'brotli_quality', x),
+            ),
+        })
+
+    def dump(self) -> DumpedConfigurationExport:
+        return {
+            'gzip_level': self.gzip_level,
+            'brotli_quality': self.brotli_quality,
+        }
+
+
+class Compressor(ConfigurableExtension[CompressorConfiguration], UserFacingExtension, FileVariantWriter):
+    @classmethod
+    def default_configuration(cls) -> CompressorConfiguration:
+        return CompressorConfiguration()
+
+    def file_variant_suffixes(self, file_path: Path) -> Sequence[str]:
+        if file_path.suffix not in _COMPRESSIBLE_SUFFIXES:
+            return ()
+        if brotli is None:
+            return '.gz',
+        return '.gz', '.br'
+
+    def write_file_variants(self, file_path: Path, content: bytes) -> None:
+        file_stat = os.stat(file_path)
+        # Do not include the time of compression in the gzip header, so unchanged files compress to unchanged variants.
+        _write_variant(file_path, '.gz', gzip.compress(content, self.configuration.gzip_level, mtime=0), file_stat)
+        if brotli is not None:
+            _write_variant(file_path, '.br', brotli.compress(content, quality=self.configuration.brotli_quality), file_stat)
+
+    @classmethod
+    def label(cls) -> str:
+        return _('Compressor')
+
+    @classmethod
+    def description(cls) -> str:
+        return _('Add gzip, and if available Brotli, compressed versions of all generated text files, for web servers to serve directly.')
+
+
+def _write_variant(file_path: Path, suffix: str, compressed_content: bytes, file_stat: os.stat_result) -> None:
+    variant_file_path = file_path.with_name(file_path.name + suffix)
+    # Replace rather than overwrite existing variants, because they may be linked to those in the previous output.
+    with suppress(FileNotFoundError):
+        os.remove(variant_file_path)
+    with open(variant_file_path, 'wb', opener=opener) as f:
+        f.write(compressed_content)
+    # Web servers may use the variant's modification time, so it must be that of the original file.
+    os.utime(variant_file_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
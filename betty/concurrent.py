@@ -19,6 +19,9 @@ class ExceptionRaisingAwaitableExecutor(Executor):
         awaitables = self._awaitables
         self._awaitables = []
         wait(awaitables)
+        # Raise the first error any task ran into, as shutting down would have.
+        for future in awaitables:
+            future.result()
 
     def shutdown(self, *args, **kwargs):
         self._executor.shutdown(*args, **kwargs)
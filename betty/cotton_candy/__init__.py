@@ -1,7 +1,6 @@
 import logging
 import re
 from pathlib import Path
-from shutil import copy2
 from typing import Optional, TYPE_CHECKING, Set, Type, Dict, Callable
 
 from PyQt6.QtWidgets import QWidget
@@ -14,10 +13,11 @@ from betty.config import Configuration, DumpedConfigurationImport, DumpedConfigu
 from betty.config.dump import minimize_dict
 from betty.config.load import ConfigurationValidationError, Loader, Field
 from betty.cotton_candy.search import Index
-from betty.generate import Generator
+from betty.generate import Generator, add_file
 from betty.gui import GuiBuilder
 from betty.jinja2 import Jinja2Provider
 from betty.npm import _Npm, NpmBuilder, npm
+from betty.os import copy
 from betty.project import EntityReferenceCollection
 
 if TYPE_CHECKING:
@@ -167,9 +167,11 @@ class CottonCandy(Theme, ConfigurableExtension[CottonCandyConfiguration], Genera
         logging.getLogger().info('Built the Cotton Candy front-end assets.')
 
     def _copy_npm_build(self, source_directory_path: Path, destination_directory_path: Path) -> None:
-        copy2(source_directory_path / 'cotton_candy.css', destination_directory_path / 'cotton_candy.css')
-        copy2(source_directory_path / 'cotton_candy.js', destination_directory_path / 'cotton_candy.js')
+        copy(source_directory_path / 'cotton_candy.css', destination_directory_path / 'cotton_candy.css')
+        copy(source_directory_path / 'cotton_candy.js', destination_directory_path / 'cotton_candy.js')
 
     async def generate(self) -> None:
         assets_directory_path = await self.app.extensions[_Npm].ensure_assets(self)
         self._copy_npm_build(assets_directory_path, self.app.project.configuration.www_directory_path)
+        await add_file(self.app.project.configuration.www_directory_path / 'cotton_candy.css')
+        await add_file(self.app.project.configuration.www_directory_path / 'cotton_candy.js')
@@ -12,7 +12,7 @@ from typing import AsyncIterable, Optional, Tuple, AsyncContextManager, Sequence
 import aiofiles
 
 from betty import _ROOT_DIRECTORY_PATH
-from betty.os import PathLike
+from betty.os import PathLike, copy, makedirs
 
 ROOT_DIRECTORY_PATH = _ROOT_DIRECTORY_PATH
 
@@ -36,6 +36,19 @@ def hashfile(path: PathLike) -> str:
     return hashlib.md5(':'.join([str(getmtime(path)), str(path)]).encode('utf-8')).hexdigest()
 
 
+def hashfilecontent(path: PathLike) -> str:
+    """
+    Hash a file's contents.
+
+    Unlike :py:func:`betty.fs.hashfile`, the hash does not change when a file is touched or moved.
+    """
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(2 ** 20):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
 class FileSystem:
     class _Open:
         def __init__(self, fs: FileSystem, file_paths: Tuple[PathLike, ...]):
@@ -88,6 +101,6 @@ class FileSystem:
             async for file_source_path in iterfiles(fs_path / source_path):
                 file_destination_path = destination_path / file_source_path.relative_to(fs_path / source_path)
                 if not file_destination_path.exists():
-                    file_destination_path.parent.mkdir(exist_ok=True, parents=True)
-                    copy2(file_source_path, file_destination_path)
+                    makedirs(file_destination_path.parent)
+                    copy(file_source_path, file_destination_path)
         return destination_path
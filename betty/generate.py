@@ -1,31 +1,47 @@
 import asyncio
+import hashlib
 import json
 import logging
+import multiprocessing
 import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor, Executor, Future
+from contextlib import suppress, ExitStack
+from contextvars import ContextVar
 from pathlib import Path
-from typing import TYPE_CHECKING, cast, AsyncContextManager, List, Type
+from tempfile import TemporaryDirectory
+from typing import TYPE_CHECKING, cast, AsyncContextManager, List, Type, Dict, Optional, Tuple, Any, Set, Iterable, \
+    AsyncIterator, Coroutine, Callable, Sequence
 
 import aiofiles
 import math
-from aiofiles import os as aiofiles_os
 from aiofiles.threadpool.text import AsyncTextIOWrapper
 from babel import Locale
 
+from betty import about, cache, fs
 from betty.app import App
-from betty.json import JSONEncoder
+from betty.config.load import Loader as ConfigurationLoader
+from betty.fs import iterfiles
+from betty.image import submit_derivatives
+from betty.json import dumps as dumps_json
 from betty.locale import bcp_47_to_rfc_1766
-from betty.model import get_entity_type_name, UserFacingEntity, get_entity_type
+from betty.model import get_entity_type_name, UserFacingEntity, get_entity_type, Entity, GeneratedEntityId, \
+    EntityCollection, EntityTypeError, pickle_entities, unpickle_entities
+from betty.model.ancestry import Ancestry
 from betty.openapi import build_specification
+from betty.os import ChDir, link_or_copy, makedirs, opener, copy
 from betty.string import camel_case_to_kebab_case
 
 if TYPE_CHECKING:
     from betty.builtins import _
 
 
+# The maximum number of pages to generate at the same time. Each page keeps at most one file open at a time, so this
+# stays well within the limit of open files.
 try:
-    from resource import getrlimit, RLIMIT_NOFILE  # type: ignore
-    _GENERATE_CONCURRENCY = math.ceil(getrlimit(RLIMIT_NOFILE)[0] / 2)
+    from resource import getrlimit, RLIMIT_NOFILE, RLIM_INFINITY  # type: ignore
+    _open_files_limit = getrlimit(RLIMIT_NOFILE)[0]
+    _GENERATE_CONCURRENCY = 999 if _open_files_limit == RLIM_INFINITY else max(1, min(math.ceil(_open_files_limit / 2), 999))
 except ImportError:
     _GENERATE_CONCURRENCY = 999
 
@@ -34,32 +50,160 @@ def getLogger() -> logging.Logger:
     return logging.getLogger(__name__)
 
 
+# The dependencies of a rendered page: its path, the (entity type name, entity ID) pairs of the entities it was rendered
+# from, whether it was rendered from the ancestry as a whole, and the files it published, relative to the www directory.
+_PageDependencies = Tuple[Path, List[Tuple[str, str]], bool, List[str]]
+
+
 class Generator:
     async def generate(self) -> None:
         raise NotImplementedError
 
 
-async def generate(app: App) -> None:
-    shutil.rmtree(app.project.configuration.output_directory_path, ignore_errors=True)
-    await aiofiles_os.makedirs(app.project.configuration.output_directory_path)
-    await asyncio.gather(
-        _generate(app),
-        app.dispatcher.dispatch(Generator)(),
-    )
-    os.chmod(app.project.configuration.output_directory_path, 0o755)
-    for directory_path_str, subdirectory_names, file_names in os.walk(app.project.configuration.output_directory_path):
-        directory_path = Path(directory_path_str)
-        for subdirectory_name in subdirectory_names:
-            os.chmod(directory_path / subdirectory_name, 0o755)
-        for file_name in file_names:
-            os.chmod(directory_path / file_name, 0o644)
-    app.wait()
+class FileVariantWriter:
+    """
+    Write variants of generated files next to them, such as compressed versions for web servers to serve directly.
+
+    Variants are written as their files are generated. The variants of unchanged pages are linked from the previous
+    output instead.
+    """
+
+    def file_variant_suffixes(self, file_path: Path) -> Sequence[str]:
+        """
+        Get the suffixes that the variants of a file append to its name, or none if the file has no variants.
+        """
+        raise NotImplementedError
+
+    def write_file_variants(self, file_path: Path, content: bytes) -> None:
+        """
+        Write the variants of a generated file.
+
+        This may be called from any thread.
+        """
+        raise NotImplementedError
+
+
+def _get_file_variant_writers(app: App) -> List[FileVariantWriter]:
+    return [extension for extension in app.extensions.flatten() if isinstance(extension, FileVariantWriter)]
+
+
+async def generate(app: App, incremental: bool = False, jobs: int = 1) -> None:
+    """
+    Generate a static site.
+
+    The site is built in a staging directory next to the output directory, which replaces the output directory once the
+    build has succeeded. Until then, the previously generated site remains available. Pages whose contents are identical
+    to those in the previous output are linked rather than written again, and keep their modification times.
+
+    :param incremental: Whether to only render entity pages whose inputs changed since the previous incremental build.
+        Otherwise, all pages are rendered.
+    :param jobs: The number of worker processes to render entity pages in. If 1, all pages are rendered in this process.
+    """
+    if jobs < 1:
+        raise ValueError('The number of jobs must be at least 1.')
+    output_directory_path = app.project.configuration.output_directory_path
+    staging_directory_path = output_directory_path.with_name(f'{output_directory_path.name}.staging')
+    _restore_directory(output_directory_path)
+    # Remove anything a failed build may have left behind.
+    shutil.rmtree(staging_directory_path, ignore_errors=True)
+    writer = _Writer(staging_directory_path, output_directory_path, _get_file_variant_writers(app))
+    manifest = None
+    if incremental:
+        manifest = await _Manifest.read(app, writer)
+    # Templates may have been added or removed since a previous build with the same app.
+    app.jinja2_environment.clear_negotiated_templates()
+    makedirs(staging_directory_path)
+    app.project.configuration.output_directory_path = staging_directory_path
+    writer_token = _writer.set(writer)
+    try:
+        with ExitStack() as pool_context:
+            pool = None
+            if jobs > 1:
+                pool = pool_context.enter_context(_Pool(app, jobs))
+            await _generate_assets(app)
+            await asyncio.gather(
+                _generate(app, manifest, pool),
+                app.dispatcher.dispatch(Generator)(),
+            )
+        app.wait()
+        # All images have been derived, so the least recently used ones can be removed from the cache.
+        await cache.prune(fs.CACHE_DIRECTORY_PATH / 'image', app.configuration.image_cache_size * 2 ** 20)
+        if manifest is not None:
+            await manifest.write()
+    except BaseException:
+        shutil.rmtree(staging_directory_path, ignore_errors=True)
+        raise
+    finally:
+        _writer.reset(writer_token)
+        # Restore the output directory path, whether it was the default or overridden.
+        del app.project.configuration.output_directory_path
+        if app.project.configuration.output_directory_path != output_directory_path:
+            app.project.configuration.output_directory_path = output_directory_path
+    _replace_directory(staging_directory_path, output_directory_path)
+    getLogger().info(_('Wrote {written_count} pages, and left {skipped_count} unchanged pages alone.').format(
+        written_count=writer.written_count,
+        skipped_count=writer.skipped_count,
+    ))
+
+
+def _get_old_directory_path(directory_path: Path) -> Path:
+    return directory_path.with_name(f'{directory_path.name}.old')
+
+
+def _replace_directory(source_directory_path: Path, destination_directory_path: Path) -> None:
+    """
+    Replace a directory with another.
+
+    A non-empty directory cannot be renamed over another one, so the destination is renamed out of the way first. The
+    destination is therefore missing between two renames. If the process is interrupted between them,
+    :py:func:`betty.generate._restore_directory` puts the old destination back.
+    """
+    _restore_directory(destination_directory_path)
+    old_directory_path = _get_old_directory_path(destination_directory_path)
+    shutil.rmtree(old_directory_path, ignore_errors=True)
+    with suppress(FileNotFoundError):
+        os.replace(destination_directory_path, old_directory_path)
+    os.replace(source_directory_path, destination_directory_path)
+    shutil.rmtree(old_directory_path, ignore_errors=True)
+
+
+def _restore_directory(directory_path: Path) -> None:
+    """
+    Restore a directory that an interrupted :py:func:`betty.generate._replace_directory` renamed out of the way.
+    """
+    if not directory_path.exists():
+        with suppress(FileNotFoundError):
+            os.replace(_get_old_directory_path(directory_path), directory_path)
+
+
+def _get_localized_www_directory_path(app: App, locale_alias: str) -> Path:
+    if app.project.configuration.multilingual:
+        return app.project.configuration.www_directory_path / locale_alias
+    return app.project.configuration.www_directory_path
+
 
+async def _generate_assets(app: App) -> None:
+    """
+    Copy and render the static and localized assets.
 
-async def _generate(app: App) -> None:
+    This happens before generators start writing to the www directory, so the assets can be told apart from their files.
+    """
+    www_directory_path = app.project.configuration.www_directory_path
+    await app.assets.copytree(Path('public') / 'static', www_directory_path)
+    await app.renderer.render_tree(www_directory_path)
+    for locale_configuration in app.project.configuration.locales:
+        with app.acquire_locale(locale_configuration.locale):
+            localized_www_directory_path = _get_localized_www_directory_path(app, locale_configuration.alias)
+            await app.assets.copytree(Path('public') / 'localized', localized_www_directory_path)
+            await app.renderer.render_tree(localized_www_directory_path)
+    async for file_path in iterfiles(www_directory_path):
+        await add_file(file_path)
+
+
+async def _generate(app: App, manifest: Optional['_Manifest'] = None, pool: Optional['_Pool'] = None) -> None:
     logger = getLogger()
-    await app.assets.copytree(Path('public') / 'static', app.project.configuration.www_directory_path)
-    await app.renderer.render_tree(app.project.configuration.www_directory_path)
+    writer = _writer.get()
+    assert writer is not None
     entity_types = [
         entity_type
         for entity_type
@@ -69,29 +213,34 @@ async def _generate(app: App) -> None:
     for locale_configuration in app.project.configuration.locales:
         locale = locale_configuration.locale
         with app.acquire_locale(locale):
-            if app.project.configuration.multilingual:
-                www_directory_path = app.project.configuration.www_directory_path / locale_configuration.alias
-            else:
-                www_directory_path = app.project.configuration.www_directory_path
-
-            await app.assets.copytree(Path('public') / 'localized', www_directory_path)
-            await app.renderer.render_tree(www_directory_path)
-
-            coroutines = [
-                *[
-                    coroutine
-                    for entity_type in entity_types
-                    async for coroutine in _generate_entity_type(
+            www_directory_path = _get_localized_www_directory_path(app, locale_configuration.alias)
+
+            pool_futures = []
+            if pool is not None:
+                pool_futures = [
+                    asyncio.wrap_future(pool.submit(
+                        _generate_entities_in_worker,
+                        locale,
                         www_directory_path,
-                        entity_type,
-                        app,
-                    )
-                ],
-                _generate_openapi(www_directory_path, app)
-            ]
-            # Batch all coroutines to reduce the risk of "too many open files" errors.
-            for i in range(0, len(coroutines), _GENERATE_CONCURRENCY):
-                await asyncio.gather(*coroutines[i:i + _GENERATE_CONCURRENCY])
+                        writer.previous_output_directory_path,
+                        *shard,
+                    ))
+                    for shard
+                    in _shard_entities(www_directory_path, entity_types, app, pool.jobs, manifest)
+                ]
+
+            await _generate_concurrently(_generate_localized(www_directory_path, entity_types, app, manifest, pool is None))
+
+            for pool_future in asyncio.as_completed(pool_futures):
+                pages_dependencies, written_count, skipped_count, deferred_image_tasks = await pool_future
+                for task, task_args in deferred_image_tasks:
+                    # Use the same locks as the image filters, so each image is derived once across all processes.
+                    submit_derivatives(app.image_executor, app.locks, task, *task_args)
+                writer.written_count += written_count
+                writer.skipped_count += skipped_count
+                if manifest is not None:
+                    for path, entity_dependencies, depends_on_ancestry, files in pages_dependencies:
+                        manifest.add_dependencies(path, entity_dependencies, depends_on_ancestry, files)
 
         # Log the generated pages.
         locale_label = Locale.parse(bcp_47_to_rfc_1766(locale)).get_display_name(locale=bcp_47_to_rfc_1766(app.configuration.locale or 'en-US'))
@@ -103,20 +252,237 @@ async def _generate(app: App) -> None:
             ))
 
 
-def _create_file(path: Path) -> AsyncContextManager[AsyncTextIOWrapper]:
-    path.parent.mkdir(exist_ok=True, parents=True)
-    return cast(AsyncContextManager[AsyncTextIOWrapper], aiofiles.open(path, 'w', encoding='utf-8'))
-
-
-def _create_html_resource(path: Path) -> AsyncContextManager[AsyncTextIOWrapper]:
-    return _create_file(path / 'index.html')
-
-
-def _create_json_resource(path: Path) -> AsyncContextManager[AsyncTextIOWrapper]:
-    return _create_file(path / 'index.json')
+async def _generate_concurrently(coroutines: AsyncIterator[Coroutine[Any, Any, None]]) -> None:
+    """
+    Await coroutines as they are produced, with no more than a fixed number running at the same time.
+
+    Coroutines are taken from the iterator only when there is room for them in a bounded queue, so the number of pending
+    coroutines does not grow with the size of the site.
+    """
+    queue: asyncio.Queue[Optional[Coroutine[Any, Any, None]]] = asyncio.Queue(_GENERATE_CONCURRENCY)
+
+    async def _produce() -> None:
+        async for coroutine in coroutines:
+            try:
+                await queue.put(coroutine)
+            except asyncio.CancelledError:
+                coroutine.close()
+                raise
+        # Tell each consumer there is no more work.
+        for _consumer_index in range(_GENERATE_CONCURRENCY):
+            await queue.put(None)
+
+    async def _consume() -> None:
+        while (coroutine := await queue.get()) is not None:
+            await coroutine
+
+    tasks = [
+        asyncio.create_task(_produce()),
+        *[asyncio.create_task(_consume()) for _consumer_index in range(_GENERATE_CONCURRENCY)],
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # If generation failed, close the coroutines that will never be awaited.
+        while not queue.empty():
+            coroutine = queue.get_nowait()
+            if coroutine is not None:
+                coroutine.close()
+
+
+async def _generate_localized(www_directory_path: Path, entity_types: Iterable[Type[UserFacingEntity]], app: App, manifest: Optional['_Manifest'] = None, generate_entities: bool = True) -> AsyncIterator[Coroutine[Any, Any, None]]:
+    for entity_type in entity_types:
+        async for coroutine in _generate_entity_type(
+            www_directory_path,
+            entity_type,
+            app,
+            manifest,
+            generate_entities,
+        ):
+            yield coroutine
+    yield _generate_openapi(www_directory_path, app)
 
 
-async def _generate_entity_type(www_directory_path: Path, entity_type: Type[UserFacingEntity], app: App):
+def _create_file(path: Path) -> AsyncContextManager[AsyncTextIOWrapper]:
+    makedirs(path.parent)
+    return cast(AsyncContextManager[AsyncTextIOWrapper], aiofiles.open(path, 'w', encoding='utf-8', opener=opener))
+
+
+class _Writer:
+    """
+    Write generated pages, unless the previous build generated identical pages.
+
+    Unchanged pages are linked from the previous output instead of written again, so they keep their modification times,
+    and tools that synchronize the output elsewhere can skip them. The same goes for their file variants.
+    """
+
+    def __init__(self, output_directory_path: Path, previous_output_directory_path: Path, file_variant_writers: Sequence[FileVariantWriter] = ()):
+        self._output_directory_path = output_directory_path
+        self.previous_output_directory_path = previous_output_directory_path
+        self._file_variant_writers = file_variant_writers
+        self.written_count = 0
+        self.skipped_count = 0
+
+    def _previous_path(self, path: Path) -> Path:
+        return self.previous_output_directory_path / path.relative_to(self._output_directory_path)
+
+    def _previous_size_matches(self, previous_path: Path, content: bytes) -> bool:
+        try:
+            return previous_path.stat().st_size == len(content)
+        except OSError:
+            return False
+
+    def keep(self, path: Path) -> bool:
+        """
+        Keep the page the previous build generated at the same path, if there is one.
+        """
+        if not self._keep(path):
+            return False
+        file_variant_writers = self._keep_variants(path)
+        if file_variant_writers:
+            self._write_variants(path, path.read_bytes(), file_variant_writers)
+        return True
+
+    def _keep(self, path: Path) -> bool:
+        makedirs(path.parent)
+        try:
+            link_or_copy(self._previous_path(path), path)
+        except FileNotFoundError:
+            return False
+        self.skipped_count += 1
+        return True
+
+    def _keep_variants(self, path: Path) -> List[FileVariantWriter]:
+        """
+        Keep the variants of a kept page that the previous build wrote.
+
+        :return: The file variant writers whose variants must be written again, because the previous build did not write
+            all of them.
+        """
+        file_variant_writers = []
+        for file_variant_writer in self._file_variant_writers:
+            previous_variant_paths = [
+                self._previous_path(path.with_name(path.name + suffix))
+                for suffix
+                in file_variant_writer.file_variant_suffixes(path)
+            ]
+            if not all(previous_variant_path.exists() for previous_variant_path in previous_variant_paths):
+                file_variant_writers.append(file_variant_writer)
+                continue
+            for previous_variant_path in previous_variant_paths:
+                link_or_copy(previous_variant_path, path.with_name(previous_variant_path.name))
+        return file_variant_writers
+
+    def _get_variant_writers(self, path: Path) -> List[FileVariantWriter]:
+        return [
+            file_variant_writer
+            for file_variant_writer
+            in self._file_variant_writers
+            if file_variant_writer.file_variant_suffixes(path)
+        ]
+
+    def _write_variants(self, path: Path, content: bytes, file_variant_writers: Iterable[FileVariantWriter]) -> None:
+        for file_variant_writer in file_variant_writers:
+            file_variant_writer.write_file_variants(path, content)
+
+    async def _write_variants_async(self, path: Path, content: bytes, file_variant_writers: Sequence[FileVariantWriter]) -> None:
+        if file_variant_writers:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_variants, path, content, file_variant_writers)
+
+    async def add(self, path: Path) -> None:
+        """
+        Add a file that was written by other means than this writer.
+        """
+        file_variant_writers = self._get_variant_writers(path)
+        if file_variant_writers:
+            async with aiofiles.open(path, 'rb') as f:
+                content = await f.read()
+            await self._write_variants_async(path, content, file_variant_writers)
+
+    def keep_file(self, path: Path) -> bool:
+        """
+        Keep a file the previous build published at the same path, unless this build published it already.
+        """
+        makedirs(path.parent)
+        try:
+            os.link(self._previous_path(path), path)
+        except FileExistsError:
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError:
+            try:
+                copy(self._previous_path(path), path)
+            except FileNotFoundError:
+                return False
+        return True
+
+    async def write(self, path: Path, content: str) -> None:
+        encoded_content = content.encode('utf-8')
+        previous_path = self._previous_path(path)
+        if self._previous_size_matches(previous_path, encoded_content):
+            with suppress(OSError):
+                async with aiofiles.open(previous_path, 'rb') as f:
+                    if await f.read() == encoded_content and self._keep(path):
+                        await self._write_variants_async(path, encoded_content, self._keep_variants(path))
+                        return
+        makedirs(path.parent)
+        async with aiofiles.open(path, 'wb', opener=opener) as f:
+            await f.write(encoded_content)
+        self.written_count += 1
+        await self._write_variants_async(path, encoded_content, self._get_variant_writers(path))
+
+    def write_sync(self, path: Path, content: str) -> None:
+        encoded_content = content.encode('utf-8')
+        previous_path = self._previous_path(path)
+        if self._previous_size_matches(previous_path, encoded_content):
+            with suppress(OSError):
+                with open(previous_path, 'rb') as f:
+                    if f.read() == encoded_content and self._keep(path):
+                        self._write_variants(path, encoded_content, self._keep_variants(path))
+                        return
+        makedirs(path.parent)
+        with open(path, 'wb', opener=opener) as f:
+            f.write(encoded_content)
+        self.written_count += 1
+        self._write_variants(path, encoded_content, self._get_variant_writers(path))
+
+
+# The writer for the site that is currently being generated.
+_writer: ContextVar[Optional[_Writer]] = ContextVar('_writer', default=None)
+
+
+async def _write_file(path: Path, content: str) -> None:
+    writer = _writer.get()
+    if writer is None:
+        async with _create_file(path) as f:
+            await f.write(content)
+    else:
+        await writer.write(path, content)
+
+
+async def add_file(path: Path) -> None:
+    """
+    Add a file that a generator wrote itself, such as a copied asset, to the site that is being generated.
+
+    This writes the file's variants, if it has any.
+    """
+    writer = _writer.get()
+    if writer is not None:
+        await writer.add(path)
+
+
+async def _write_html_resource(path: Path, content: str) -> None:
+    await _write_file(path / 'index.html', content)
+
+
+async def _write_json_resource(path: Path, content: str) -> None:
+    await _write_file(path / 'index.json', content)
+
+
+async def _generate_entity_type(www_directory_path: Path, entity_type: Type[UserFacingEntity], app: App, manifest: Optional['_Manifest'] = None, generate_entities: bool = True):
     if entity_type in app.project.configuration.entity_types and app.project.configuration.entity_types[entity_type].generate_html_list:
         yield _generate_entity_type_list_html(
             www_directory_path,
@@ -128,11 +494,14 @@ async def _generate_entity_type(www_directory_path: Path, entity_type: Type[User
         entity_type,
         app,
     )
+    if not generate_entities:
+        return
     for entity in app.project.ancestry.entities[entity_type]:
         async for coroutine in _generate_entity(
             www_directory_path,
             entity,
             app,
+            manifest,
         ):
             yield coroutine
 
@@ -149,8 +518,7 @@ async def _generate_entity_type_list_html(www_directory_path: Path, entity_type:
         'entity_type': entity_type,
         'entities': app.project.ancestry.entities[entity_type],
     })
-    async with _create_html_resource(entity_type_path) as f:
-        await f.write(rendered_html)
+    await _write_html_resource(entity_type_path, rendered_html)
     locale_label = Locale.parse(bcp_47_to_rfc_1766(app.locale)).get_display_name(locale=bcp_47_to_rfc_1766(app.configuration.locale or 'en-US'))
     getLogger().debug(_('Generated the listing HTML page for {entity_type} entities in {locale}.').format(
         entity_type=entity_type.entity_type_label_plural(),
@@ -173,42 +541,419 @@ async def _generate_entity_type_list_json(www_directory_path: Path, entity_type:
                 'application/json',
                 absolute=True,
             ))
-    rendered_json = json.dumps(data)
-    async with _create_json_resource(entity_type_path) as f:
-        await f.write(rendered_json)
+    rendered_json = dumps_json(data, app)
+    await _write_json_resource(entity_type_path, rendered_json)
 
 
-async def _generate_entity(www_directory_path: Path, entity: UserFacingEntity, app: App):
-    yield _generate_entity_html(www_directory_path, entity, app)
-    yield _generate_entity_json(www_directory_path, entity, app)
+async def _generate_entity(www_directory_path: Path, entity: UserFacingEntity, app: App, manifest: Optional['_Manifest'] = None):
+    yield _generate_entity_html(www_directory_path, entity, app, manifest)
+    yield _generate_entity_json(www_directory_path, entity, app, manifest)
 
 
-async def _generate_entity_html(www_directory_path: Path, entity: UserFacingEntity, app: App) -> None:
-    entity_type_name_fs = camel_case_to_kebab_case(get_entity_type_name(entity))
-    entity_path = www_directory_path / entity_type_name_fs / entity.id
-    rendered_html = app.jinja2_environment.negotiate_template([
-        f'entity/page--{entity_type_name_fs}.html.j2',
-        'entity/page.html.j2',
-    ]).render({
-        'page_resource': entity,
-        'entity_type': get_entity_type(entity),
-        'entity': entity,
-    })
-    async with _create_html_resource(entity_path) as f:
-        await f.write(rendered_html)
+def _entity_path(www_directory_path: Path, entity: UserFacingEntity) -> Path:
+    return www_directory_path / camel_case_to_kebab_case(get_entity_type_name(entity)) / entity.id
 
 
-async def _generate_entity_json(www_directory_path: Path, entity: UserFacingEntity, app: App) -> None:
+def _render_entity_html(entity: UserFacingEntity, app: App) -> Tuple[str, List[Any], Set[str]]:
+    """
+    Render an entity's HTML page, and return it along with the entities and ancestries it was rendered from, and the
+    files it published.
+    """
     entity_type_name_fs = camel_case_to_kebab_case(get_entity_type_name(entity))
-    entity_path = www_directory_path / entity_type_name_fs / entity.id
-    rendered_json = json.dumps(entity, cls=JSONEncoder.get_factory(app))
-    async with _create_json_resource(entity_path) as f:
-        await f.write(rendered_json)
+    with app.jinja2_environment.record_dependencies() as dependencies, app.jinja2_environment.record_files() as files:
+        rendered_html = app.jinja2_environment.negotiate_template([
+            f'entity/page--{entity_type_name_fs}.html.j2',
+            'entity/page.html.j2',
+        ]).render({
+            'page_resource': entity,
+            'entity_type': get_entity_type(entity),
+            'entity': entity,
+        })
+    return rendered_html, [entity, *dependencies.values()], files
+
+
+def _render_entity_json(entity: UserFacingEntity, app: App) -> str:
+    return dumps_json(entity, app)
+
+
+async def _generate_entity_html(www_directory_path: Path, entity: UserFacingEntity, app: App, manifest: Optional['_Manifest'] = None) -> None:
+    entity_path = _entity_path(www_directory_path, entity)
+    if manifest is not None and manifest.keep(entity_path / 'index.html'):
+        return
+    rendered_html, dependencies, files = _render_entity_html(entity, app)
+    await _write_html_resource(entity_path, rendered_html)
+    if manifest is not None:
+        manifest.add(entity_path / 'index.html', dependencies, files)
+
+
+async def _generate_entity_json(www_directory_path: Path, entity: UserFacingEntity, app: App, manifest: Optional['_Manifest'] = None) -> None:
+    entity_path = _entity_path(www_directory_path, entity)
+    if manifest is not None and manifest.keep(entity_path / 'index.json'):
+        return
+    rendered_json = _render_entity_json(entity, app)
+    await _write_json_resource(entity_path, rendered_json)
+    if manifest is not None:
+        manifest.add(entity_path / 'index.json', [entity])
 
 
 async def _generate_openapi(www_directory_path: Path, app: App) -> None:
     api_directory_path = www_directory_path / 'api'
-    api_directory_path.mkdir(exist_ok=True, parents=True)
+    makedirs(api_directory_path)
     rendered_json = json.dumps(build_specification(app))
-    async with _create_json_resource(api_directory_path) as f:
-        await f.write(rendered_json)
+    await _write_json_resource(api_directory_path, rendered_json)
+
+
+_DeferredTask = Tuple[Callable[..., Any], Tuple[Any, ...]]
+
+
+class _DeferredExecutor(Executor):
+    """
+    Collect tasks for the parent process to run.
+
+    Worker processes derive images through this executor, so the parent process can deduplicate the images all workers
+    need, and derive them in a single pool.
+    """
+
+    def __init__(self):
+        self._tasks: List[_DeferredTask] = []
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        if kwargs:
+            raise ValueError('Deferred tasks take positional arguments only.')
+        self._tasks.append((fn, args))
+        future: Future = Future()
+        future.set_result(None)
+        return future
+
+    def pop_tasks(self) -> List[_DeferredTask]:
+        tasks = self._tasks
+        self._tasks = []
+        return tasks
+
+
+# The application that worker processes render pages with, and the executor it derives images with. They are set up by
+# :py:func:`betty.generate._init_worker`.
+_worker_app: Optional[App] = None
+_worker_image_executor: Optional[_DeferredExecutor] = None
+
+
+class _Pool(ProcessPoolExecutor):
+    def __init__(self, app: App, jobs: int):
+        self.jobs = jobs
+        # Workers receive the loaded ancestry through a file, because it is too big for the pool to send efficiently.
+        self._ancestry_directory = TemporaryDirectory()
+        ancestry_file_path = Path(self._ancestry_directory.name) / 'ancestry.pickle'
+        with open(ancestry_file_path, 'wb') as f:
+            pickle_entities(app.project.ancestry.entities, f)
+        # Spawn rather than fork workers, because forking a process with running threads and event loops is unsafe.
+        super().__init__(
+            jobs,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(
+                json.dumps(app.project.configuration.dump()),
+                app.project.configuration.configuration_file_path,
+                app.project.configuration.output_directory_path,
+                ancestry_file_path,
+            ),
+        )
+
+    def shutdown(self, *args, **kwargs) -> None:
+        super().shutdown(*args, **kwargs)
+        self._ancestry_directory.cleanup()
+
+
+def _init_worker(dumped_configuration: str, configuration_file_path: Path, output_directory_path: Path, ancestry_file_path: Path) -> None:
+    global _worker_app, _worker_image_executor
+    app = App()
+    _worker_image_executor = _DeferredExecutor()
+    app.image_executor = _worker_image_executor
+    # Load the configuration the way FileBasedConfiguration.read() does, so relative paths resolve the same way.
+    loader = ConfigurationLoader()
+    with ChDir(configuration_file_path.parent):
+        app.project.configuration.load(json.loads(dumped_configuration), loader)
+    loader.commit()
+    app.project.configuration.configuration_file_path = configuration_file_path
+    app.project.configuration.output_directory_path = output_directory_path
+    app.acquire()
+    with open(ancestry_file_path, 'rb') as f:
+        app.project.ancestry.entities.append(*unpickle_entities(f))
+    _worker_app = app
+
+
+def _shard_entities(
+    www_directory_path: Path,
+    entity_types: Iterable[Type[UserFacingEntity]],
+    app: App,
+    jobs: int,
+    manifest: Optional['_Manifest'] = None,
+) -> Iterable[Tuple[str, List[Tuple[str, bool, bool]]]]:
+    """
+    Divide the entity pages to render over shards of (entity type name, [(entity ID, render HTML, render JSON)]).
+    """
+    for entity_type in entity_types:
+        pages = []
+        for entity in app.project.ancestry.entities[entity_type]:
+            entity_path = _entity_path(www_directory_path, entity)
+            render_html = manifest is None or not manifest.keep(entity_path / 'index.html')
+            render_json = manifest is None or not manifest.keep(entity_path / 'index.json')
+            if render_html or render_json:
+                pages.append((entity.id, render_html, render_json))
+        # Create several shards per worker, so workers that finish early can take over some of the remaining work.
+        shard_size = max(1, math.ceil(len(pages) / (jobs * 4)))
+        for i in range(0, len(pages), shard_size):
+            yield get_entity_type_name(entity_type), pages[i:i + shard_size]
+
+
+def _generate_entities_in_worker(
+    locale: str,
+    www_directory_path: Path,
+    previous_output_directory_path: Path,
+    entity_type_name: str,
+    pages: List[Tuple[str, bool, bool]],
+) -> Tuple[List[_PageDependencies], int, int, List[_DeferredTask]]:
+    """
+    Render and write a shard of entity pages.
+
+    :return: The dependencies of the rendered pages, the number of pages written, the number of unchanged pages, and
+        the image tasks for the parent process to run.
+    """
+    app = _worker_app
+    assert app is not None
+    assert _worker_image_executor is not None
+    writer = _Writer(app.project.configuration.output_directory_path, previous_output_directory_path, _get_file_variant_writers(app))
+    pages_dependencies = []
+    with app.acquire_locale(locale):
+        entities = app.project.ancestry.entities[entity_type_name]
+        for entity_id, render_html, render_json in pages:
+            entity = entities[entity_id]
+            entity_path = _entity_path(www_directory_path, entity)
+            if render_html:
+                rendered_html, dependencies, files = _render_entity_html(entity, app)
+                writer.write_sync(entity_path / 'index.html', rendered_html)
+                pages_dependencies.append((entity_path / 'index.html', *_Manifest.dependencies(dependencies), sorted(files)))
+            if render_json:
+                writer.write_sync(entity_path / 'index.json', _render_entity_json(entity, app))
+                pages_dependencies.append((entity_path / 'index.json', *_Manifest.dependencies([entity]), []))
+    return pages_dependencies, writer.written_count, writer.skipped_count, _worker_image_executor.pop_tasks()
+
+
+class _Fingerprints:
+    """
+    Fingerprint entities by their contents, so changes to them can be detected across builds.
+
+    An entity's fingerprint covers its own state, and that of its direct associates. Associates with generated IDs are
+    identified by their contents rather than their IDs, because generated IDs are not stable across loads.
+    """
+
+    def __init__(self, ancestry: Ancestry):
+        self._ancestry = ancestry
+        self._entity_fingerprints: Dict[int, str] = {}
+        self._ancestry_fingerprint: Optional[str] = None
+
+    def entity(self, entity: Entity) -> str:
+        try:
+            return self._entity_fingerprints[id(entity)]
+        except KeyError:
+            fingerprint = hashlib.md5()
+            self._update_entity(fingerprint, entity, 2, set())
+            self._entity_fingerprints[id(entity)] = fingerprint.hexdigest()
+            return self._entity_fingerprints[id(entity)]
+
+    def ancestry(self) -> str:
+        if self._ancestry_fingerprint is None:
+            fingerprint = hashlib.md5()
+            for entity in cast(Iterable[Entity], self._ancestry.entities):
+                self._update_entity(fingerprint, entity, 1, set())
+            self._ancestry_fingerprint = fingerprint.hexdigest()
+        return self._ancestry_fingerprint
+
+    def page(self, entity_dependencies: Iterable[Tuple[str, str]], depends_on_ancestry: bool) -> Optional[str]:
+        """
+        Fingerprint a page by the entities it depends on, or return None if any of them no longer exist.
+        """
+        fingerprint = hashlib.md5()
+        for entity_type_name, entity_id in entity_dependencies:
+            try:
+                entity: Entity = self._ancestry.entities[entity_type_name][entity_id]
+            except (KeyError, EntityTypeError):
+                return None
+            fingerprint.update(self.entity(entity).encode('utf-8'))
+        if depends_on_ancestry:
+            fingerprint.update(self.ancestry().encode('utf-8'))
+        return fingerprint.hexdigest()
+
+    def _update_entity(self, fingerprint: Any, entity: Entity, depth: int, visiting: Set[int]) -> None:
+        fingerprint.update(f'<{get_entity_type_name(entity)}'.encode('utf-8'))
+        is_generated = isinstance(entity.id, GeneratedEntityId)
+        if not is_generated:
+            fingerprint.update(f' {entity.id}'.encode('utf-8'))
+        # Expand entities until the requested depth has been reached, and always expand entities with generated IDs, so
+        # they are identified by their contents. Entities that are already being expanded are part of a cycle.
+        if (depth > 0 or is_generated) and id(entity) not in visiting:
+            visiting.add(id(entity))
+            for attr_name, value in sorted(vars(entity).items()):
+                if attr_name == '_id':
+                    continue
+                # To-many associations create their collections once they are accessed, so consider empty collections
+                # absent, like unset values.
+                if value is None or isinstance(value, EntityCollection) and not len(value):
+                    continue
+                fingerprint.update(f' {attr_name}='.encode('utf-8'))
+                self._update_value(fingerprint, value, depth - 1, visiting)
+            visiting.remove(id(entity))
+        fingerprint.update(b'>')
+
+    def _update_value(self, fingerprint: Any, value: Any, depth: int, visiting: Set[int]) -> None:
+        if value is None or isinstance(value, (bool, int, float, str, Path)):
+            fingerprint.update(f'{type(value).__name__}:{value};'.encode('utf-8'))
+        elif isinstance(value, Entity):
+            self._update_entity(fingerprint, value, depth, visiting)
+        elif isinstance(value, (EntityCollection, list, tuple)):
+            fingerprint.update(b'[')
+            for item in value:
+                self._update_value(fingerprint, item, depth, visiting)
+            fingerprint.update(b']')
+        elif isinstance(value, dict):
+            fingerprint.update(b'{')
+            for key, item in sorted(value.items(), key=lambda x: str(x[0])):
+                fingerprint.update(f'{key}:'.encode('utf-8'))
+                self._update_value(fingerprint, item, depth, visiting)
+            fingerprint.update(b'}')
+        elif isinstance(value, (set, frozenset)):
+            # Sets are unordered, so fingerprint their items separately, and combine those in a stable order.
+            item_digests = []
+            for item in value:
+                item_fingerprint = hashlib.md5()
+                self._update_value(item_fingerprint, item, depth, visiting)
+                item_digests.append(item_fingerprint.digest())
+            fingerprint.update(b'(')
+            for item_digest in sorted(item_digests):
+                fingerprint.update(item_digest)
+            fingerprint.update(b')')
+        elif hasattr(value, '__dict__'):
+            fingerprint.update(f'{type(value).__module__}.{type(value).__qualname__}'.encode('utf-8'))
+            self._update_value(fingerprint, vars(value), depth, visiting)
+        else:
+            fingerprint.update(repr(value).encode('utf-8'))
+
+
+async def _fingerprint_site(app: App) -> str:
+    """
+    Fingerprint the inputs that all pages share.
+    """
+    fingerprint = hashlib.md5()
+    fingerprint.update(about.version().encode('utf-8'))
+    fingerprint.update(json.dumps(app.project.configuration.dump(), sort_keys=True, default=str).encode('utf-8'))
+    for assets_directory_path, _encoding in app.assets.paths:
+        asset_file_paths = sorted([asset_file_path async for asset_file_path in iterfiles(assets_directory_path)])
+        for asset_file_path in asset_file_paths:
+            asset_file_stat = asset_file_path.stat()
+            fingerprint.update(f'{asset_file_path}:{asset_file_stat.st_mtime_ns}:{asset_file_stat.st_size};'.encode('utf-8'))
+    return fingerprint.hexdigest()
+
+
+class _Manifest:
+    """
+    Track the inputs of the entity pages generated by incremental builds.
+
+    A page is kept as long as the entities it was rendered from, the Betty version, the project configuration, and the
+    assets have not changed since the previous incremental build.
+    """
+
+    _FILE_NAME = 'manifest.json'
+
+    def __init__(self, app: App, writer: _Writer, site_fingerprint: str, previous_site_fingerprint: Optional[str], previous_pages: Dict[str, Dict[str, Any]]):
+        self._app = app
+        self._writer = writer
+        self._site_fingerprint = site_fingerprint
+        self._reuse_previous_pages = site_fingerprint == previous_site_fingerprint
+        self._previous_pages = previous_pages
+        self._pages: Dict[str, Dict[str, Any]] = {}
+        self._fingerprints = _Fingerprints(app.project.ancestry)
+
+    @classmethod
+    def _path(cls, app: App) -> Path:
+        return app.project.configuration.output_directory_path / cls._FILE_NAME
+
+    @classmethod
+    async def read(cls, app: App, writer: _Writer) -> '_Manifest':
+        previous_site_fingerprint = None
+        previous_pages = {}
+        with suppress(FileNotFoundError, ValueError, KeyError):
+            async with aiofiles.open(cls._path(app), encoding='utf-8') as f:
+                dumped_manifest = json.loads(await f.read())
+            previous_site_fingerprint = dumped_manifest['site']
+            previous_pages = dumped_manifest['pages']
+        return cls(app, writer, await _fingerprint_site(app), previous_site_fingerprint, previous_pages)
+
+    async def write(self) -> None:
+        async with _create_file(self._path(self._app)) as f:
+            await f.write(json.dumps({
+                'site': self._site_fingerprint,
+                'pages': self._pages,
+            }))
+
+    def _key(self, path: Path) -> str:
+        return path.relative_to(self._app.project.configuration.output_directory_path).as_posix()
+
+    def keep(self, path: Path) -> bool:
+        """
+        Keep a previously generated page, if its inputs have not changed.
+        """
+        if not self._reuse_previous_pages:
+            return False
+        key = self._key(path)
+        try:
+            page = self._previous_pages[key]
+            # Manifests written before files were tracked cannot tell which files to keep.
+            file_paths = page['files']
+        except KeyError:
+            return False
+        entity_dependencies = [tuple(entity_dependency) for entity_dependency in page['dependencies']]
+        if page['fingerprint'] != self._fingerprints.page(entity_dependencies, page['ancestry']):  # type: ignore
+            return False
+        # Kept pages do not run the filters that publish files, so keep the files they published previously as well.
+        www_directory_path = self._app.project.configuration.www_directory_path
+        for file_path in file_paths:
+            if not self._writer.keep_file(www_directory_path / file_path):
+                return False
+        if not self._writer.keep(path):
+            return False
+        self._pages[key] = page
+        return True
+
+    @classmethod
+    def dependencies(cls, dependencies: Iterable[Any]) -> Tuple[List[Tuple[str, str]], bool]:
+        """
+        Convert the entities and ancestries a page was generated from to the page's dependencies in the manifest.
+        """
+        dependencies = list(dependencies)
+        entity_dependencies = sorted({
+            (get_entity_type_name(dependency), dependency.id)
+            for dependency
+            in dependencies
+            # Entities with generated IDs cannot be found again in later builds, but because they are always
+            # fingerprinted as part of the entities they are associated with, they need not be.
+            if isinstance(dependency, Entity) and not isinstance(dependency.id, GeneratedEntityId)
+        })
+        depends_on_ancestry = any(isinstance(dependency, Ancestry) for dependency in dependencies)
+        return entity_dependencies, depends_on_ancestry
+
+    def add(self, path: Path, dependencies: Iterable[Any], files: Iterable[str] = ()) -> None:
+        """
+        Add a newly generated page, the entities and ancestries it was generated from, and the files it published.
+        """
+        self.add_dependencies(path, *self.dependencies(dependencies), sorted(files))
+
+    def add_dependencies(self, path: Path, entity_dependencies: List[Tuple[str, str]], depends_on_ancestry: bool, files: List[str]) -> None:
+        """
+        Add a newly generated page, its dependencies as returned by :py:meth:`betty.generate._Manifest.dependencies`,
+        and the files it published, relative to the web root.
+        """
+        self._pages[self._key(path)] = {
+            'dependencies': entity_dependencies,
+            'ancestry': depends_on_ancestry,
+            'files': files,
+            'fingerprint': self._fingerprints.page(entity_dependencies, depends_on_ancestry),
+        }
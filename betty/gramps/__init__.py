@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
 
 from betty.app.extension import ConfigurableExtension, UserFacingExtension
 
@@ -11,10 +12,10 @@ if TYPE_CHECKING:
 from betty.gramps.config import GrampsConfiguration
 from betty.gramps.loader import load_file
 from betty.gui import GuiBuilder
-from betty.load import Loader
+from betty.load import CacheableLoader
 
 
-class Gramps(ConfigurableExtension[GrampsConfiguration], UserFacingExtension, Loader, GuiBuilder):
+class Gramps(ConfigurableExtension[GrampsConfiguration], UserFacingExtension, CacheableLoader, GuiBuilder):
     @classmethod
     def default_configuration(cls) -> GrampsConfiguration:
         return GrampsConfiguration()
@@ -25,6 +26,11 @@ class Gramps(ConfigurableExtension[GrampsConfiguration], UserFacingExtension, Lo
             if file_path:
                 await load_file(self._app.project.ancestry, file_path)
 
+    def loader_source_file_paths(self) -> Iterable[Path]:
+        for family_tree in self.configuration.family_trees:
+            if family_tree.file_path:
+                yield family_tree.file_path
+
     @classmethod
     def label(cls) -> str:
         return 'Gramps'
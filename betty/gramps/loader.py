@@ -1,16 +1,21 @@
 import gzip
+import hashlib
 import re
+import shutil
 import tarfile
 from collections import defaultdict
 from contextlib import suppress
-from tempfile import TemporaryDirectory
-from typing import Optional, List, Union, Iterable, Dict, Type, Tuple
+from io import StringIO
+from pathlib import PurePosixPath
+from typing import Optional, List, Union, Iterable, Dict, Tuple, IO, Callable
 from xml.etree import ElementTree
 
-import aiofiles
+from aiofiles import os as aiofiles_os
 from geopy import Point
 
+from betty import fs
 from betty.config import Path
+from betty.fs import hashfile
 from betty.gramps.error import GrampsError
 from betty.load import getLogger
 from betty.locale import DateRange, Datey, Date
@@ -35,16 +40,14 @@ class GrampsFileNotFoundError(GrampsError, FileNotFoundError):
         super().__init__(*args, **kwargs)
 
 
-class XPathError(GrampsError, RuntimeError):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-
 async def load_file(ancestry: Ancestry, file_path: PathLike) -> None:
     file_path = Path(file_path).resolve()
     logger = getLogger()
     logger.info('Loading %s...' % str(file_path))
 
+    if not await aiofiles_os.path.exists(file_path):
+        raise GrampsFileNotFoundError(f'Could not find the file "{file_path}".')
+
     with suppress(GrampsLoadFileError):
         load_gpkg(ancestry, file_path)
         return
@@ -53,13 +56,8 @@ async def load_file(ancestry: Ancestry, file_path: PathLike) -> None:
         load_gramps(ancestry, file_path)
         return
 
-    try:
-        async with aiofiles.open(file_path) as f:
-            xml = await f.read()
-    except FileNotFoundError:
-        raise GrampsFileNotFoundError(f'Could not find the file "{file_path}".') from None
     with suppress(GrampsLoadFileError):
-        load_xml(ancestry, xml, file_path.anchor)
+        load_xml(ancestry, file_path, file_path.anchor)
         return
 
     raise GrampsLoadFileError('Could not load "%s" as a *.gpkg, a *.gramps, or an *.xml family tree.' % file_path)
@@ -69,91 +67,178 @@ def load_gramps(ancestry: Ancestry, gramps_path: PathLike) -> None:
     gramps_path = Path(gramps_path).resolve()
     try:
         with gzip.open(gramps_path, mode='r') as f:
-            xml = f.read()
-        load_xml(
-            ancestry,
-            xml,  # type: ignore
-            rootname(gramps_path),
-        )
+            _Loader(ancestry, rootname(gramps_path)).load(f)
     except OSError:
         raise GrampsLoadFileError()
 
 
 def load_gpkg(ancestry: Ancestry, gpkg_path: PathLike) -> None:
+    """
+    Load a Gramps package.
+
+    The package's data.gramps is parsed straight from the archive. Of the media files in the package, only those
+    referenced by the loaded files are extracted, to a cache directory specific to this package.
+
+    The archive is read sequentially, because a gzipped archive can only be read backwards by decompressing it again from
+    the start. It is read once to load data.gramps and extract the media files that follow it, and once more only if
+    referenced media files precede data.gramps, as they do in packages exported by Gramps.
+    """
     gpkg_path = Path(gpkg_path).resolve()
+    gramps_tree_directory_path = _get_gpkg_directory_path(gpkg_path)
+    version_file_path = gramps_tree_directory_path.with_name(f'{gramps_tree_directory_path.name}.version')
+    version = hashfile(gpkg_path)
+    _remove_stale_gpkg_directory(gramps_tree_directory_path, version_file_path, version)
     try:
-        tar_file = gzip.open(gpkg_path)
-        try:
-            with TemporaryDirectory() as cache_directory_path:
-                tarfile.open(
-                    fileobj=tar_file,  # type: ignore
-                ).extractall(cache_directory_path)
-                load_gramps(ancestry, Path(cache_directory_path) / 'data.gramps')
-        except tarfile.ReadError:
-            raise GrampsLoadFileError('Could not read "%s" as a *.tar file after un-gzipping it.' % gpkg_path)
+        file_paths = None
+        with tarfile.open(gpkg_path, mode='r|gz') as tar_file:
+            for member in tar_file:
+                if file_paths is not None:
+                    _extract_gpkg_member(tar_file, member, file_paths)
+                elif member.name == 'data.gramps':
+                    data_gramps_file = tar_file.extractfile(member)
+                    if data_gramps_file is None:
+                        raise GrampsLoadFileError('Could not read data.gramps in "%s".' % gpkg_path)
+                    with data_gramps_file, gzip.open(data_gramps_file, mode='r') as f:
+                        loader = _Loader(ancestry, gramps_tree_directory_path)
+                        loader.load(f)
+                    file_paths = _get_gpkg_file_paths(gramps_tree_directory_path, loader.files)
+        if file_paths is None:
+            raise GrampsLoadFileError('Could not find data.gramps in "%s".' % gpkg_path)
+        if file_paths:
+            with tarfile.open(gpkg_path, mode='r|gz') as tar_file:
+                for member in tar_file:
+                    _extract_gpkg_member(tar_file, member, file_paths)
+                    if not file_paths:
+                        break
+    except tarfile.TarError:
+        raise GrampsLoadFileError('Could not read "%s" as a gzipped *.tar file.' % gpkg_path)
     except OSError:
         raise GrampsLoadFileError('Could not un-gzip "%s".' % gpkg_path)
+    version_file_path.parent.mkdir(parents=True, exist_ok=True)
+    version_file_path.write_text(version)
+
+
+def _get_gpkg_directory_path(gpkg_path: Path) -> Path:
+    # Key the directory on the package's path rather than on its version, so that a new version of a package replaces
+    # the files extracted from the previous version instead of leaving them behind.
+    return fs.CACHE_DIRECTORY_PATH / 'gramps' / hashlib.md5(str(gpkg_path).encode('utf-8')).hexdigest()
+
+
+def _remove_stale_gpkg_directory(gramps_tree_directory_path: Path, version_file_path: Path, version: str) -> None:
+    try:
+        extracted_version = version_file_path.read_text()
+    except FileNotFoundError:
+        extracted_version = None
+    # The version is written once all files have been extracted, so a missing version may mean an incomplete extraction.
+    if extracted_version != version:
+        shutil.rmtree(gramps_tree_directory_path, ignore_errors=True)
+        with suppress(FileNotFoundError):
+            version_file_path.unlink()
+
+
+def _get_gpkg_file_paths(gramps_tree_directory_path: Path, files: Iterable[File]) -> Dict[str, Path]:
+    """
+    Get the paths to extract files to, keyed by the names of their archive members.
+    """
+    file_paths = {}
+    for file in files:
+        try:
+            member_path = file.path.relative_to(gramps_tree_directory_path)
+        except ValueError:
+            # This file lives outside the package.
+            continue
+        if '..' in member_path.parts:
+            continue
+        if file.path.exists():
+            continue
+        file_paths[member_path.as_posix()] = file.path
+    return file_paths
+
+
+def _extract_gpkg_member(tar_file: tarfile.TarFile, member: tarfile.TarInfo, file_paths: Dict[str, Path]) -> None:
+    try:
+        file_path = file_paths.pop(PurePosixPath(member.name).as_posix())
+    except KeyError:
+        return
+    member_file = tar_file.extractfile(member)
+    if member_file is None:
+        return
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with member_file, open(file_path, 'wb') as f:
+        shutil.copyfileobj(member_file, f)
 
 
 def load_xml(ancestry: Ancestry, xml: Union[str, PathLike], gramps_tree_directory_path: PathLike) -> None:
     gramps_tree_directory_path = Path(gramps_tree_directory_path).resolve()
-    with suppress(FileNotFoundError, OSError):
-        with open(xml) as f:
-            xml = f.read()
     try:
-        tree = ElementTree.ElementTree(ElementTree.fromstring(
-            xml,  # type: ignore
-        ))
-    except ElementTree.ParseError as e:
-        raise GrampsLoadFileError(e)
-    _Loader(ancestry, tree, gramps_tree_directory_path).load()
+        f = open(xml, 'rb')
+    except OSError:
+        _Loader(ancestry, gramps_tree_directory_path).load(StringIO(str(xml)))
+        return
+    with f:
+        _Loader(ancestry, gramps_tree_directory_path).load(f)
 
 
 class _Loader:
-    def __init__(self, ancestry: Ancestry, tree: ElementTree.ElementTree, gramps_tree_directory_path: Path):
+    """
+    Load a Gramps XML document.
+
+    The document is parsed incrementally, and each Gramps object's element is discarded as soon as it has been loaded,
+    so the loader never holds the entire document in memory.
+    """
+
+    def __init__(self, ancestry: Ancestry, gramps_tree_directory_path: Path):
         self._ancestry = ancestry
         self._flattened_entities = FlattenedEntityCollection()
-        self._added_entity_counts: Dict[Type[Entity], int] = defaultdict(lambda: 0)
-        self._tree = tree
         self._gramps_tree_directory_path = gramps_tree_directory_path
+        self._files: List[File] = []
 
-    def load(self) -> None:
-        logger = getLogger()
-
-        database = self._tree.getroot()
-
-        _load_notes(self, database)
-        logger.info(f'Loaded {self._added_entity_counts[Note]} notes.')
-
-        _load_objects(self, database, self._gramps_tree_directory_path)
-        logger.info(f'Loaded {self._added_entity_counts[File]} files.')
-
-        _load_repositories(self, database)
-        repository_count = self._added_entity_counts[Source]
-        logger.info(f'Loaded {repository_count} repositories as sources.')
-
-        _load_sources(self, database)
-        logger.info(f'Loaded {self._added_entity_counts[Source] - repository_count} sources.')
+    @property
+    def gramps_tree_directory_path(self) -> Path:
+        return self._gramps_tree_directory_path
 
-        _load_citations(self, database)
-        logger.info(f'Loaded {self._added_entity_counts[Citation]} citations.')
+    @property
+    def files(self) -> List[File]:
+        """
+        The files loaded from the document.
+        """
+        return self._files
 
-        _load_places(self, database)
-        logger.info(f'Loaded {self._added_entity_counts[Place]} places.')
-
-        _load_events(self, database)
-        logger.info(f'Loaded {self._added_entity_counts[Event]} events.')
-
-        _load_people(self, database)
-        logger.info(f'Loaded {self._added_entity_counts[Person]} people.')
+    def load(self, xml: Union[IO, gzip.GzipFile]) -> None:
+        logger = getLogger()
 
-        _load_families(self, database)
+        # The elements from the document root to the element currently being parsed.
+        ancestors: List[ElementTree.Element] = []
+        section_counts: Dict[str, int] = defaultdict(lambda: 0)
+        try:
+            for event, element in ElementTree.iterparse(xml, events=('start', 'end')):
+                if event == 'start':
+                    ancestors.append(element)
+                    continue
+                ancestors.pop()
+                if not ancestors:
+                    continue
+                parent = ancestors[-1]
+                if len(ancestors) == 2:
+                    with suppress(KeyError):
+                        child_tag, load_child, _ = _SECTIONS[parent.tag]
+                        if element.tag == child_tag:
+                            load_child(self, element)
+                            section_counts[parent.tag] += 1
+                    parent.remove(element)
+                elif len(ancestors) == 1:
+                    with suppress(KeyError):
+                        _, _, message = _SECTIONS[element.tag]
+                        if message is not None:
+                            logger.info(message.format(count=section_counts[element.tag]))
+                    parent.remove(element)
+        except ElementTree.ParseError as e:
+            raise GrampsLoadFileError(e)
 
         self._ancestry.entities.append(*self._flattened_entities.unflatten())
 
     def add_entity(self, entity: Entity) -> None:
         self._flattened_entities.add_entity(entity)
-        self._added_entity_counts[get_entity_type(unflatten(entity))] += 1
 
     def add_association(self, *args, **kwargs) -> None:
         self._flattened_entities.add_association(*args, **kwargs)
@@ -164,47 +249,66 @@ _NS = {
 }
 
 
-def _xpath(element: ElementTree.Element, selector: str) -> List[ElementTree.Element]:
-    return element.findall(selector, namespaces=_NS)
+_NS_PREFIX = '{%s}' % _NS['ns']
+_NS_PREFIX_LENGTH = len(_NS_PREFIX)
 
 
-def _xpath1(element: ElementTree.Element, selector: str) -> ElementTree.Element:
-    found_element = element.find(selector, namespaces=_NS)
-    if found_element is None:
-        raise XPathError(f'Cannot find an element "{selector}" within {element}.')
-    return found_element
+_Children = Dict[str, List[ElementTree.Element]]
+
+
+def _children(element: ElementTree.Element) -> _Children:
+    """
+    Group an element's Gramps child elements by their local tag names, visiting each child once.
+    """
+    children: _Children = {}
+    for child in element:
+        tag = child.tag
+        if tag.startswith(_NS_PREFIX):
+            children.setdefault(tag[_NS_PREFIX_LENGTH:], []).append(child)
+    return children
+
+
+def _child(children: _Children, tag: str) -> Optional[ElementTree.Element]:
+    try:
+        return children[tag][0]
+    except KeyError:
+        return None
+
+
+def _child_text(children: _Children, tag: str) -> Optional[str]:
+    child = _child(children, tag)
+    if child is None:
+        return None
+    return child.text
 
 
 _DATE_PATTERN = re.compile(r'^.{4}((-.{2})?-.{2})?$')
 _DATE_PART_PATTERN = re.compile(r'^\d+$')
 
 
-def _load_date(element: ElementTree.Element) -> Optional[Datey]:
-    with suppress(XPathError):
-        dateval_element = _xpath1(element, './ns:dateval')
-        if dateval_element.get('cformat') is None:
-            dateval_type = dateval_element.get('type')
-            if dateval_type is None:
-                return _load_dateval(dateval_element, 'val')
-            dateval_type = str(dateval_type)
-            if dateval_type == 'about':
-                date = _load_dateval(dateval_element, 'val')
-                if date is None:
-                    return None
-                date.fuzzy = True
-                return date
-            if dateval_type == 'before':
-                return DateRange(None, _load_dateval(dateval_element, 'val'), end_is_boundary=True)
-            if dateval_type == 'after':
-                return DateRange(_load_dateval(dateval_element, 'val'), start_is_boundary=True)
-    with suppress(XPathError):
-        datespan_element = _xpath1(element, './ns:datespan')
-        if datespan_element.get('cformat') is None:
-            return DateRange(_load_dateval(datespan_element, 'start'), _load_dateval(datespan_element, 'stop'))
-    with suppress(XPathError):
-        daterange_element = _xpath1(element, './ns:daterange')
-        if daterange_element.get('cformat') is None:
-            return DateRange(_load_dateval(daterange_element, 'start'), _load_dateval(daterange_element, 'stop'), start_is_boundary=True, end_is_boundary=True)
+def _load_date(children: _Children) -> Optional[Datey]:
+    dateval_element = _child(children, 'dateval')
+    if dateval_element is not None and dateval_element.get('cformat') is None:
+        dateval_type = dateval_element.get('type')
+        if dateval_type is None:
+            return _load_dateval(dateval_element, 'val')
+        dateval_type = str(dateval_type)
+        if dateval_type == 'about':
+            date = _load_dateval(dateval_element, 'val')
+            if date is None:
+                return None
+            date.fuzzy = True
+            return date
+        if dateval_type == 'before':
+            return DateRange(None, _load_dateval(dateval_element, 'val'), end_is_boundary=True)
+        if dateval_type == 'after':
+            return DateRange(_load_dateval(dateval_element, 'val'), start_is_boundary=True)
+    datespan_element = _child(children, 'datespan')
+    if datespan_element is not None and datespan_element.get('cformat') is None:
+        return DateRange(_load_dateval(datespan_element, 'start'), _load_dateval(datespan_element, 'stop'))
+    daterange_element = _child(children, 'daterange')
+    if daterange_element is not None and daterange_element.get('cformat') is None:
+        return DateRange(_load_dateval(daterange_element, 'start'), _load_dateval(daterange_element, 'stop'), start_is_boundary=True, end_is_boundary=True)
     return None
 
 
@@ -226,33 +330,23 @@ def _load_dateval(element: ElementTree.Element, value_attribute_name: str) -> Op
     return None
 
 
-def _load_notes(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:notes/ns:note'):
-        _load_note(loader, element)
-
-
 def _load_note(loader: _Loader, element: ElementTree.Element) -> None:
     handle = element.get('handle')
     note_id = element.get('id')
     assert note_id is not None
-    text_element = _xpath1(element, './ns:text')
-    assert text_element is not None
-    text = str(text_element.text)
+    text = str(_child_text(_children(element), 'text'))
     loader.add_entity(FlattenedEntity(Note(note_id, text), handle))
 
 
-def _load_objects(loader: _Loader, database: ElementTree.Element, gramps_tree_directory_path: Path) -> None:
-    for element in _xpath(database, './ns:objects/ns:object'):
-        _load_object(loader, element, gramps_tree_directory_path)
-
-
-def _load_object(loader: _Loader, element: ElementTree.Element, gramps_tree_directory_path: Path) -> None:
+def _load_object(loader: _Loader, element: ElementTree.Element) -> None:
     file_handle = element.get('handle')
     file_id = element.get('id')
-    file_element = _xpath1(element, './ns:file')
+    children = _children(element)
+    file_element = _child(children, 'file')
+    assert file_element is not None
     src = file_element.get('src')
     assert src is not None
-    file_path = gramps_tree_directory_path / src
+    file_path = loader.gramps_tree_directory_path / src
     file = File(file_id, file_path)
     mime = file_element.get('mime')
     assert mime is not None
@@ -260,39 +354,31 @@ def _load_object(loader: _Loader, element: ElementTree.Element, gramps_tree_dire
     description = file_element.get('description')
     if description:
         file.description = description
-    _load_attribute_privacy(file, element, 'attribute')
+    _load_attribute_privacy(file, children, 'attribute')
     loader.add_entity(FlattenedEntity(file, file_handle))
-    for citation_handle in _load_handles('citationref', element):
+    loader.files.append(file)
+    for citation_handle in _load_handles('citationref', children):
         loader.add_association(File, file_handle, 'citations', Citation, citation_handle)
-    for note_handle in _load_handles('noteref', element):
+    for note_handle in _load_handles('noteref', children):
         loader.add_association(File, file_handle, 'notes', Note, note_handle)
 
 
-def _load_people(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:people/ns:person'):
-        _load_person(loader, element)
-
-
 def _load_person(loader: _Loader, element: ElementTree.Element) -> None:
     person_handle = element.get('handle')
     assert person_handle is not None
     person = Person(element.get('id'))
+    children = _children(element)
 
-    name_elements = sorted(_xpath(element, './ns:name'), key=lambda x: x.get('alt') == '1')
+    name_elements = sorted(children.get('name', ()), key=lambda x: x.get('alt') == '1')
     person_names = []
     for name_element in name_elements:
         is_alternative = name_element.get('alt') == '1'
-        try:
-            individual_name = _xpath1(name_element, './ns:first').text
-        except XPathError:
-            individual_name = None
+        name_children = _children(name_element)
+        individual_name = _child_text(name_children, 'first')
         surname_elements = [
             surname_element
             for surname_element
-            in _xpath(
-                name_element,
-                './ns:surname'
-            )
+            in name_children.get('surname', ())
             if surname_element.text is not None
         ]
         if surname_elements:
@@ -305,58 +391,53 @@ def _load_person(loader: _Loader, element: ElementTree.Element) -> None:
                     affiliation_name = '%s %s' % (
                         surname_prefix, affiliation_name)
                 person_name = PersonName(None, individual_name, affiliation_name)
-                _load_citationref(loader, person_name, name_element)
+                _load_citationref(loader, person_name, name_children)
                 person_names.append((person_name, is_alternative))
         elif individual_name is not None:
             person_name = PersonName(None, individual_name)
-            _load_citationref(loader, person_name, name_element)
+            _load_citationref(loader, person_name, name_children)
             person_names.append((person_name, is_alternative))
     for person_name, _ in sorted(person_names, key=lambda x: x[1]):
         loader.add_entity(person_name)
         loader.add_association(Person, person_handle, 'names', PersonName, person_name.id)
 
-    _load_eventrefs(loader, person_handle, element)
+    _load_eventrefs(loader, person_handle, children)
     if element.get('priv') == '1':
         person.private = True
 
     flattened_person = FlattenedEntity(person, person_handle)
-    _load_citationref(loader, flattened_person, element)
-    _load_objref(loader, flattened_person, element)
-    _load_urls(person, element)
-    _load_attribute_privacy(person, element, 'attribute')
+    _load_citationref(loader, flattened_person, children)
+    _load_objref(loader, flattened_person, children)
+    _load_urls(person, children)
+    _load_attribute_privacy(person, children, 'attribute')
     loader.add_entity(flattened_person)
 
 
-def _load_families(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:families/ns:family'):
-        _load_family(loader, element)
-
-
 def _load_family(loader: _Loader, element: ElementTree.Element) -> None:
     parent_handles = []
+    children = _children(element)
 
     # Load the father.
-    father_handle = _load_handle('father', element)
+    father_handle = _load_handle('father', children)
     if father_handle is not None:
-        _load_eventrefs(loader, father_handle, element)
+        _load_eventrefs(loader, father_handle, children)
         parent_handles.append(father_handle)
 
     # Load the mother.
-    mother_handle = _load_handle('mother', element)
+    mother_handle = _load_handle('mother', children)
     if mother_handle is not None:
-        _load_eventrefs(loader, mother_handle, element)
+        _load_eventrefs(loader, mother_handle, children)
         parent_handles.append(mother_handle)
 
     # Load the children.
-    child_handles = _load_handles('childref', element)
+    child_handles = _load_handles('childref', children)
     for child_handle in child_handles:
         for parent_handle in parent_handles:
             loader.add_association(Person, child_handle, 'parents', Person, parent_handle)
 
 
-def _load_eventrefs(loader: _Loader, person_id: str, element: ElementTree.Element) -> None:
-    eventrefs = _xpath(element, './ns:eventref')
-    for eventref in eventrefs:
+def _load_eventrefs(loader: _Loader, person_id: str, children: _Children) -> None:
+    for eventref in children.get('eventref', ()):
         _load_eventref(loader, person_id, eventref)
 
 
@@ -380,54 +461,46 @@ def _load_eventref(loader: _Loader, person_id: str, eventref: ElementTree.Elemen
     loader.add_association(Presence, identifiable_presence.id, 'event', Event, event_handle)
 
 
-def _load_places(loader: _Loader, database: ElementTree.Element):
-    for element in _xpath(database, './ns:places/ns:placeobj'):
-        _load_place(loader, element)
-
-
 def _load_place(loader: _Loader, element: ElementTree.Element) -> None:
     place_handle = element.get('handle')
+    children = _children(element)
     names = []
-    for name_element in _xpath(element, './ns:pname'):
+    for name_element in children.get('pname', ()):
         # The Gramps language is a single ISO language code, which is a valid BCP 47 locale.
         language = name_element.get('lang')
-        date = _load_date(name_element)
+        date = _load_date(_children(name_element))
         name = name_element.get('value')
         assert name is not None
         names.append(PlaceName(name, locale=language, date=date))
 
     place = Place(element.get('id'), names)
 
-    coordinates = _load_coordinates(element)
+    coordinates = _load_coordinates(children)
     if coordinates:
         place.coordinates = coordinates
 
-    _load_urls(place, element)
+    _load_urls(place, children)
 
     loader.add_entity(FlattenedEntity(place, place_handle))
 
-    for enclosed_by_handle in _load_handles('placeref', element):
+    for enclosed_by_handle in _load_handles('placeref', children):
         identifiable_enclosure = FlattenedEntity(Enclosure(None, None))
         loader.add_entity(identifiable_enclosure)
         loader.add_association(Enclosure, identifiable_enclosure.id, 'encloses', Place, place_handle)
         loader.add_association(Enclosure, identifiable_enclosure.id, 'enclosed_by', Place, enclosed_by_handle)
 
 
-def _load_coordinates(element: ElementTree.Element) -> Optional[Point]:
-    with suppress(XPathError):
-        coord_element = _xpath1(element, './ns:coord')
+def _load_coordinates(children: _Children) -> Optional[Point]:
+    coord_element = _child(children, 'coord')
+    if coord_element is None:
+        return None
 
-        # We could not load/validate the Gramps coordinates, because they are too freeform.
-        with suppress(BaseException):
-            return Point(coord_element.get('lat'), coord_element.get('long'))
+    # We could not load/validate the Gramps coordinates, because they are too freeform.
+    with suppress(BaseException):
+        return Point(coord_element.get('lat'), coord_element.get('long'))
     return None
 
 
-def _load_events(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:events/ns:event'):
-        _load_event(loader, element)
-
-
 _EVENT_TYPE_MAP = {
     'Birth': Birth(),
     'Baptism': Baptism(),
@@ -456,7 +529,8 @@ _EVENT_TYPE_MAP = {
 def _load_event(loader: _Loader, element: ElementTree.Element) -> None:
     event_handle = element.get('handle')
     event_id = element.get('id')
-    gramps_type = _xpath1(element, './ns:type').text
+    children = _children(element)
+    gramps_type = _child_text(children, 'type')
     assert gramps_type is not None
 
     try:
@@ -468,137 +542,125 @@ def _load_event(loader: _Loader, element: ElementTree.Element) -> None:
 
     event = Event(event_id, event_type)
 
-    event.date = _load_date(element)
+    event.date = _load_date(children)
 
     # Load the event place.
-    place_handle = _load_handle('place', element)
+    place_handle = _load_handle('place', children)
     if place_handle is not None:
         loader.add_association(Event, event_handle, 'place', Place, place_handle)
 
     # Load the description.
-    with suppress(XPathError):
-        event.description = _xpath1(element, './ns:description').text
+    description_element = _child(children, 'description')
+    if description_element is not None:
+        event.description = description_element.text
 
-    _load_attribute_privacy(event, element, 'attribute')
+    _load_attribute_privacy(event, children, 'attribute')
 
     flattened_event = FlattenedEntity(event, event_handle)
-    _load_objref(loader, flattened_event, element)
-    _load_citationref(loader, flattened_event, element)
+    _load_objref(loader, flattened_event, children)
+    _load_citationref(loader, flattened_event, children)
     loader.add_entity(flattened_event)
 
 
-def _load_repositories(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:repositories/ns:repository'):
-        _load_repository(loader, element)
-
-
 def _load_repository(loader: _Loader, element: ElementTree.Element) -> None:
     repository_source_handle = element.get('handle')
+    children = _children(element)
 
     source = Source(
         element.get('id'),
-        _xpath1(element, './ns:rname').text,
+        _child_text(children, 'rname'),
     )
 
-    _load_urls(source, element)
+    _load_urls(source, children)
 
     loader.add_entity(FlattenedEntity(source, repository_source_handle))
 
 
-def _load_sources(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:sources/ns:source'):
-        _load_source(loader, element)
-
-
 def _load_source(loader: _Loader, element: ElementTree.Element) -> None:
     source_handle = element.get('handle')
-    try:
-        source_name = _xpath1(element, './ns:stitle').text
-    except XPathError:
-        source_name = None
+    children = _children(element)
 
     source = Source(
         element.get('id'),
-        source_name
+        _child_text(children, 'stitle'),
     )
 
-    repository_source_handle = _load_handle('reporef', element)
+    repository_source_handle = _load_handle('reporef', children)
     if repository_source_handle is not None:
         loader.add_association(Source, source_handle, 'contained_by', Source, repository_source_handle)
 
     # Load the author.
-    with suppress(XPathError):
-        source.author = _xpath1(element, './ns:sauthor').text
+    author_element = _child(children, 'sauthor')
+    if author_element is not None:
+        source.author = author_element.text
 
     # Load the publication info.
-    with suppress(XPathError):
-        source.publisher = _xpath1(element, './ns:spubinfo').text
+    publisher_element = _child(children, 'spubinfo')
+    if publisher_element is not None:
+        source.publisher = publisher_element.text
 
-    _load_attribute_privacy(source, element, 'srcattribute')
+    _load_attribute_privacy(source, children, 'srcattribute')
 
     flattened_source = FlattenedEntity(source, source_handle)
-    _load_objref(loader, flattened_source, element)
+    _load_objref(loader, flattened_source, children)
     loader.add_entity(flattened_source)
 
 
-def _load_citations(loader: _Loader, database: ElementTree.Element) -> None:
-    for element in _xpath(database, './ns:citations/ns:citation'):
-        _load_citation(loader, element)
-
-
 def _load_citation(loader: _Loader, element: ElementTree.Element) -> None:
     citation_handle = element.get('handle')
-    source_handle = _xpath1(element, './ns:sourceref').get('hlink')
+    children = _children(element)
+    source_handle = _load_handle('sourceref', children)
 
     citation = Citation(element.get('id'), None)
     loader.add_association(Citation, citation_handle, 'source', Source, source_handle)
 
-    citation.date = _load_date(element)
-    _load_attribute_privacy(citation, element, 'srcattribute')
+    citation.date = _load_date(children)
+    _load_attribute_privacy(citation, children, 'srcattribute')
 
-    with suppress(XPathError):
-        citation.location = _xpath1(element, './ns:page').text
+    page_element = _child(children, 'page')
+    if page_element is not None:
+        citation.location = page_element.text
 
     flattened_citation = FlattenedEntity(citation, citation_handle)
-    _load_objref(loader, flattened_citation, element)
+    _load_objref(loader, flattened_citation, children)
     loader.add_entity(flattened_citation)
 
 
-def _load_citationref(loader: _Loader, owner: Entity, element: ElementTree.Element) -> None:
-    for citation_handle in _load_handles('citationref', element):
+def _load_citationref(loader: _Loader, owner: Entity, children: _Children) -> None:
+    for citation_handle in _load_handles('citationref', children):
         loader.add_association(get_entity_type(unflatten(owner)), owner.id, 'citations', Citation, citation_handle)
 
 
-def _load_handles(handle_type: str, element: ElementTree.Element) -> Iterable[str]:
-    for citation_handle_element in _xpath(element, f'./ns:{handle_type}'):
-        hlink = citation_handle_element.get('hlink')
+def _load_handles(handle_type: str, children: _Children) -> Iterable[str]:
+    for handle_element in children.get(handle_type, ()):
+        hlink = handle_element.get('hlink')
         if hlink:
             yield hlink
 
 
-def _load_handle(handle_type: str, element: ElementTree.Element) -> Optional[str]:
-    for citation_handle_element in _xpath(element, f'./ns:{handle_type}'):
-        return citation_handle_element.get('hlink')
-    return None
+def _load_handle(handle_type: str, children: _Children) -> Optional[str]:
+    handle_element = _child(children, handle_type)
+    if handle_element is None:
+        return None
+    return handle_element.get('hlink')
 
 
-def _load_objref(loader: _Loader, owner: Entity, element: ElementTree.Element) -> None:
-    file_handles = _load_handles('objref', element)
+def _load_objref(loader: _Loader, owner: Entity, children: _Children) -> None:
+    file_handles = _load_handles('objref', children)
     for file_handle in file_handles:
         loader.add_association(get_entity_type(unflatten(owner)), owner.id, 'files', File, file_handle)
 
 
-def _load_urls(owner: HasLinks, element: ElementTree.Element) -> None:
-    url_elements = _xpath(element, './ns:url')
-    for url_element in url_elements:
+def _load_urls(owner: HasLinks, children: _Children) -> None:
+    for url_element in children.get('url', ()):
         link = Link(str(url_element.get('href')))
         link.relationship = 'external'
         link.label = url_element.get('description')
         owner.links.add(link)
 
 
-def _load_attribute_privacy(resource: HasPrivacy, element: ElementTree.Element, tag: str) -> None:
-    privacy_value = _load_attribute('privacy', element, tag)
+def _load_attribute_privacy(resource: HasPrivacy, children: _Children, tag: str) -> None:
+    privacy_value = _load_attribute('privacy', children, tag)
     if privacy_value is None:
         return
     if privacy_value == 'private':
@@ -610,7 +672,28 @@ def _load_attribute_privacy(resource: HasPrivacy, element: ElementTree.Element,
     getLogger().warning('The betty:privacy Gramps attribute must have a value of "public" or "private", but "%s" was given, which was ignored.' % privacy_value)
 
 
-def _load_attribute(name: str, element: ElementTree.Element, tag: str) -> Optional[str]:
-    with suppress(XPathError):
-        return _xpath1(element, './ns:%s[@type="betty:%s"]' % (tag, name)).get('value')
+def _load_attribute(name: str, children: _Children, tag: str) -> Optional[str]:
+    attribute_type = 'betty:%s' % name
+    for attribute_element in children.get(tag, ()):
+        if attribute_element.get('type') == attribute_type:
+            return attribute_element.get('value')
     return None
+
+
+def _ns(tag: str) -> str:
+    return _NS_PREFIX + tag
+
+
+# Map each section of a Gramps XML document to the tag of the elements it contains, the function to load those
+# elements with, and an optional message to log once the section has been loaded.
+_SECTIONS: Dict[str, Tuple[str, Callable[[_Loader, ElementTree.Element], None], Optional[str]]] = {
+    _ns('notes'): (_ns('note'), _load_note, 'Loaded {count} notes.'),
+    _ns('objects'): (_ns('object'), _load_object, 'Loaded {count} files.'),
+    _ns('repositories'): (_ns('repository'), _load_repository, 'Loaded {count} repositories as sources.'),
+    _ns('sources'): (_ns('source'), _load_source, 'Loaded {count} sources.'),
+    _ns('citations'): (_ns('citation'), _load_citation, 'Loaded {count} citations.'),
+    _ns('places'): (_ns('placeobj'), _load_place, 'Loaded {count} places.'),
+    _ns('events'): (_ns('event'), _load_event, 'Loaded {count} events.'),
+    _ns('people'): (_ns('person'), _load_person, 'Loaded {count} people.'),
+    _ns('families'): (_ns('family'), _load_family, None),
+}
@@ -1,6 +1,5 @@
 import logging
 from pathlib import Path
-from shutil import copy2
 from typing import Optional, Set, Type, TYPE_CHECKING
 
 from betty.cache import CacheScope
@@ -9,8 +8,9 @@ if TYPE_CHECKING:
     from betty.builtins import _
 
 from betty.app.extension import Extension, UserFacingExtension
-from betty.generate import Generator
+from betty.generate import Generator, add_file
 from betty.npm import _Npm, NpmBuilder
+from betty.os import copy
 
 
 class HttpApiDoc(UserFacingExtension, Generator, NpmBuilder):
@@ -20,7 +20,7 @@ class HttpApiDoc(UserFacingExtension, Generator, NpmBuilder):
 
     async def npm_build(self, working_directory_path: Path, assets_directory_path: Path) -> None:
         await self.app.extensions[_Npm].install(type(self), working_directory_path)
-        copy2(working_directory_path / 'node_modules' / 'redoc' / 'bundles' / 'redoc.standalone.js', assets_directory_path / 'http-api-doc.js')
+        copy(working_directory_path / 'node_modules' / 'redoc' / 'bundles' / 'redoc.standalone.js', assets_directory_path / 'http-api-doc.js')
         logging.getLogger().info('Built the HTTP API documentation.')
 
     @classmethod
@@ -29,7 +29,8 @@ class HttpApiDoc(UserFacingExtension, Generator, NpmBuilder):
 
     async def generate(self) -> None:
         assets_directory_path = await self.app.extensions[_Npm].ensure_assets(self)
-        copy2(assets_directory_path / 'http-api-doc.js', self.app.project.configuration.www_directory_path / 'http-api-doc.js')
+        copy(assets_directory_path / 'http-api-doc.js', self.app.project.configuration.www_directory_path / 'http-api-doc.js')
+        await add_file(self.app.project.configuration.www_directory_path / 'http-api-doc.js')
 
     @classmethod
     def assets_directory_path(cls) -> Optional[Path]:
@@ -0,0 +1,225 @@
+"""
+Derive images, such as thumbnails, from image and PDF files.
+
+The functions in this module are CPU-bound, and are meant to be run in worker processes, such as those of
+:py:attr:`betty.app.App.image_executor`.
+
+Derived images are cached by the hash of their source file's contents and the parameters they are derived with, so the
+cache survives source files being touched or moved. Each use of a cache file is recorded in the cache's index, so
+:py:func:`betty.cache.prune` removes the least recently used ones first.
+
+Source files' content hashes and dimensions are indexed next to the cache, so source files are only read when they are
+new or have changed, or when an image must be derived from them.
+"""
+import os
+import sqlite3
+import threading
+import warnings
+from pathlib import Path
+from concurrent.futures import Executor
+from contextlib import suppress
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import pdf2image
+from PIL import Image
+from PIL.Image import DecompressionBombWarning
+
+from betty import _resizeimage, cache
+from betty.fs import hashfilecontent
+from betty.lock import AcquiredError, Locks
+from betty.os import link_or_copy, makedirs, FILE_MODE
+
+_Derivative = Tuple[str, Optional[int], Optional[int]]
+_Dimensions = Tuple[int, int]
+
+# Maps source file index file paths to connections, so each process connects to each index once.
+_index_connections: Dict[Path, sqlite3.Connection] = {}
+_index_connections_lock = threading.Lock()
+
+
+def submit_derivatives(executor: Executor, locks: Locks, task: Callable[..., None], file_path: Path, cache_directory_path: Path, destination_directory_path: Path, derivatives: Sequence[_Derivative]) -> None:
+    """
+    Submit a task to derive several images from a single file, except the images other tasks derive already.
+
+    Images are locked by their destinations, so overlapping sets of images derive each image once.
+
+    :param task: :py:func:`betty.image.derive_image_set` or :py:func:`betty.image.derive_pdf_image_set`.
+    """
+    unclaimed_derivatives = []
+    for derivative in derivatives:
+        with suppress(AcquiredError):
+            locks.acquire((submit_derivatives, destination_directory_path / derivative[0]))
+            unclaimed_derivatives.append(derivative)
+    if unclaimed_derivatives:
+        executor.submit(task, file_path, cache_directory_path, destination_directory_path, tuple(unclaimed_derivatives))
+
+
+def derive_image(file_path: Path, cache_directory_path: Path, destination_directory_path: Path, destination_name: str, width: Optional[int], height: Optional[int]) -> None:
+    _derive(_open_image, _read_image_dimensions, file_path, cache_directory_path, destination_directory_path, ((destination_name, width, height),))
+
+
+def derive_image_set(file_path: Path, cache_directory_path: Path, destination_directory_path: Path, derivatives: Sequence[_Derivative]) -> None:
+    """
+    Derive several images from a single image file, which is decoded once.
+
+    :param derivatives: The destination names, widths, and heights of the images to derive.
+    """
+    _derive(_open_image, _read_image_dimensions, file_path, cache_directory_path, destination_directory_path, derivatives)
+
+
+def derive_pdf_image(file_path: Path, cache_directory_path: Path, destination_directory_path: Path, destination_name: str, width: Optional[int], height: Optional[int]) -> None:
+    _derive(_open_pdf_image, _read_pdf_image_dimensions, file_path, cache_directory_path, destination_directory_path, ((destination_name, width, height),))
+
+
+def derive_pdf_image_set(file_path: Path, cache_directory_path: Path, destination_directory_path: Path, derivatives: Sequence[_Derivative]) -> None:
+    """
+    Derive several images from a single PDF file, of which the first page is rendered once.
+
+    :param derivatives: The destination names, widths, and heights of the images to derive.
+    """
+    _derive(_open_pdf_image, _read_pdf_image_dimensions, file_path, cache_directory_path, destination_directory_path, derivatives)
+
+
+def _open_image(file_path: Path, width: Optional[int], height: Optional[int]) -> Image.Image:
+    with warnings.catch_warnings():
+        # Ignore warnings about decompression bombs, because we know where the files come from.
+        warnings.simplefilter('ignore', category=DecompressionBombWarning)
+        image = Image.open(file_path)
+    # Let JPEG files decode at a fraction of their size, if that is still at least as large as the given size.
+    image.draft(None, (width or 1, height or 1))
+    return image
+
+
+def _read_image_dimensions(file_path: Path) -> Optional[_Dimensions]:
+    # Opening an image reads its header only.
+    with _open_image(file_path, None, None) as image:
+        return image.size
+
+
+def _read_pdf_image_dimensions(file_path: Path) -> Optional[_Dimensions]:
+    # The size at which a PDF page is rendered depends on the size of the image to derive.
+    return None
+
+
+def _open_pdf_image(file_path: Path, width: Optional[int], height: Optional[int]) -> Image.Image:
+    with warnings.catch_warnings():
+        # Ignore warnings about decompression bombs, because we know where the files come from.
+        warnings.simplefilter('ignore', category=DecompressionBombWarning)
+        image = _render_pdf_page(file_path, width, None if width is not None else height)
+        # Poppler keeps the page's aspect ratio when scaling it to a width, so a page that is too wide to cover the
+        # height as well is rendered again, scaled to the height instead.
+        if width is not None and height is not None and image.height < height:
+            image.close()
+            image = _render_pdf_page(file_path, None, height)
+        return image
+
+
+def _render_pdf_page(file_path: Path, width: Optional[int], height: Optional[int]) -> Image.Image:
+    # Render the first page only, because that is the only one thumbnails show. Let Poppler scale the page while
+    # rendering it, so it is not rendered at a higher resolution than needed.
+    return pdf2image.convert_from_path(file_path, first_page=1, last_page=1, fmt='jpeg', size=(width, height))[0]
+
+
+def _get_index_connection(cache_directory_path: Path) -> sqlite3.Connection:
+    index_file_path = cache.get_index_file_path(cache_directory_path)
+    try:
+        return _index_connections[index_file_path]
+    except KeyError:
+        index_file_path.parent.mkdir(exist_ok=True, parents=True)
+        # Wait for other processes deriving images to finish writing to the index.
+        connection = sqlite3.connect(index_file_path, timeout=60, check_same_thread=False)
+        connection.execute('CREATE TABLE IF NOT EXISTS source_files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT, width INTEGER, height INTEGER)')
+        cache.init_index(connection)
+        connection.commit()
+        _index_connections[index_file_path] = connection
+        return connection
+
+
+def _index_source_file(read_dimensions: Callable[[Path], Optional[_Dimensions]], file_path: Path, cache_directory_path: Path) -> Tuple[str, Optional[_Dimensions]]:
+    """
+    Get a source file's content hash and dimensions, from the index if the file has not changed since it was indexed.
+    """
+    file_stat = os.stat(file_path)
+    key = (str(file_path), file_stat.st_size, file_stat.st_mtime_ns)
+    with _index_connections_lock:
+        connection = _get_index_connection(cache_directory_path)
+        row = connection.execute('SELECT content_hash, width, height FROM source_files WHERE path = ? AND size = ? AND mtime_ns = ?', key).fetchone()
+    if row is not None:
+        content_hash, width, height = row
+        return content_hash, None if width is None else (width, height)
+
+    content_hash = hashfilecontent(file_path)
+    dimensions = read_dimensions(file_path)
+    with _index_connections_lock:
+        connection.execute('INSERT OR REPLACE INTO source_files VALUES (?, ?, ?, ?, ?, ?)', (*key, content_hash, *(dimensions or (None, None))))
+        connection.commit()
+    return content_hash, dimensions
+
+
+def _get_cache_file_name(content_hash: str, destination_name: str, width: Optional[int], height: Optional[int]) -> str:
+    return '%s-%sx%s%s' % (
+        content_hash,
+        '' if width is None else width,
+        '' if height is None else height,
+        Path(destination_name).suffix,
+    )
+
+
+def _derive(open_image: Callable[[Path, Optional[int], Optional[int]], Image.Image], read_dimensions: Callable[[Path], Optional[_Dimensions]], file_path: Path, cache_directory_path: Path, destination_directory_path: Path, derivatives: Sequence[_Derivative]) -> None:
+    makedirs(destination_directory_path)
+    content_hash, dimensions = _index_source_file(read_dimensions, file_path, cache_directory_path)
+    image = None
+    cache_file_names = []
+    try:
+        for destination_name, width, height in derivatives:
+            # Images are never derived larger than their sources, so derivatives larger than their sources are the same
+            # as derivatives of the same size as their sources.
+            cache_width, cache_height = (width, height) if dimensions is None else _clamp(width, height, dimensions)
+            cache_file_path = cache_directory_path / _get_cache_file_name(content_hash, destination_name, cache_width, cache_height)
+            cache_file_names.append(cache_file_path.name)
+            destination_file_path = destination_directory_path / destination_name
+            try:
+                _publish(cache_file_path, destination_file_path)
+            except FileNotFoundError:
+                cache_directory_path.mkdir(exist_ok=True, parents=True)
+                # Only open source files for cache misses, because opening PDF files renders them. Open them once for
+                # all derivatives, at a size large enough for the largest of them.
+                if image is None:
+                    image = open_image(
+                        file_path,
+                        max((width for _destination_name, width, _height in derivatives if width is not None), default=None),
+                        max((height for _destination_name, _width, height in derivatives if height is not None), default=None),
+                    )
+                _resize(image, width, height).save(cache_file_path)
+                # Let others read cache files, so they can be linked into the output rather than copied.
+                os.chmod(cache_file_path, FILE_MODE)
+                _publish(cache_file_path, destination_file_path)
+    finally:
+        if image is not None:
+            image.close()
+    with _index_connections_lock:
+        connection = _get_index_connection(cache_directory_path)
+        cache.record_uses(connection, cache_file_names)
+        connection.commit()
+
+
+def _publish(cache_file_path: Path, destination_file_path: Path) -> None:
+    # Another task may have derived the same image already, or an incremental build may have kept a previous version.
+    link_or_copy(cache_file_path, destination_file_path, replace=True)
+
+
+def _clamp(width: Optional[int], height: Optional[int], dimensions: _Dimensions) -> Tuple[Optional[int], Optional[int]]:
+    return (
+        None if width is None else min(width, dimensions[0]),
+        None if height is None else min(height, dimensions[1]),
+    )
+
+
+def _resize(image: Image.Image, width: Optional[int], height: Optional[int]) -> Image.Image:
+    width, height = _clamp(width, height, image.size)
+    if width is None:
+        assert height is not None
+        return _resizeimage.resize_height(image, height)
+    if height is None:
+        return _resizeimage.resize_width(image, width)
+    return _resizeimage.resize_cover(image, (width, height))
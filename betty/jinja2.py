@@ -1,44 +1,45 @@
 import asyncio
 import datetime
+import hashlib
 import json as stdjson
 import os
 import re
-import warnings
-from contextlib import suppress
+from contextlib import suppress, contextmanager
+from contextvars import ContextVar
 from pathlib import Path
 from typing import Dict, Callable, Iterable, Type, Optional, Any, Union, Iterator, ContextManager, cast, \
-    AsyncContextManager, MutableMapping, List, TYPE_CHECKING
+    AsyncContextManager, MutableMapping, List, Sequence, Set, Tuple, TYPE_CHECKING
 
 import aiofiles
-import pdf2image
-from PIL import Image
-from PIL.Image import DecompressionBombWarning
 from babel import Locale
 from geopy import units
 from geopy.format import DEGREES_FORMAT
 from jinja2 import Environment as Jinja2Environment, select_autoescape, FileSystemLoader, pass_context, \
     pass_eval_context, Template, \
     nodes, TemplateNotFound
+from jinja2.bccache import FileSystemBytecodeCache, Bucket
 from jinja2.ext import Extension
 from jinja2.filters import prepare_map, make_attrgetter
 from jinja2.nodes import EvalContext
 from jinja2.runtime import StrictUndefined, Context, Macro, DebugUndefined
 from jinja2.utils import htmlsafe_json_dumps
 from markupsafe import Markup, escape
+from PIL import features
 
-from betty import _resizeimage
+from betty import about, fs
 from betty.app import App
 from betty.asyncio import sync
-from betty.fs import hashfile, iterfiles, CACHE_DIRECTORY_PATH
+from betty.fs import iterfiles
 from betty.functools import walk
+from betty.image import derive_image_set, derive_pdf_image_set, submit_derivatives
 from betty.html import CssProvider, JsProvider
 from betty.json import JSONEncoder
 from betty.locale import negotiate_localizeds, Localized, format_datey, Datey, negotiate_locale, Date, DateRange, \
     bcp_47_to_rfc_1766
 from betty.lock import AcquiredError
 from betty.model import Entity, get_entity_type_name, GeneratedEntityId
-from betty.model.ancestry import File, Citation, HasLinks, HasFiles, Subject, Witness, Dated
-from betty.os import link_or_copy, PathLike
+from betty.model.ancestry import File, Citation, HasLinks, HasFiles, Subject, Witness, Dated, Ancestry
+from betty.os import link_or_copy, PathLike, makedirs, opener
 from betty.path import rootname
 from betty.project import ProjectConfiguration
 from betty.render import Renderer
@@ -109,10 +110,38 @@ class _ContextManagerExtension(Extension):
             return caller()
 
 
+# The entities and ancestries whose attributes or items templates access, keyed by their identities.
+_dependencies: ContextVar[Optional[Dict[int, Union[Entity, Ancestry]]]] = ContextVar('_dependencies', default=None)
+
+
+# The files that templates publish, such as derived images, relative to the web root.
+_files: ContextVar[Optional[Set[str]]] = ContextVar('_files', default=None)
+
+
+class _BytecodeCache(FileSystemBytecodeCache):
+    """
+    Cache compiled templates across processes.
+
+    Jinja2 invalidates cached bytecode whose template source changed, and the cache directory is scoped to everything
+    else that affects compilation: the Betty version, and whether the environment is in debug mode.
+    """
+
+    def __init__(self, debug: bool):
+        cache_version = hashlib.md5(f'{about.version()}:{debug}'.encode('utf-8')).hexdigest()
+        super().__init__(str(fs.CACHE_DIRECTORY_PATH / 'jinja2' / cache_version), '%s.cache')
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        # The cache is an optimization only, and it may have been cleared since the environment was created.
+        with suppress(OSError):
+            os.makedirs(self.directory, exist_ok=True)
+            super().dump_bytecode(bucket)
+
+
 class Environment(Jinja2Environment):
     def __init__(self, app: App):
         template_directory_paths = [str(path / 'templates') for path, _ in app.assets.paths]
         super().__init__(loader=FileSystemLoader(template_directory_paths),
+                         bytecode_cache=_BytecodeCache(app.project.configuration.debug),
                          undefined=DebugUndefined if app.project.configuration.debug else StrictUndefined,
                          autoescape=select_autoescape(['html']),
                          trim_blocks=True,
@@ -124,6 +153,10 @@ class Environment(Jinja2Environment):
         )
 
         self.app = app
+        # The environment is rebuilt when the assets change, and templates are negotiated many times per build, so remember
+        # the outcomes until they are cleared explicitly.
+        self._template_names: Optional[Set[str]] = None
+        self._negotiated_template_names: Dict[Tuple[str, ...], Optional[str]] = {}
 
         if app.project.configuration.debug:
             self.add_extension('jinja2.ext.debug')
@@ -134,6 +167,43 @@ class Environment(Jinja2Environment):
         self._init_tests()
         self._init_extensions()
 
+    @contextmanager
+    def record_dependencies(self) -> Iterator[Dict[int, Union[Entity, Ancestry]]]:
+        """
+        Record the entities and ancestries whose attributes or items are accessed by templates rendered in this context.
+        """
+        dependencies: Dict[int, Union[Entity, Ancestry]] = {}
+        token = _dependencies.set(dependencies)
+        try:
+            yield dependencies
+        finally:
+            _dependencies.reset(token)
+
+    @contextmanager
+    def record_files(self) -> Iterator[Set[str]]:
+        """
+        Record the files that templates rendered in this context publish, relative to the web root.
+        """
+        files: Set[str] = set()
+        token = _files.set(files)
+        try:
+            yield files
+        finally:
+            _files.reset(token)
+
+    def _record_dependency(self, obj: Any) -> None:
+        dependencies = _dependencies.get()
+        if dependencies is not None and isinstance(obj, (Entity, Ancestry)):
+            dependencies[id(obj)] = obj
+
+    def getattr(self, obj: Any, attribute: str) -> Any:
+        self._record_dependency(obj)
+        return super().getattr(obj, attribute)
+
+    def getitem(self, obj: Any, argument: Any) -> Any:
+        self._record_dependency(obj)
+        return super().getitem(obj, argument)
+
     def _init_i18n(self) -> None:
         # Wrap the callables so they always call the built-ins available runtime, because those change when the current
         # locale does.
@@ -185,6 +255,7 @@ class Environment(Jinja2Environment):
         self.filters['static_url'] = self.app.static_url_generator.generate
         self.filters['file'] = lambda *args: _filter_file(self.app, *args)
         self.filters['image'] = lambda *args, **kwargs: _filter_image(self.app, *args, **kwargs)
+        self.filters['image_set'] = lambda *args, **kwargs: _filter_image_set(self.app, *args, **kwargs)
         self.filters['entity_type_name'] = get_entity_type_name
         self.filters['camel_case_to_snake_case'] = camel_case_to_snake_case
         self.filters['camel_case_to_kebab_case'] = camel_case_to_kebab_case
@@ -214,10 +285,26 @@ class Environment(Jinja2Environment):
                 self.filters.update(extension.filters)
 
     def negotiate_template(self, names: List[str], parent: Optional[str] = None, globals: Optional[MutableMapping[str, Any]] = None) -> Template:
+        names_key = tuple(names)
+        try:
+            name = self._negotiated_template_names[names_key]
+        except KeyError:
+            name = self._negotiated_template_names[names_key] = self._negotiate_template_name(names)
+        if name is None:
+            raise TemplateNotFound(names[-1], f'Cannot find any of the following templates: {", ".join(names)}.')
+        return self.get_template(name, parent, globals)
+
+    def clear_negotiated_templates(self) -> None:
+        self._template_names = None
+        self._negotiated_template_names.clear()
+
+    def _negotiate_template_name(self, names: Iterable[str]) -> Optional[str]:
+        if self._template_names is None:
+            self._template_names = set(self.list_templates())
         for name in names:
-            with suppress(TemplateNotFound):
-                return self.get_template(name, parent, globals)
-        raise TemplateNotFound(names[-1], f'Cannot find any of the following templates: {", ".join(names)}.')
+            if name in self._template_names:
+                return name
+        return None
 
 
 Template.environment_class = Environment
@@ -244,7 +331,7 @@ class Jinja2Renderer(Renderer):
         root_path = rootname(file_path)
         template_name = '/'.join(Path(file_path).relative_to(root_path).parts)
         template = FileSystemLoader(root_path).load(self._environment, template_name, self._environment.globals)
-        async with aiofiles.open(file_destination_path_str, 'w', encoding='utf-8') as f:
+        async with aiofiles.open(file_destination_path_str, 'w', encoding='utf-8', opener=opener) as f:
             await f.write(template.render(data))
         os.remove(file_path)
 
@@ -347,98 +434,137 @@ def _filter_file(app: App, file: File) -> str:
         file_destination_path = app.project.configuration.www_directory_path / 'file' / file.id / 'file' / file.path.name
         app.executor.submit(_do_filter_file, file.path, file_destination_path)
 
+    _record_file(f'file/{file.id}/file/{file.path.name}')
     return f'/file/{file.id}/file/{file.path.name}'
 
 
 def _do_filter_file(file_source_path: Path, file_destination_path: Path) -> None:
-    file_destination_path.parent.mkdir(exist_ok=True, parents=True)
-    link_or_copy(file_source_path, file_destination_path)
+    makedirs(file_destination_path.parent)
+    # An incremental build may have kept the previous version of the file.
+    link_or_copy(file_source_path, file_destination_path, replace=True)
+
+
+_WEBP_SUPPORTED = features.check('webp')
 
 
 def _filter_image(app: App, file: File, width: Optional[int] = None, height: Optional[int] = None) -> str:
-    destination_name = '%s-' % file.id
-    if height:
-        destination_name += '-x%d' % height
-    elif width:
-        destination_name += '%dx-' % width
-    elif height and width:
-        destination_name += '%dx%d' % (width, height)
-    else:
-        raise ValueError('At least the width or height must be given.')
+    task, suffix = _get_image_task(file)
+    destination_name = _get_image_destination_name(file, width, height, suffix)
+    _submit_image_task(app, task, file, ((destination_name, width, height),))
+    return '/file/%s' % destination_name
+
+
+class ImageSet:
+    """
+    Images derived from a single file at several sizes, as returned by the ``image_set`` filter.
+
+    An image set renders as its ``srcset``.
+    """
 
-    file_directory_path = app.project.configuration.www_directory_path / 'file'
+    def __init__(self, images: Sequence[Tuple[str, int]], webp_images: Optional[Sequence[Tuple[str, int]]] = None):
+        self._images = images
+        self._webp_images = webp_images
 
+    def __str__(self) -> str:
+        return self.srcset
+
+    @property
+    def urls(self) -> List[str]:
+        return [url for url, _width in self._images]
+
+    @property
+    def srcset(self) -> str:
+        return self._build_srcset(self._images)
+
+    @property
+    def webp_urls(self) -> Optional[List[str]]:
+        if self._webp_images is None:
+            return None
+        return [url for url, _width in self._webp_images]
+
+    @property
+    def webp_srcset(self) -> Optional[str]:
+        if self._webp_images is None:
+            return None
+        return self._build_srcset(self._webp_images)
+
+    def _build_srcset(self, images: Sequence[Tuple[str, int]]) -> str:
+        return ', '.join(f'{url} {width}w' for url, width in images)
+
+
+def _filter_image_set(app: App, file: File, sizes: Iterable[Union[int, Tuple[int, Optional[int]]]], webp: bool = False) -> ImageSet:
+    """
+    Derive images from a file at several sizes, in a single task that decodes the file once.
+
+    :param sizes: The widths, or the widths and heights, of the images to derive.
+    :param webp: Whether to also derive WebP versions of the images, if Pillow supports WebP.
+    """
+    task, suffix = _get_image_task(file)
+    derivatives = []
+    images = []
+    webp_images = []
+    for size in sizes:
+        width, height = (size, None) if isinstance(size, int) else size
+        destination_name = _get_image_destination_name(file, width, height, suffix)
+        derivatives.append((destination_name, width, height))
+        images.append((app.static_url_generator.generate('/file/%s' % destination_name), width))
+        if webp and _WEBP_SUPPORTED:
+            webp_destination_name = _get_image_destination_name(file, width, height, '.webp')
+            derivatives.append((webp_destination_name, width, height))
+            webp_images.append((app.static_url_generator.generate('/file/%s' % webp_destination_name), width))
+    if not derivatives:
+        raise ValueError('At least one size must be given.')
+
+    _submit_image_task(app, task, file, derivatives)
+    return ImageSet(images, webp_images if webp and _WEBP_SUPPORTED else None)
+
+
+def _get_image_task(file: File) -> Tuple[Callable[..., None], str]:
+    """
+    Get the function to derive images from a file with, and the derived images' suffix.
+    """
     if file.media_type:
         if file.media_type.type == 'image':
-            task = _execute_filter_image_image
-            destination_name += file.path.suffix
+            return derive_image_set, file.path.suffix
         elif file.media_type.type == 'application' and file.media_type.subtype == 'pdf':
-            task = _execute_filter_image_application_pdf
-            destination_name += '.' + 'jpg'
+            return derive_pdf_image_set, '.jpg'
         else:
             raise ValueError('Cannot convert a file of media type "%s" to an image.' % file.media_type)
     else:
         raise ValueError('Cannot convert a file without a media type to an image.')
 
-    with suppress(AcquiredError):
-        app.locks.acquire((_filter_image, file, width, height))
-        cache_directory_path = CACHE_DIRECTORY_PATH / 'image'
-        app.executor.submit(task, file.path, cache_directory_path, file_directory_path, destination_name, width, height)
-
-    destination_public_path = '/file/%s' % destination_name
-
-    return destination_public_path
-
-
-def _execute_filter_image_image(file_path: Path, *args, **kwargs) -> None:
-    with warnings.catch_warnings():
-        # Ignore warnings about decompression bombs, because we know where the files come from.
-        warnings.simplefilter('ignore', category=DecompressionBombWarning)
-        image = Image.open(file_path)
-    try:
-        _execute_filter_image(image, file_path, *args, **kwargs)
-    finally:
-        image.close()
-
-
-def _execute_filter_image_application_pdf(file_path: Path, *args, **kwargs) -> None:
-    with warnings.catch_warnings():
-        # Ignore warnings about decompression bombs, because we know where the files come from.
-        warnings.simplefilter('ignore', category=DecompressionBombWarning)
-        image = pdf2image.convert_from_path(file_path, fmt='jpeg')[0]
-    try:
-        _execute_filter_image(image, file_path, *args, **kwargs)
-    finally:
-        image.close()
-
-
-def _execute_filter_image(image: Image, file_path: Path, cache_directory_path: Path, destination_directory_path: Path, destination_name: str, width: int, height: int) -> None:
-    destination_directory_path.mkdir(exist_ok=True, parents=True)
-    cache_file_path = cache_directory_path / ('%s-%s' % (hashfile(file_path), destination_name))
-    destination_file_path = destination_directory_path / destination_name
-
-    try:
-        link_or_copy(cache_file_path, destination_file_path)
-    except FileNotFoundError:
-        cache_directory_path.mkdir(exist_ok=True, parents=True)
-        with image:
-            if width is not None:
-                width = min(width, image.window_width)
-            if height is not None:
-                height = min(height, image.window_height)
-
-            if width is None:
-                size = height
-                convert = _resizeimage.resize_height
-            elif height is None:
-                size = width
-                convert = _resizeimage.resize_width
-            else:
-                size = (width, height)
-                convert = _resizeimage.resize_cover
-            convert(image, size).save(cache_file_path)
-        destination_directory_path.mkdir(exist_ok=True, parents=True)
-        link_or_copy(cache_file_path, destination_file_path)
+
+def _get_image_destination_name(file: File, width: Optional[int], height: Optional[int], suffix: str) -> str:
+    destination_name = '%s-' % file.id
+    if width and height:
+        destination_name += '%dx%d' % (width, height)
+    elif height:
+        destination_name += '-x%d' % height
+    elif width:
+        destination_name += '%dx-' % width
+    else:
+        raise ValueError('At least the width or height must be given.')
+    return destination_name + suffix
+
+
+def _record_file(file_path: str) -> None:
+    files = _files.get()
+    if files is not None:
+        files.add(file_path)
+
+
+def _submit_image_task(app: App, task: Callable[..., None], file: File, derivatives: Sequence[Tuple[str, Optional[int], Optional[int]]]) -> None:
+    for destination_name, _width, _height in derivatives:
+        _record_file(f'file/{destination_name}')
+    submit_derivatives(
+        app.image_executor,
+        app.locks,
+        task,
+        file.path,
+        fs.CACHE_DIRECTORY_PATH / 'image',
+        app.project.configuration.www_directory_path / 'file',
+        derivatives,
+    )
 
 
 @pass_context
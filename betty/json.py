@@ -1,14 +1,13 @@
 import json as stdjson
 from os import path
 from pathlib import Path
-from typing import Dict, Any, Type, Callable
+from typing import Dict, Any, Type, Callable, Optional
 
 import jsonschema
 from geopy import Point
 from jsonschema import RefResolver
 
 from betty.app import App
-from betty.asyncio import sync
 from betty.locale import Date, DateRange, Localized
 from betty.media_type import MediaType
 from betty.model import Entity, get_entity_type_name, GeneratedEntityId
@@ -16,6 +15,10 @@ from betty.model.ancestry import Place, Person, PlaceName, Event, Described, Has
     Note, PersonName, HasMediaType, PresenceRole, EventType, Citation, Source
 from betty.string import upper_camel_case_to_lower_camel_case
 
+# Media types are immutable, and expensive to parse.
+_HTML_MEDIA_TYPE = MediaType('text/html')
+_JSON_MEDIA_TYPE = MediaType('application/json')
+
 
 def validate(data: Any, schema_definition: str, app: App) -> None:
     with open(path.join(path.dirname(__file__), 'assets', 'public', 'static', 'schema.json'), encoding='utf-8') as f:
@@ -52,16 +55,28 @@ class JSONEncoder(stdjson.JSONEncoder):
             Note: self._encode_note,
             MediaType: self._encode_media_type,
         }
+        # The mappers for the types of the values encoded so far, or None for types without mappers.
+        self._mappers_by_type: Dict[Type, Optional[Callable[[Any], Any]]] = {}
 
     @classmethod
     def get_factory(cls, app: App):
         return lambda *args, **kwargs: cls(app, *args, **kwargs)
 
     def default(self, o):
+        o_type = type(o)
+        try:
+            mapper = self._mappers_by_type[o_type]
+        except KeyError:
+            mapper = self._mappers_by_type[o_type] = self._get_mapper(o_type)
+        if mapper is None:
+            return stdjson.JSONEncoder.default(self, o)
+        return mapper(o)
+
+    def _get_mapper(self, o_type: Type) -> Optional[Callable[[Any], Any]]:
         for mapper_type in self._mappers:
-            if isinstance(o, mapper_type):
-                return self._mappers[mapper_type](o)
-        stdjson.JSONEncoder.default(self, o)
+            if issubclass(o_type, mapper_type):
+                return self._mappers[mapper_type]
+        return None
 
     def _generate_url(self, resource: Any, media_type='application/json'):
         return self._app.url_generator.generate(resource, media_type)
@@ -70,8 +85,7 @@ class JSONEncoder(stdjson.JSONEncoder):
         encoded['$schema'] = self._app.static_url_generator.generate(
             'schema.json#/definitions/%s' % defintion)
 
-    @sync
-    async def _encode_entity(self, encoded: Dict, entity: Entity) -> None:
+    def _encode_entity(self, encoded: Dict, entity: Entity) -> None:
         self._encode_schema(encoded, upper_camel_case_to_lower_camel_case(get_entity_type_name(entity)))
 
         if 'links' not in encoded:
@@ -82,7 +96,7 @@ class JSONEncoder(stdjson.JSONEncoder):
 
             canonical = Link(self._generate_url(entity))
             canonical.relationship = 'canonical'
-            canonical.media_type = MediaType('application/json')
+            canonical.media_type = _JSON_MEDIA_TYPE
             encoded['links'].append(canonical)
 
             link_urls = [link.url for link in encoded['links']]
@@ -101,7 +115,7 @@ class JSONEncoder(stdjson.JSONEncoder):
 
             html = Link(self._generate_url(entity, media_type='text/html'))
             html.relationship = 'alternate'
-            html.media_type = MediaType('text/html')
+            html.media_type = _HTML_MEDIA_TYPE
             encoded['links'].append(html)
 
     def _encode_described(self, encoded: Dict, described: Described) -> None:
@@ -329,3 +343,10 @@ class JSONEncoder(stdjson.JSONEncoder):
 
     def _encode_media_type(self, media_type: MediaType) -> str:
         return str(media_type)
+
+
+def dumps(data: Any, app: App) -> str:
+    """
+    Encode data, including entities, to JSON using the app's JSON encoder.
+    """
+    return app.json_encoder.encode(data)
@@ -1,6 +1,14 @@
+import hashlib
+import json
 import logging
+import pickle
+from contextlib import suppress
+from pathlib import Path
+from typing import Iterable, Optional
 
+from betty import about, fs
 from betty.app import App
+from betty.model import pickle_entities, unpickle_entities
 
 
 def getLogger() -> logging.Logger:
@@ -12,12 +20,80 @@ class Loader:
         raise NotImplementedError
 
 
+class CacheableLoader(Loader):
+    """
+    A loader whose results depend on nothing but the project configuration and the files it loads.
+
+    If all of a project's loaders are cacheable, the loaded and post-processed ancestry is cached, and reused by later
+    loads until the Betty version, the project configuration, or any of the source files change.
+    """
+
+    def loader_source_file_paths(self) -> Iterable[Path]:
+        raise NotImplementedError
+
+
 class PostLoader:
     async def post_load(self) -> None:
         raise NotImplementedError
 
 
 async def load(app: App) -> None:
+    # Entities added before loading would be duplicated by cached ones, or end up in the cache themselves.
+    cache_file_path = None if len(app.project.ancestry.entities) else _get_cache_file_path(app)
+    if cache_file_path is not None:
+        with suppress(OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            with open(cache_file_path, 'rb') as f:
+                app.project.ancestry.entities.append(*unpickle_entities(f))
+            getLogger().info('Loaded the ancestry from the cache.')
+            return
+
     await app.dispatcher.dispatch(Loader)()
     await app.dispatcher.dispatch(PostLoader)()
     app.wait()
+
+    if cache_file_path is not None:
+        _dump_cache(app, cache_file_path)
+
+
+def _get_cache_file_path(app: App) -> Optional[Path]:
+    loaders = [
+        extension
+        for extension
+        in app.extensions.flatten()
+        if isinstance(extension, Loader)
+    ]
+    if not loaders or not all(isinstance(loader, CacheableLoader) for loader in loaders):
+        return None
+
+    cache_key = hashlib.sha256()
+    cache_key.update(about.version().encode('utf-8'))
+    cache_key.update(json.dumps(app.project.configuration.dump(), sort_keys=True, default=str).encode('utf-8'))
+    for loader in loaders:
+        assert isinstance(loader, CacheableLoader)
+        for source_file_path in loader.loader_source_file_paths():
+            cache_key.update(str(source_file_path).encode('utf-8'))
+            try:
+                with open(source_file_path, 'rb') as f:
+                    while chunk := f.read(2 ** 20):
+                        cache_key.update(chunk)
+            except OSError:
+                # Let the loader itself fail on missing or unreadable source files.
+                return None
+
+    # The cache is scoped to the project.
+    project_cache_directory_path = fs.CACHE_DIRECTORY_PATH / 'ancestry' / hashlib.md5(str(app.project.configuration.configuration_file_path).encode('utf-8')).hexdigest()
+    return project_cache_directory_path / f'{cache_key.hexdigest()}.pickle'
+
+
+def _dump_cache(app: App, cache_file_path: Path) -> None:
+    cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+    # Keep a single ancestry per project, because older ones will never be loaded again.
+    for outdated_cache_file_path in cache_file_path.parent.iterdir():
+        outdated_cache_file_path.unlink()
+    try:
+        with open(cache_file_path, 'wb') as f:
+            pickle_entities(app.project.ancestry.entities, f)
+    except Exception as e:
+        # The cache is an optimization only, so failing to write it must not fail the load.
+        cache_file_path.unlink(missing_ok=True)
+        getLogger().warning('Could not cache the ancestry: %s' % e)
@@ -322,17 +322,16 @@ class Translations(NullTranslations):
 
         for key in self._GETTEXT_BUILTINS:
             # Built-ins are not owned by Betty, so allow for them to have disappeared.
-            with suppress(KeyError):
-                del builtins.__dict__[key]
+            builtins.__dict__.pop(key, None)
         builtins.__dict__.update(self._previous_context)
         self._previous_context = None
 
     def _get_current_context(self) -> _Context:
         return {
-            key: value
-            for key, value
-            in builtins.__dict__.items()
-            if key in self._GETTEXT_BUILTINS
+            key: builtins.__dict__[key]
+            for key
+            in self._GETTEXT_BUILTINS
+            if key in builtins.__dict__
         }
 
 
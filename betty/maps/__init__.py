@@ -1,7 +1,6 @@
 import logging
 from contextlib import suppress
 from pathlib import Path
-from shutil import copy2, copytree
 from typing import Optional, Set, Type, TYPE_CHECKING, List
 
 from betty.cache import CacheScope
@@ -10,9 +9,10 @@ if TYPE_CHECKING:
     from betty.builtins import _
 
 from betty.app.extension import Extension, UserFacingExtension
-from betty.generate import Generator
+from betty.generate import Generator, add_file
 from betty.html import CssProvider, JsProvider
 from betty.npm import _Npm, NpmBuilder, npm
+from betty.os import copy, copytree
 
 
 class Maps(UserFacingExtension, CssProvider, JsProvider, Generator, NpmBuilder):
@@ -27,8 +27,8 @@ class Maps(UserFacingExtension, CssProvider, JsProvider, Generator, NpmBuilder):
         logging.getLogger().info('Built the interactive maps.')
 
     def _copy_npm_build(self, source_directory_path: Path, destination_directory_path: Path) -> None:
-        copy2(source_directory_path / 'maps.css', destination_directory_path / 'maps.css')
-        copy2(source_directory_path / 'maps.js', destination_directory_path / 'maps.js')
+        copy(source_directory_path / 'maps.css', destination_directory_path / 'maps.css')
+        copy(source_directory_path / 'maps.js', destination_directory_path / 'maps.js')
         with suppress(FileNotFoundError):
             copytree(source_directory_path / 'images', destination_directory_path / 'images')
 
@@ -39,6 +39,8 @@ class Maps(UserFacingExtension, CssProvider, JsProvider, Generator, NpmBuilder):
     async def generate(self) -> None:
         assets_directory_path = await self.app.extensions[_Npm].ensure_assets(self)
         self._copy_npm_build(assets_directory_path, self.app.project.configuration.www_directory_path)
+        await add_file(self.app.project.configuration.www_directory_path / 'maps.css')
+        await add_file(self.app.project.configuration.www_directory_path / 'maps.js')
 
     @classmethod
     def assets_directory_path(cls) -> Optional[Path]:
@@ -21,7 +21,8 @@ class MediaType:
         # invalid.
         if not media_type.startswith(type_part):
             raise InvalidMediaType(f'"{media_type}" is not a valid media type.')
-        self._parameters = message['Content-Type'].params
+        # Copy the parameters out of their read-only mapping, so media types can be pickled.
+        self._parameters = dict(message['Content-Type'].params)
         self._type, self._subtype = type_part.split('/')
         if not self._subtype:
             raise InvalidMediaType('The subtype must not be empty.')
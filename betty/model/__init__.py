@@ -2,12 +2,15 @@ from __future__ import annotations
 
 import copy
 import functools
-import operator
+import pickle
+from bisect import bisect_right
+from collections import defaultdict
+from contextlib import suppress
 from dataclasses import dataclass
 from enum import Enum
-from functools import reduce
+from itertools import accumulate, chain
 from typing import TypeVar, Generic, Callable, List, Optional, Iterable, Any, Type, Union, Set, overload, cast, \
-    Iterator, TYPE_CHECKING
+    Iterator, TYPE_CHECKING, Dict, Tuple, FrozenSet, IO
 
 try:
     from typing_extensions import Self
@@ -43,7 +46,7 @@ class GeneratedEntityId(str):
 
 class Entity:
     def __init__(self, entity_id: Optional[str] = None, *args, **kwargs):
-        get_entity_type(self)
+        get_entity_type_by_type(type(self))
         self._id = GeneratedEntityId() if entity_id is None else entity_id
         super().__init__(*args, **kwargs)
 
@@ -134,17 +137,26 @@ def get_entity_type_by_name(entity_type_name: str) -> Type[Entity]:
     return get_entity_type(entity_type)
 
 
+_entity_types: Dict[type, Type[Entity]] = {}
+
+
 @get_entity_type.register(type)
 def get_entity_type_by_type(entity_type: type) -> Type[Entity]:
+    # A class's MRO does not change once the class has been created, so its entity type can be resolved only once.
+    try:
+        return _entity_types[entity_type]
+    except KeyError:
+        pass
     for ancestor_cls in entity_type.__mro__:
         if ancestor_cls not in (Entity, EntityVariation) and Entity in ancestor_cls.__bases__ and EntityVariation not in ancestor_cls.__bases__:
+            _entity_types[entity_type] = ancestor_cls
             return ancestor_cls
     raise EntityTypeInvalidError(entity_type)
 
 
 @get_entity_type.register(object)
 def get_entity_type_by_entity(entity: Entity) -> Type[Entity]:
-    return get_entity_type(type(entity))
+    return get_entity_type_by_type(type(entity))
 
 
 class EntityCollection(Generic[EntityT]):
@@ -202,43 +214,99 @@ class _EntityTypeAssociation(Generic[EntityT]):
     cls: Type[EntityT]
     attr_name: str
     cardinality: Cardinality
-    init_value_factory: Optional[Callable[[EntityT], EntityCollection]] = None
-
-    def init_value(self, owner: EntityT) -> Optional[EntityCollection]:
-        if self.init_value_factory is None:
-            return None
-        return self.init_value_factory(owner)
 
 
 class _EntityTypeAssociationRegistry:
     _registrations: Set[_EntityTypeAssociation] = set()
+    _associations: Dict[Type[Entity], FrozenSet[_EntityTypeAssociation]] = {}
 
     @classmethod
-    def get_associations(cls, owner_cls: Type[Entity]) -> Set[_EntityTypeAssociation]:
-        return {registration for registration in cls._registrations if registration.cls in owner_cls.__mro__}
+    def get_associations(cls, owner_cls: Type[Entity]) -> FrozenSet[_EntityTypeAssociation]:
+        try:
+            return cls._associations[owner_cls]
+        except KeyError:
+            associations = cls._associations[owner_cls] = frozenset(
+                registration
+                for registration
+                in cls._registrations
+                if registration.cls in owner_cls.__mro__
+            )
+            return associations
 
     @classmethod
     def register(cls, registration: _EntityTypeAssociation) -> None:
         if registration not in cls._registrations:
             cls._registrations.add(registration)
+            cls._associations.clear()
+
+
+# Collections smaller than this are scanned rather than indexed, because for those, the indices would use more memory
+# than they save time.
+_INDEX_THRESHOLD = 8
 
 
 class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
     def __init__(self, entity_type: Type[EntityT]):
-        self._entities: List[EntityT] = []
         self._entity_type: Type[EntityT] = entity_type
+        self._reset_entities()
 
     def __repr__(self) -> str:
         return f'{object.__repr__(self)}(entity_type={self._entity_type}, length={len(self)})'
 
     def __copy__(self, copy_entities: bool = True):
         copied = self.__class__.__new__(self.__class__)
-        copied._entities = []
         copied._entity_type = self._entity_type
+        copied._reset_entities()
         if copy_entities:
             self._copy_entities(copied)
         return copied
 
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # Entity identities are only valid within a single process, and when unpickling recursive associations, the
+        # entities in this collection may not have been fully restored yet. Rebuild the indices once they are needed.
+        state['_entity_identities'] = None
+        state['_entities_by_id'] = None
+        return state
+
+    def _reset_entities(self) -> None:
+        self._entities: List[EntityT] = []
+        self._entity_identities: Optional[Set[int]] = None
+        self._entities_by_id: Optional[Dict[str, EntityT]] = None
+
+    def _get_entity_identities(self) -> Optional[Set[int]]:
+        if self._entity_identities is None and len(self._entities) >= _INDEX_THRESHOLD:
+            self._entity_identities = {id(entity) for entity in self._entities}
+        return self._entity_identities
+
+    def _get_entities_by_id(self) -> Optional[Dict[str, EntityT]]:
+        if self._entities_by_id is None and len(self._entities) >= _INDEX_THRESHOLD:
+            self._entities_by_id = {}
+            for entity in self._entities:
+                self._entities_by_id.setdefault(entity.id, entity)
+        return self._entities_by_id
+
+    def _index_entity(self, entity: EntityT, first: bool) -> None:
+        if self._entity_identities is not None:
+            self._entity_identities.add(id(entity))
+        if self._entities_by_id is not None:
+            # Entity IDs are not guaranteed to be unique within a collection, in which case the first entity wins.
+            if first:
+                self._entities_by_id[entity.id] = entity
+            else:
+                self._entities_by_id.setdefault(entity.id, entity)
+
+    def _unindex_entity(self, entity: EntityT) -> None:
+        if self._entity_identities is not None:
+            self._entity_identities.discard(id(entity))
+        entities_by_id = self._entities_by_id
+        if entities_by_id is not None and entities_by_id.get(entity.id) is entity:
+            del entities_by_id[entity.id]
+            for other_entity in self._entities:
+                if other_entity.id == entity.id:
+                    entities_by_id[entity.id] = other_entity
+                    break
+
     def _copy_entities(self, copied: EntityCollection):
         for entity in self:
             copied.append(entity)
@@ -260,6 +328,7 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
 
     def _prepend_one(self, entity: EntityT) -> None:
         self._entities.insert(0, entity)
+        self._index_entity(entity, True)
 
     def append(self, *entities: EntityT) -> None:
         for entity in entities:
@@ -270,6 +339,7 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
 
     def _append_one(self, entity: EntityT) -> None:
         self._entities.append(entity)
+        self._index_entity(entity, False)
 
     def remove(self, *entities: EntityT) -> None:
         for entity in entities:
@@ -278,14 +348,18 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
             self._remove_one(entity)
 
     def _remove_one(self, entity: EntityT) -> None:
-        self._entities.remove(entity)
+        for index, other_entity in enumerate(self._entities):
+            if other_entity is entity:
+                del self._entities[index]
+                break
+        self._unindex_entity(entity)
 
     def replace(self, *entities: EntityT) -> None:
-        self._entities = []
+        self._reset_entities()
         self.append(*entities)
 
     def clear(self) -> None:
-        self._entities = []
+        self._reset_entities()
 
     def __iter__(self) -> Iterator[EntityT]:
         return self._entities.__iter__()
@@ -324,9 +398,14 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
         return entities
 
     def _getitem_by_entity_id(self, entity_id: str) -> EntityT:
-        for entity in self._entities:
-            if entity_id == entity.id:
-                return entity
+        entities_by_id = self._get_entities_by_id()
+        if entities_by_id is None:
+            for entity in self._entities:
+                if entity_id == entity.id:
+                    return entity
+        else:
+            with suppress(KeyError):
+                return entities_by_id[entity_id]
         raise KeyError(f'Cannot find a {self._entity_type} entity with ID "{entity_id}".')
 
     def __delitem__(self, key: Union[int, slice, str, EntityT]) -> None:
@@ -344,17 +423,16 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
         self.remove(entity)
 
     def _delitem_by_index(self, index: int) -> None:
-        del self._entities[index]
+        entity = self._entities.pop(index)
+        self._unindex_entity(entity)
 
     def _delitem_by_indices(self, indices: slice) -> None:
         for n, index in enumerate(slice_to_range(indices, self)):
             del self[index - n]
 
     def _delitem_by_entity_id(self, entity_id: str) -> None:
-        for entity in self._entities:
-            if entity_id == entity.id:
-                self.remove(entity)
-                return
+        with suppress(KeyError):
+            self.remove(self._getitem_by_entity_id(entity_id))
 
     def __contains__(self, value: Union[EntityT, str, Any]) -> bool:
         if isinstance(value, self._entity_type):
@@ -364,16 +442,16 @@ class SingleTypeEntityCollection(Generic[EntityT], EntityCollection[EntityT]):
         return False
 
     def _contains_by_entity(self, other_entity: EntityT) -> bool:
-        for entity in self._entities:
-            if other_entity is entity:
-                return True
-        return False
+        entity_identities = self._get_entity_identities()
+        if entity_identities is None:
+            return any(other_entity is entity for entity in self._entities)
+        return id(other_entity) in entity_identities
 
     def _contains_by_entity_id(self, entity_id: str) -> bool:
-        for entity in self._entities:
-            if entity.id == entity_id:
-                return True
-        return False
+        entities_by_id = self._get_entities_by_id()
+        if entities_by_id is None:
+            return any(entity_id == entity.id for entity in self._entities)
+        return entity_id in entities_by_id
 
     def __add__(self, other) -> Self:  # type: ignore
         if not isinstance(other, EntityCollection):
@@ -486,11 +564,27 @@ class MultipleTypesEntityCollection(EntityCollection[Entity]):
     def _getitem_by_entity_type_name(self, entity_type_name: str) -> SingleTypeEntityCollection[Entity]:
         return self._get_collection(get_entity_type(entity_type_name))
 
+    def _locate_index(self, index: int) -> Tuple[SingleTypeEntityCollection, int]:
+        collections = list(self._collections.values())
+        offsets = list(accumulate(map(len, collections)))
+        length = offsets[-1] if offsets else 0
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError
+        collection_index = bisect_right(offsets, index)
+        collection_offset = offsets[collection_index - 1] if collection_index else 0
+        return collections[collection_index], index - collection_offset
+
     def _getitem_by_index(self, index: int) -> Entity:
-        return reduce(operator.add, self._collections.values(), SingleTypeEntityCollection(Entity))[index]
+        collection, collection_index = self._locate_index(index)
+        return collection[collection_index]
 
     def _getitem_by_indices(self, indices: slice) -> SingleTypeEntityCollection[Entity]:
-        return reduce(operator.add, self._collections.values(), SingleTypeEntityCollection(Entity))[indices]
+        entities: SingleTypeEntityCollection[Entity] = SingleTypeEntityCollection(Entity)
+        for index in slice_to_range(indices, self):
+            entities.append(self._getitem_by_index(index))
+        return entities
 
     def __delitem__(self, key: Union[int, slice, str, Type[Entity], Entity]) -> None:
         if isinstance(key, type) and issubclass(key, Entity):
@@ -512,13 +606,8 @@ class MultipleTypesEntityCollection(EntityCollection[Entity]):
         self.remove(entity)
 
     def _delitem_by_index(self, index: int) -> None:
-        for collection in self._collections.values():
-            collection_length = len(collection)
-            if collection_length > index:
-                del collection[index]
-                return
-            index -= collection_length
-        raise IndexError
+        collection, collection_index = self._locate_index(index)
+        del collection[collection_index]
 
     def _delitem_by_indices(self, indices: slice) -> None:
         for n, index in enumerate(slice_to_range(indices, self)):
@@ -528,9 +617,17 @@ class MultipleTypesEntityCollection(EntityCollection[Entity]):
         self._delitem_by_entity_type(get_entity_type(entity_type_name))
 
     def __iter__(self) -> Iterator[EntityT]:
-        for collection in self._collections.values():
-            for entity in collection:
-                yield entity
+        return chain.from_iterable(self._collections.values())
+
+    def iter_by_entity_types(self, *entity_types: type) -> Iterator[Entity]:
+        """
+        Iterate over the entities of the given types, or any of their subclasses.
+
+        Only the per-type collections that match are visited, so entities of other types are not iterated over at all.
+        """
+        for collection_entity_type, collection in list(self._collections.items()):
+            if issubclass(collection_entity_type, entity_types):
+                yield from collection
 
     def __len__(self) -> int:
         return sum(map(len, self._collections.values()))
@@ -541,10 +638,7 @@ class MultipleTypesEntityCollection(EntityCollection[Entity]):
         return False
 
     def _contains_by_entity(self, other_entity: EntityT) -> bool:
-        for entity in self:  # type: ignore
-            if other_entity is entity:
-                return True
-        return False
+        return any(other_entity in collection for collection in self._collections.values())
 
     def prepend(self, *entities: EntityT) -> None:
         for entity in entities:
@@ -564,7 +658,7 @@ class MultipleTypesEntityCollection(EntityCollection[Entity]):
             self.append(entity)
 
     def clear(self) -> None:
-        for collection in self._collections:
+        for collection in self._collections.values():
             collection.clear()
 
     def __add__(self, other) -> MultipleTypesEntityCollection:
@@ -653,15 +747,14 @@ class _ToMany:
             cls,
             self._owner_attr_name,
             _EntityTypeAssociation.Cardinality.MANY,
-            self._create_entity_collection,
         ))
         original_init = cls.__init__
 
         @functools.wraps(original_init)
         def _init(owner: Entity, *args, **kwargs):
             assert isinstance(owner, Entity), f'{owner} is not an {Entity}.'
-            entities = self._create_entity_collection(owner)
-            setattr(owner, self._owner_private_attr_name, entities)
+            # Most associations of most entities remain empty, so create their collections only once they are needed.
+            setattr(owner, self._owner_private_attr_name, None)
             original_init(owner, *args, **kwargs)
         cls.__init__ = _init  # type: ignore
         setattr(cls, self._owner_attr_name, property(self._get, self._set, self._delete))
@@ -669,13 +762,18 @@ class _ToMany:
         return cls
 
     def _get(self, owner: Entity) -> EntityCollection:
-        return getattr(owner, self._owner_private_attr_name)
+        entities = getattr(owner, self._owner_private_attr_name)
+        if entities is None:
+            entities = self._create_entity_collection(owner)
+            setattr(owner, self._owner_private_attr_name, entities)
+        return entities
 
     def _set(self, owner: Entity, entities: Iterable[Entity]) -> None:
         self._get(owner).replace(*entities)
 
     def _delete(self, owner: Entity) -> None:
-        self._get(owner).clear()
+        if getattr(owner, self._owner_private_attr_name) is not None:
+            self._get(owner).clear()
 
     def _create_entity_collection(self, owner: Entity) -> EntityCollection:
         return SingleTypeEntityCollection(Entity)
@@ -809,16 +907,25 @@ class FlattenedEntityCollection:
         for entity in self._entities:  # type: ignore
             entity = unflatten(entity)
             for association_registration in _EntityTypeAssociationRegistry.get_associations(entity.__class__):
-                setattr(
-                    entity,
-                    f'_{association_registration.attr_name}',
-                    association_registration.init_value(entity),
-                )
+                # To-one associations are empty, and to-many associations create their collections when needed.
+                setattr(entity, f'_{association_registration.attr_name}', None)
+
+    def _build_entity_id_maps(self) -> Dict[Type[Entity], Dict[str, Entity]]:
+        entity_id_maps: Dict[Type[Entity], Dict[str, Entity]] = defaultdict(dict)
+        for entity in self._entities:  # type: ignore
+            unflattened_entity = unflatten(entity)
+            # If multiple entities share an ID, the first one wins, like it does for entity collections.
+            entity_id_maps[get_entity_type(unflattened_entity)].setdefault(entity.id, unflattened_entity)
+        return entity_id_maps
 
     def _unflatten_associations(self) -> None:
+        entity_id_maps = self._build_entity_id_maps()
         for association in self._associations:
-            owner = unflatten(self._entities[association.owner_type][association.owner_id])
-            associate = unflatten(self._entities[association.associate_type][association.associate_id])
+            try:
+                owner = entity_id_maps[association.owner_type][association.owner_id]
+                associate = entity_id_maps[association.associate_type][association.associate_id]
+            except KeyError:
+                raise KeyError(f'Cannot find the {association.owner_type} entity with ID "{association.owner_id}" or the {association.associate_type} entity with ID "{association.associate_id}" to associate through "{association.owner_association_attr_name}".') from None
             owner_association_attr_value = getattr(owner, association.owner_association_attr_name)
             if isinstance(owner_association_attr_value, EntityCollection):
                 owner_association_attr_value.append(associate)
@@ -850,10 +957,11 @@ class FlattenedEntityCollection:
 
             for association_registration in _EntityTypeAssociationRegistry.get_associations(entity_type):
                 associates = getattr(unflatten(entity), f'_{association_registration.attr_name}')
+                # To-one associations may be empty, and to-many associations may not have created their collections yet.
+                if associates is None:
+                    continue
                 # Consider one a special case of many.
                 if association_registration.cardinality == association_registration.Cardinality.ONE:
-                    if associates is None:
-                        continue
                     associates = [associates]
                 for associate in associates:
                     self.add_association(
@@ -877,3 +985,64 @@ class FlattenedEntityCollection:
             get_entity_type(associate_type),
             associate_id,
         ))
+
+
+class _EntityPickler(pickle.Pickler):
+    """
+    Pickle entities without following their associations.
+
+    Ancestries are deeply nested graphs, which the pickle module cannot serialize in one go without exceeding the
+    recursion limit. Instead, each reference to an entity is pickled by index, and each entity's state is pickled
+    separately after that.
+    """
+
+    def __init__(self, f: IO[bytes]):
+        super().__init__(f, pickle.HIGHEST_PROTOCOL)
+        self._entity_indices: Dict[int, int] = {}
+        self.entities: List[Entity] = []
+
+    def persistent_id(self, obj: Any) -> Optional[Tuple[int, Optional[Type[Entity]]]]:
+        if not isinstance(obj, Entity):
+            return None
+        try:
+            return self._entity_indices[id(obj)], None
+        except KeyError:
+            entity_index = self._entity_indices[id(obj)] = len(self.entities)
+            self.entities.append(obj)
+            # Include the entity type with the first reference, so unpickling can create the entity right away.
+            return entity_index, obj.__class__
+
+
+def pickle_entities(entities: Iterable[Entity], f: IO[bytes]) -> None:
+    """
+    Pickle entities and all entities associated with them, however deeply nested their associations are.
+    """
+    pickler = _EntityPickler(f)
+    pickler.dump(list(entities))
+    # Pickling an entity's state may reference more entities, which will then be pickled by a later iteration.
+    entity_index = 0
+    while entity_index < len(pickler.entities):
+        pickler.dump(pickler.entities[entity_index].__dict__)
+        entity_index += 1
+
+
+def unpickle_entities(f: IO[bytes]) -> List[Entity]:
+    """
+    Unpickle entities pickled by :py:func:`betty.model.pickle_entities`.
+    """
+    entities: List[Entity] = []
+
+    def _load_entity(pid: Tuple[int, Optional[Type[Entity]]]) -> Entity:
+        entity_index, entity_type = pid
+        if entity_type is not None:
+            entities.append(entity_type.__new__(entity_type))
+        return entities[entity_index]
+
+    unpickler = pickle.Unpickler(f)
+    unpickler.persistent_load = _load_entity  # type: ignore
+    loaded_entities = unpickler.load()
+    entity_index = 0
+    while entity_index < len(entities):
+        entities[entity_index].__dict__.update(unpickler.load())
+        entity_index += 1
+    return loaded_entities
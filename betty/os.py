@@ -1,15 +1,94 @@
 import os
 import shutil
+import stat
+from contextlib import suppress
+from pathlib import Path
 from typing import Union, Optional
 
 PathLike = Union[str, os.PathLike]
 
 
-def link_or_copy(source_path: PathLike, destination_path: PathLike) -> None:
+# The permissions of published files and directories, so web servers can read them. They are set explicitly rather than
+# through the umask, because the umask is shared by the entire process.
+FILE_MODE = 0o644
+DIRECTORY_MODE = 0o755
+
+
+def makedirs(path: PathLike) -> None:
+    """
+    Create a directory and any missing parents, and give the directories it creates the permissions to publish them.
+    """
+    path = Path(path)
+    try:
+        path.mkdir()
+    except FileExistsError:
+        if not path.is_dir():
+            raise
+        return
+    except FileNotFoundError:
+        makedirs(path.parent)
+        makedirs(path)
+        return
+    os.chmod(path, DIRECTORY_MODE)
+
+
+def opener(path: PathLike, flags: int) -> int:
+    """
+    Open a file for :py:func:`open`, and give the file the permissions to publish it.
+    """
+    fd = os.open(path, flags, FILE_MODE)
+    os.chmod(path, FILE_MODE)
+    return fd
+
+
+def copy(source_path: PathLike, destination_path: PathLike) -> None:
+    """
+    Copy a file and its modification time, and give the copy the permissions to publish it.
+
+    Unlike :py:func:`shutil.copy2`, this does not copy the source's permissions, which may not let others read the file.
+    """
+    shutil.copyfile(source_path, destination_path)
+    os.chmod(destination_path, FILE_MODE)
+    source_stat = os.stat(source_path)
+    os.utime(destination_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+
+
+def copytree(source_path: PathLike, destination_path: PathLike) -> None:
+    """
+    Copy a directory's contents like :py:func:`betty.os.copy` copies files.
+    """
+    source_path = Path(source_path)
+    destination_path = Path(destination_path)
+    for directory_path_str, _, file_names in os.walk(source_path):
+        directory_path = Path(directory_path_str)
+        destination_directory_path = destination_path / directory_path.relative_to(source_path)
+        makedirs(destination_directory_path)
+        for file_name in file_names:
+            copy(directory_path / file_name, destination_directory_path / file_name)
+
+
+def link_or_copy(source_path: PathLike, destination_path: PathLike, replace: bool = False) -> None:
+    """
+    Hard-link a file, or copy it if it cannot be linked.
+
+    Files that are not world-readable are always copied, so that the destination's permissions let others read it
+    without changing those of the source, which the destination would otherwise share.
+
+    :param replace: Whether to replace an existing destination. Existing destinations are removed rather than
+        overwritten, because they may be linked to other files that must remain unchanged.
+    """
+    if replace:
+        with suppress(FileNotFoundError):
+            if os.path.samefile(source_path, destination_path):
+                return
+            os.remove(destination_path)
+    if not os.stat(source_path).st_mode & stat.S_IROTH:
+        copy(source_path, destination_path)
+        return
     try:
         os.link(source_path, destination_path)
     except OSError:
-        shutil.copyfile(source_path, destination_path)
+        copy(source_path, destination_path)
 
 
 class ChDir:
@@ -506,6 +506,7 @@ class ProjectConfiguration(FileBasedConfiguration):
         self._locales = LocaleConfigurationCollection()
         self._locales.react(self)
         self._lifetime_threshold = 125
+        self._output_directory_path: Optional[Path] = None
 
     @property
     def project_directory_path(self) -> Path:
@@ -513,8 +514,19 @@ class ProjectConfiguration(FileBasedConfiguration):
 
     @property
     def output_directory_path(self) -> Path:
+        if self._output_directory_path is not None:
+            return self._output_directory_path
         return self.project_directory_path / 'output'
 
+    @output_directory_path.setter
+    def output_directory_path(self, output_directory_path: Path) -> None:
+        # The output directory path is not part of the configuration file, and is overridden while a site is built.
+        self._output_directory_path = output_directory_path
+
+    @output_directory_path.deleter
+    def output_directory_path(self) -> None:
+        self._output_directory_path = None
+
     @property
     def assets_directory_path(self) -> Path:
         return self.project_directory_path / 'assets'
@@ -1,11 +1,17 @@
-from typing import Type, List, Set
+import builtins
+from pathlib import Path
+from typing import Type, List, Set, Optional
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
 
 import pytest
 
-from betty.app import Extension, App, CyclicDependencyError
+from betty import app as app_module
+
+from betty.app import Extension, App, CyclicDependencyError, AppConfiguration
 from betty.app.extension import ConfigurableExtension as GenericConfigurableExtension
 from betty.config import Configuration, DumpedConfigurationImport, DumpedConfigurationExport
-from betty.config.load import Loader
+from betty.config.load import Loader, ConfigurationValidationError
 from betty.project import ExtensionConfiguration
 
 
@@ -91,6 +97,74 @@ class ConfigurableExtension(GenericConfigurableExtension[ConfigurableExtensionCo
         return ConfigurableExtensionConfiguration(False)
 
 
+class _PortugueseExtension(Extension):
+    assets_directory_path_value: Optional[Path] = None
+
+    @classmethod
+    def assets_directory_path(cls) -> Optional[Path]:
+        return cls.assets_directory_path_value
+
+
+class TestAppConfiguration:
+    def test_image_jobs(self) -> None:
+        sut = AppConfiguration()
+        assert sut.image_jobs is None
+        sut.image_jobs = 3
+        assert 3 == sut.image_jobs
+
+    def test_image_jobs_with_invalid_value_should_raise_error(self) -> None:
+        sut = AppConfiguration()
+        with pytest.raises(ConfigurationValidationError):
+            with App():
+                sut.image_jobs = 0
+
+    def test_load_with_image_jobs(self) -> None:
+        sut = AppConfiguration()
+        loader = Loader()
+        sut.load({
+            'locale': 'nl-NL',
+            'image_jobs': 3,
+        }, loader)
+        loader.commit()
+        assert 3 == sut.image_jobs
+
+    def test_dump_with_image_jobs(self) -> None:
+        sut = AppConfiguration()
+        sut.image_jobs = 3
+        assert 3 == sut.dump()['image_jobs']  # type: ignore
+
+    def test_image_cache_size(self) -> None:
+        sut = AppConfiguration()
+        assert AppConfiguration.DEFAULT_IMAGE_CACHE_SIZE == sut.image_cache_size
+        sut.image_cache_size = 3
+        assert 3 == sut.image_cache_size
+
+    def test_image_cache_size_with_invalid_value_should_raise_error(self) -> None:
+        sut = AppConfiguration()
+        with pytest.raises(ConfigurationValidationError):
+            with App():
+                sut.image_cache_size = -1
+
+    def test_load_with_image_cache_size(self) -> None:
+        sut = AppConfiguration()
+        loader = Loader()
+        sut.load({
+            'locale': 'nl-NL',
+            'image_cache_size': 3,
+        }, loader)
+        loader.commit()
+        assert 3 == sut.image_cache_size
+
+    def test_dump_with_image_cache_size(self) -> None:
+        sut = AppConfiguration()
+        sut.image_cache_size = 3
+        assert 3 == sut.dump()['image_cache_size']  # type: ignore
+
+    def test_dump_with_default_image_cache_size(self) -> None:
+        sut = AppConfiguration()
+        assert 'image_cache_size' not in sut.dump()  # type: ignore
+
+
 class TestApp:
     def test_extensions_with_one_extension(self) -> None:
         with App() as sut:
@@ -183,3 +257,56 @@ class TestApp:
             sut.extensions
             del sut.project.configuration.extensions[NonConfigurableExtension]
             assert NonConfigurableExtension not in sut.extensions
+
+    def test_acquire_locale(self) -> None:
+        with App() as sut:
+            with sut.acquire_locale('nl-NL'):
+                assert 'nl-NL' == sut.locale
+                assert 'Persoon' == builtins._('Person')  # type: ignore
+            assert 'en-US' == sut.locale
+            assert 'Person' == builtins._('Person')  # type: ignore
+
+    def test_acquire_locale_should_release_locale_after_error(self) -> None:
+        with App() as sut:
+            with pytest.raises(RuntimeError):
+                with sut.acquire_locale('nl-NL'):
+                    raise RuntimeError
+            assert 'en-US' == sut.locale
+
+    def test_acquire_locale_should_negotiate_once(self, monkeypatch) -> None:
+        with App() as sut:
+            with sut.acquire_locale('nl-NL'):
+                pass
+            negotiate_locale = Mock(side_effect=app_module.negotiate_locale)
+            monkeypatch.setattr(app_module, 'negotiate_locale', negotiate_locale)
+            with sut.acquire_locale('nl-NL'):
+                assert 'nl-NL' == sut.locale
+            negotiate_locale.assert_not_called()
+
+    def test_acquire_locale_should_negotiate_again_after_assets_change(self, tmp_path: Path) -> None:
+        po_file_path = tmp_path / 'locale' / 'pt_BR' / 'LC_MESSAGES' / 'betty.po'
+        po_file_path.parent.mkdir(parents=True)
+        po_file_path.write_text('''
+msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\\n"
+
+msgid "Person"
+msgstr "Pessoa"
+''')
+        _PortugueseExtension.assets_directory_path_value = tmp_path
+        with App() as sut:
+            with sut.acquire_locale('pt-BR'):
+                assert 'Person' == builtins._('Person')  # type: ignore
+            sut.project.configuration.extensions.add(ExtensionConfiguration(_PortugueseExtension))
+            with sut.acquire_locale('pt-BR'):
+                assert 'Pessoa' == builtins._('Person')  # type: ignore
+
+    def test_image_executor_should_be_shut_down_on_release(self) -> None:
+        image_executor = ThreadPoolExecutor()
+        with App() as sut:
+            sut.image_executor = image_executor
+            future = sut.image_executor.submit(sum, [1, 2])
+        assert 3 == future.result()
+        with pytest.raises(RuntimeError):
+            image_executor.submit(sum, [1, 2])
@@ -0,0 +1,125 @@
+import gzip
+import os
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from betty.app import App
+from betty.compressor import Compressor, CompressorConfiguration, brotli
+from betty.config import DumpedConfigurationImport
+from betty.config.load import ConfigurationValidationError
+from betty.generate import generate
+from betty.model.ancestry import Person
+from betty.project import ExtensionConfiguration
+from betty.tests.config.test___init__ import raises_configuration_error, raises_no_configuration_errors
+
+
+class TestCompressorConfiguration:
+    def test_load_with_minimal_configuration(self) -> None:
+        dumped_configuration: Dict = {}
+        sut = CompressorConfiguration()
+        with raises_no_configuration_errors() as loader:
+            sut.load(dumped_configuration, loader)
+        assert CompressorConfiguration.DEFAULT_GZIP_LEVEL == sut.gzip_level
+        assert CompressorConfiguration.DEFAULT_BROTLI_QUALITY == sut.brotli_quality
+
+    def test_load_with_levels(self) -> None:
+        dumped_configuration = {
+            'gzip_level': 1,
+            'brotli_quality': 11,
+        }
+        sut = CompressorConfiguration()
+        with raises_no_configuration_errors() as loader:
+            sut.load(dumped_configuration, loader)
+        assert 1 == sut.gzip_level
+        assert 11 == sut.brotli_quality
+
+    @pytest.mark.parametrize('dumped_configuration', [
+        {'gzip_level': 0},
+        {'gzip_level': 10},
+        {'gzip_level': '9'},
+        {'brotli_quality': -1},
+        {'brotli_quality': 12},
+    ])
+    def test_load_with_invalid_levels_should_error(self, dumped_configuration: DumpedConfigurationImport) -> None:
+        with App():
+            with raises_configuration_error(error_type=ConfigurationValidationError) as loader:
+                CompressorConfiguration().load(dumped_configuration, loader)
+
+    def test_dump(self) -> None:
+        sut = CompressorConfiguration()
+        sut.gzip_level = 1
+        sut.brotli_quality = 11
+        assert {
+            'gzip_level': 1,
+            'brotli_quality': 11,
+        } == sut.dump()
+
+
+class TestCompressor:
+    def _app(self, tmp_path: Path) -> App:
+        app = App()
+        app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+        app.project.configuration.extensions.add(ExtensionConfiguration(Compressor))
+        app.project.ancestry.entities.append(Person('P0'))
+        return app
+
+    def _assert_variants(self, file_path: Path) -> None:
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        with gzip.open(file_path.with_name(file_path.name + '.gz')) as f:
+            assert content == f.read()
+        assert os.stat(file_path).st_mtime_ns == os.stat(file_path.with_name(file_path.name + '.gz')).st_mtime_ns
+        if brotli:
+            with open(file_path.with_name(file_path.name + '.br'), 'rb') as f:
+                assert content == brotli.decompress(f.read())
+        else:
+            assert not file_path.with_name(file_path.name + '.br').exists()
+
+    async def test_generate_should_compress_pages(self, tmp_path: Path) -> None:
+        app = self._app(tmp_path)
+        with app:
+            await generate(app)
+        self._assert_variants(app.project.configuration.www_directory_path / 'person' / 'P0' / 'index.html')
+        self._assert_variants(app.project.configuration.www_directory_path / 'api' / 'index.json')
+
+    async def test_generate_should_compress_assets(self, tmp_path: Path) -> None:
+        app = self._app(tmp_path)
+        with app:
+            await generate(app)
+        self._assert_variants(app.project.configuration.www_directory_path / 'schema.json')
+        self._assert_variants(app.project.configuration.www_directory_path / 'robots.txt')
+
+    async def test_generate_should_not_compress_images(self, tmp_path: Path) -> None:
+        app = self._app(tmp_path)
+        with app:
+            await generate(app)
+        assert not (app.project.configuration.www_directory_path / 'betty.ico.gz').exists()
+
+    @pytest.mark.parametrize('incremental', [
+        False,
+        True,
+    ])
+    async def test_generate_should_link_variants_of_unchanged_pages(self, incremental: bool, tmp_path: Path) -> None:
+        app = self._app(tmp_path)
+        with app:
+            await generate(app, incremental=incremental)
+        variant_path = app.project.configuration.www_directory_path / 'person' / 'P0' / 'index.html.gz'
+        variant_inode = os.stat(variant_path).st_ino
+        app = self._app(tmp_path)
+        with app:
+            await generate(app, incremental=incremental)
+        assert variant_inode == os.stat(variant_path).st_ino
+        self._assert_variants(variant_path.with_name('index.html'))
+
+    async def test_generate_should_compress_unchanged_pages_without_variants(self, tmp_path: Path) -> None:
+        app = App()
+        app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+        app.project.ancestry.entities.append(Person('P0'))
+        with app:
+            await generate(app)
+        app = self._app(tmp_path)
+        with app:
+            await generate(app)
+        self._assert_variants(app.project.configuration.www_directory_path / 'person' / 'P0' / 'index.html')
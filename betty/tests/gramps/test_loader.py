@@ -1,11 +1,18 @@
+import logging
+import os
+import shutil
+import tarfile
+from io import BytesIO
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from typing import Optional
+from unittest.mock import patch, call
 
 import pytest
 
+from betty import fs
 from betty.app import App
-from betty.gramps.loader import load_xml, load_gpkg, load_gramps
+from betty.gramps.loader import load_xml, load_gpkg, load_gramps, GrampsLoadFileError
 from betty.locale import Date, DateRange
 from betty.model.ancestry import Ancestry, PersonName, Citation, Note, Source, File, Event, Person, Place
 from betty.model.event_type import Birth, Death, UnknownEventType
@@ -25,6 +32,75 @@ class TestLoadGpkg:
             gramps_file_path = Path(__file__).parent / 'assets' / 'minimal.gpkg'
             load_gpkg(app.project.ancestry, gramps_file_path)
 
+    def test_load_gpkg_should_extract_referenced_files_only(self, monkeypatch, tmp_path: Path):
+        monkeypatch.setattr(fs, 'CACHE_DIRECTORY_PATH', tmp_path / 'cache')
+        gpkg_path = tmp_path / 'tree.gpkg'
+        with tarfile.open(Path(__file__).parent / 'assets' / 'minimal.gpkg', mode='r:gz') as source_tar_file:
+            with tarfile.open(gpkg_path, mode='w:gz') as tar_file:
+                for member in source_tar_file.getmembers():
+                    tar_file.addfile(member, source_tar_file.extractfile(member))
+                unreferenced_member = tarfile.TarInfo('unreferenced.gif')
+                unreferenced_member.size = 3
+                tar_file.addfile(unreferenced_member, BytesIO(b'GIF'))
+        with App() as app:
+            load_gpkg(app.project.ancestry, gpkg_path)
+            file = app.project.ancestry.entities[File]['O0000']
+        assert file.path.is_file()
+        assert (tmp_path / 'cache') in file.path.parents
+        assert not (file.path.parents[3] / 'unreferenced.gif').exists()
+
+    def _reorder_gpkg(self, gpkg_path: Path) -> None:
+        # Put data.gramps before the media files, rather than after them like Gramps does.
+        with tarfile.open(Path(__file__).parent / 'assets' / 'minimal.gpkg', mode='r:gz') as source_tar_file:
+            with tarfile.open(gpkg_path, mode='w:gz') as tar_file:
+                for member in sorted(source_tar_file.getmembers(), key=lambda member: member.name != 'data.gramps'):
+                    tar_file.addfile(member, source_tar_file.extractfile(member))
+
+    def test_load_gpkg_should_read_archive_once_if_files_follow_data_gramps(self, monkeypatch, tmp_path: Path):
+        monkeypatch.setattr(fs, 'CACHE_DIRECTORY_PATH', tmp_path / 'cache')
+        gpkg_path = tmp_path / 'tree.gpkg'
+        self._reorder_gpkg(gpkg_path)
+        with App() as app:
+            with patch('tarfile.open', wraps=tarfile.open) as m_open:
+                load_gpkg(app.project.ancestry, gpkg_path)
+            file = app.project.ancestry.entities[File]['O0000']
+        assert file.path.is_file()
+        m_open.assert_called_once_with(gpkg_path, mode='r|gz')
+
+    def test_load_gpkg_should_read_archive_twice_if_files_precede_data_gramps(self, monkeypatch, tmp_path: Path):
+        monkeypatch.setattr(fs, 'CACHE_DIRECTORY_PATH', tmp_path / 'cache')
+        gpkg_path = Path(__file__).parent / 'assets' / 'minimal.gpkg'
+        with App() as app:
+            with patch('tarfile.open', wraps=tarfile.open) as m_open:
+                load_gpkg(app.project.ancestry, gpkg_path)
+            file = app.project.ancestry.entities[File]['O0000']
+        assert file.path.is_file()
+        assert [call(gpkg_path, mode='r|gz')] * 2 == m_open.call_args_list
+
+    def test_load_gpkg_should_remove_files_extracted_from_previous_versions(self, monkeypatch, tmp_path: Path):
+        monkeypatch.setattr(fs, 'CACHE_DIRECTORY_PATH', tmp_path / 'cache')
+        gpkg_path = tmp_path / 'tree.gpkg'
+        shutil.copyfile(Path(__file__).parent / 'assets' / 'minimal.gpkg', gpkg_path)
+        with App() as app:
+            load_gpkg(app.project.ancestry, gpkg_path)
+            previous_file_path = app.project.ancestry.entities[File]['O0000'].path
+        stale_file_path = previous_file_path.parent / 'stale.gif'
+        stale_file_path.touch()
+        self._reorder_gpkg(gpkg_path)
+        os.utime(gpkg_path, (1, 1))
+        with App() as app:
+            load_gpkg(app.project.ancestry, gpkg_path)
+            file = app.project.ancestry.entities[File]['O0000']
+        assert file.path.is_file()
+        assert not stale_file_path.exists()
+        assert 1 == len([path for path in (tmp_path / 'cache' / 'gramps').iterdir() if path.is_dir()])
+
+    def test_load_gpkg_with_gramps_file_should_error(self):
+        with App() as app:
+            gramps_file_path = Path(__file__).parent / 'assets' / 'minimal.gramps'
+            with pytest.raises(GrampsLoadFileError):
+                load_gpkg(app.project.ancestry, gramps_file_path)
+
 
 @pytest.fixture(scope='class')
 def test_load_xml_ancestry() -> Ancestry:
@@ -69,6 +145,22 @@ class TestLoadXml:
             gramps_file_path = Path(__file__).parent / 'assets' / 'minimal.xml'
             load_xml(app.project.ancestry, gramps_file_path, rootname(gramps_file_path))
 
+    def test_load_xml_with_invalid_xml(self):
+        with App() as app:
+            with pytest.raises(GrampsLoadFileError):
+                load_xml(app.project.ancestry, '<database>', rootname(Path(__file__)))
+
+    def test_load_xml_should_log_sections(self, caplog):
+        with caplog.at_level(logging.INFO):
+            self._load_partial("""
+<people>
+    <person handle="_e1dd3ac2fa22e6fefa18f738bdd" change="1552126811" id="I0000">
+        <gender>U</gender>
+    </person>
+</people>
+""")
+        assert 'Loaded 1 people.' in caplog.messages
+
     def test_place_should_include_name(self, test_load_xml_ancestry):
         place = test_load_xml_ancestry.entities[Place]['P0000']
         names = place.names
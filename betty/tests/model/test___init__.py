@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import copy
 import pickle
-from typing import Optional, Any, Iterator, Tuple, List
+from io import BytesIO
+from typing import Optional, Any, Iterator, Tuple, List, cast
 
 import pytest
 
@@ -10,8 +11,8 @@ from betty.model import GeneratedEntityId, get_entity_type_name, Entity, get_ent
     _EntityTypeAssociationRegistry, SingleTypeEntityCollection, _AssociateCollection, MultipleTypesEntityCollection, \
     one_to_many, many_to_one_to_many, FlattenedEntityCollection, many_to_many, \
     EntityCollection, to_many, many_to_one, to_one, one_to_one, EntityVariation, EntityTypeInvalidError, \
-    EntityTypeImportError
-from betty.model.ancestry import Person
+    EntityTypeImportError, pickle_entities, unpickle_entities
+from betty.model.ancestry import Person, PersonName
 
 
 class TestGeneratedEntityid:
@@ -116,6 +117,7 @@ class Test_EntityTypeAssociationRegistry:
         yield parent_registration, child_registration
         _EntityTypeAssociationRegistry._registrations.remove(parent_registration)
         _EntityTypeAssociationRegistry._registrations.remove(child_registration)
+        _EntityTypeAssociationRegistry._associations.clear()
 
     def test_get_associations_with_parent_class_should_return_parent_associations(self, registrations) -> None:
         parent_registration, _ = registrations
@@ -125,6 +127,17 @@ class Test_EntityTypeAssociationRegistry:
         parent_registration, child_registration = registrations
         assert {parent_registration, child_registration} == _EntityTypeAssociationRegistry.get_associations(self._ChildEntity)
 
+    def test_register_should_invalidate_associations(self, registrations) -> None:
+        parent_registration, child_registration = registrations
+        assert {parent_registration, child_registration} == _EntityTypeAssociationRegistry.get_associations(self._ChildEntity)
+        other_child_registration = _EntityTypeAssociation(self._ChildEntity, 'other_child_associate', _EntityTypeAssociation.Cardinality.MANY)
+        _EntityTypeAssociationRegistry.register(other_child_registration)
+        try:
+            assert {parent_registration, child_registration, other_child_registration} == _EntityTypeAssociationRegistry.get_associations(self._ChildEntity)
+        finally:
+            _EntityTypeAssociationRegistry._registrations.remove(other_child_registration)
+            _EntityTypeAssociationRegistry._associations.clear()
+
 
 class SingleTypeEntityCollectionTestEntity(Entity):
     pass
@@ -270,6 +283,51 @@ class TestSingleTypeEntityCollection:
         with pytest.raises(KeyError):
             sut['4']
 
+    def test_getitem_by_entity_id_after_pickle(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity = SingleTypeEntityCollectionTestEntity('1')
+        sut.append(entity)
+        unpickled_sut = pickle.loads(pickle.dumps(sut))
+        assert entity.id == unpickled_sut['1'].id
+        assert unpickled_sut[0] in unpickled_sut
+        assert entity not in unpickled_sut
+
+    def test_getitem_by_entity_id_with_duplicate_entity_ids(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity1 = SingleTypeEntityCollectionTestEntity('1')
+        entity2 = SingleTypeEntityCollectionTestEntity('1')
+        sut.append(entity1, entity2)
+        assert entity1 is sut['1']
+        sut.remove(entity1)
+        assert entity2 is sut['1']
+        sut.remove(entity2)
+        assert '1' not in sut
+
+    def test_large_collection(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entities = [SingleTypeEntityCollectionTestEntity(str(entity_id)) for entity_id in range(99)]
+        duplicate_id_entity = SingleTypeEntityCollectionTestEntity('0')
+        sut.append(*entities, *entities, duplicate_id_entity)
+        assert [*entities, duplicate_id_entity] == list(sut)
+        assert all(entity in sut for entity in entities)
+        assert all(entity.id in sut for entity in entities)
+        assert entities[9] is sut['9']
+        assert entities[0] is sut['0']
+        del sut['0']
+        assert entities[0] not in sut
+        assert duplicate_id_entity is sut['0']
+        del sut[0]
+        assert entities[1] not in sut
+        assert '1' not in sut
+        with pytest.raises(KeyError):
+            sut['1']
+        sut.prepend(entities[1])
+        assert entities[1] is sut[0]
+        assert entities[1] is sut['1']
+        unpickled_sut = pickle.loads(pickle.dumps(sut))
+        assert unpickled_sut[0] is unpickled_sut['1']
+        assert unpickled_sut[0] in unpickled_sut
+
     def test_delitem_by_index(self) -> None:
         sut = SingleTypeEntityCollection(Entity)
         entity1 = SingleTypeEntityCollectionTestEntity()
@@ -332,6 +390,19 @@ class TestSingleTypeEntityCollection:
         assert entity1.id in sut
         assert entity2.id not in sut
 
+    def test_contains_after_delitem_by_index(self) -> None:
+        sut = SingleTypeEntityCollection(Entity)
+        entity1 = SingleTypeEntityCollectionTestEntity()
+        entity2 = SingleTypeEntityCollectionTestEntity()
+        sut.append(entity1, entity2)
+
+        del sut[0]
+
+        assert entity1 not in sut
+        assert entity1.id not in sut
+        assert entity2 in sut
+        assert entity2.id in sut
+
     @pytest.mark.parametrize('value', [
         True,
         False,
@@ -677,6 +748,22 @@ class TestMultipleTypesEntityCollection:
         with pytest.raises(IndexError):
             sut[2]
 
+    def test_getitem_by_index_across_entity_types(self) -> None:
+        sut = MultipleTypesEntityCollection()
+        entity_one1 = MultipleTypesEntityCollectionTestEntityOne()
+        entity_one2 = MultipleTypesEntityCollectionTestEntityOne()
+        entity_other1 = MultipleTypesEntityCollectionTestEntityOther()
+        entity_other2 = MultipleTypesEntityCollectionTestEntityOther()
+        sut.append(entity_one1, entity_other1, entity_one2, entity_other2)
+        assert entity_one1 is sut[0]
+        assert entity_one2 is sut[1]
+        assert entity_other1 is sut[2]
+        assert entity_other2 is sut[3]
+        assert entity_other2 is sut[-1]
+        assert entity_one1 is sut[-4]
+        with pytest.raises(IndexError):
+            sut[-5]
+
     def test_getitem_by_indices(self) -> None:
         sut = MultipleTypesEntityCollection()
         entity_one = MultipleTypesEntityCollectionTestEntityOne()
@@ -717,6 +804,19 @@ class TestMultipleTypesEntityCollection:
 
         assert [entity1, entity3] == list(sut)
 
+    def test_delitem_by_index_across_entity_types(self) -> None:
+        sut = MultipleTypesEntityCollection()
+        entity_one = MultipleTypesEntityCollectionTestEntityOne()
+        entity_other1 = MultipleTypesEntityCollectionTestEntityOther()
+        entity_other2 = MultipleTypesEntityCollectionTestEntityOther()
+        sut.append(entity_one, entity_other1, entity_other2)
+
+        del sut[2]
+
+        assert [entity_one, entity_other1] == list(sut)
+        with pytest.raises(IndexError):
+            del sut[2]
+
     def test_delitem_by_indices(self) -> None:
         sut = MultipleTypesEntityCollection()
         entity1 = MultipleTypesEntityCollectionTestEntityOne()
@@ -767,6 +867,27 @@ class TestMultipleTypesEntityCollection:
         sut[MultipleTypesEntityCollectionTestEntityOther].append(entity_other)
         assert [entity_one, entity_other] == list(list(sut))
 
+    def test_iter_by_entity_types(self) -> None:
+        sut = MultipleTypesEntityCollection()
+        entity_one = MultipleTypesEntityCollectionTestEntityOne()
+        entity_other = MultipleTypesEntityCollectionTestEntityOther()
+        sut.append(entity_one, entity_other)
+        assert [entity_one] == list(sut.iter_by_entity_types(MultipleTypesEntityCollectionTestEntityOne))
+        assert [entity_one, entity_other] == list(sut.iter_by_entity_types(
+            MultipleTypesEntityCollectionTestEntityOne,
+            MultipleTypesEntityCollectionTestEntityOther,
+        ))
+        assert [entity_one, entity_other] == list(sut.iter_by_entity_types(Entity))
+        assert [] == list(sut.iter_by_entity_types(Person))
+
+    def test_clear(self) -> None:
+        sut = MultipleTypesEntityCollection()
+        entity_one = MultipleTypesEntityCollectionTestEntityOne()
+        entity_other = MultipleTypesEntityCollectionTestEntityOther()
+        sut.append(entity_one, entity_other)
+        sut.clear()
+        assert [] == list(sut)
+
     def test_len(self) -> None:
         sut = MultipleTypesEntityCollection()
         entity_one = MultipleTypesEntityCollectionTestEntityOne()
@@ -856,6 +977,16 @@ class TestFlattenedEntityCollection:
         assert 1 == len(unflattened_entity_many.other_many)
         assert unflattened_entity_other_many in unflattened_entity_many.other_many
 
+    def test_add_association_with_unknown_associate_then_unflatten(self) -> None:
+        entity_many = self._ManyToMany_Many()
+
+        flattened_entities = FlattenedEntityCollection()
+        flattened_entities.add_entity(entity_many)
+        flattened_entities.add_association(self._ManyToMany_Many, entity_many.id, 'other_many', self._ManyToMany_OtherMany, 'unknown')
+
+        with pytest.raises(KeyError):
+            flattened_entities.unflatten()
+
     def test_add_entity_with_to_many_association_then_unflatten(self) -> None:
         entity_many = self._ManyToMany_Many()
         entity_other_many = self._ManyToMany_OtherMany()
@@ -1166,3 +1297,24 @@ class TestManyToOneToMany:
         unpickled_entity_one = pickle.loads(pickle.dumps(entity_one))
         assert entity_left_many.id == unpickled_entity_one.left_many.id
         assert entity_right_many.id == unpickled_entity_one.right_many.id
+
+
+class TestPickleEntities:
+    def test_should_pickle_and_unpickle_deeply_associated_entities(self) -> None:
+        people: List[Person] = []
+        for person_index in range(10000):
+            person = Person(f'P{person_index}')
+            PersonName(person, f'Jane {person_index}')
+            if people:
+                person.parents.append(people[-1])
+            people.append(person)
+        f = BytesIO()
+        pickle_entities(people, f)
+        f.seek(0)
+        loaded_people = cast(List[Person], unpickle_entities(f))
+        assert [person.id for person in people] == [person.id for person in loaded_people]
+        loaded_person = loaded_people[9999]
+        assert 'Jane 9999' == loaded_person.names[0].individual
+        assert loaded_person is loaded_person.names[0].person
+        assert loaded_people[9998] is loaded_person.parents[0]
+        assert loaded_person is loaded_people[9998].children[0]
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from betty.app import App
+from betty.cache import prune, init_index, record_uses
+
+
+class TestPrune:
+    def _write(self, file_path: Path, size: int, mtime: int) -> None:
+        file_path.parent.mkdir(exist_ok=True, parents=True)
+        file_path.write_bytes(b'0' * size)
+        os.utime(file_path, (mtime, mtime))
+
+    async def test_should_remove_least_recently_used_files(self, tmp_path: Path) -> None:
+        self._write(tmp_path / 'oldest', 10, 1)
+        self._write(tmp_path / 'subdirectory' / 'older', 10, 2)
+        self._write(tmp_path / 'newest', 10, 3)
+        with App():
+            await prune(tmp_path, 25)
+        assert not (tmp_path / 'oldest').exists()
+        assert (tmp_path / 'subdirectory' / 'older').exists()
+        assert (tmp_path / 'newest').exists()
+
+    async def test_should_keep_files_within_max_size(self, tmp_path: Path) -> None:
+        self._write(tmp_path / 'older', 10, 1)
+        self._write(tmp_path / 'newer', 10, 2)
+        with App():
+            await prune(tmp_path, 20)
+        assert (tmp_path / 'older').exists()
+        assert (tmp_path / 'newer').exists()
+
+    async def test_without_directory(self, tmp_path: Path) -> None:
+        with App():
+            await prune(tmp_path / 'cache', 0)
+
+    async def test_should_prefer_recorded_uses_over_modification_times(self, tmp_path: Path) -> None:
+        self._write(tmp_path / 'cache' / 'older', 10, 1)
+        self._write(tmp_path / 'cache' / 'newer', 10, 2)
+        with closing(sqlite3.connect(tmp_path / 'cache.sqlite3')) as connection:
+            init_index(connection)
+            record_uses(connection, ['older'])
+            connection.commit()
+        with App():
+            await prune(tmp_path / 'cache', 15)
+        assert (tmp_path / 'cache' / 'older').exists()
+        assert not (tmp_path / 'cache' / 'newer').exists()
+
+    async def test_should_forget_removed_files(self, tmp_path: Path) -> None:
+        self._write(tmp_path / 'cache' / 'removed', 10, 1)
+        with closing(sqlite3.connect(tmp_path / 'cache.sqlite3')) as connection:
+            init_index(connection)
+            record_uses(connection, ['removed', 'missing'])
+            connection.commit()
+        with App():
+            await prune(tmp_path / 'cache', 0)
+        assert not (tmp_path / 'cache' / 'removed').exists()
+        with closing(sqlite3.connect(tmp_path / 'cache.sqlite3')) as connection:
+            assert [] == connection.execute('SELECT name FROM cache_file_uses').fetchall()
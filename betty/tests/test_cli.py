@@ -144,6 +144,34 @@ class TestClearCaches:
             open(cached_file_path)
 
 
+class TestCacheClear:
+    @patch_cache
+    def test(self):
+        cached_file_path = Path(fs.CACHE_DIRECTORY_PATH) / 'KeepMeAroundPlease'
+        open(cached_file_path, 'w').close()
+        runner = CliRunner()
+        result = runner.invoke(main, ('cache', 'clear'), catch_exceptions=False)
+        assert 0 == result.exit_code
+        assert not cached_file_path.exists()
+
+
+class TestCachePrune:
+    @patch_cache
+    def test(self):
+        image_cache_directory_path = Path(fs.CACHE_DIRECTORY_PATH) / 'image'
+        image_cache_directory_path.mkdir()
+        older_cached_file_path = image_cache_directory_path / 'older'
+        older_cached_file_path.write_bytes(b'0' * 2 ** 20)
+        os.utime(older_cached_file_path, (1, 1))
+        newer_cached_file_path = image_cache_directory_path / 'newer'
+        newer_cached_file_path.write_bytes(b'0' * 2 ** 20)
+        runner = CliRunner()
+        result = runner.invoke(main, ('cache', 'prune', '--max-size', '1'), catch_exceptions=False)
+        assert 0 == result.exit_code
+        assert not older_cached_file_path.exists()
+        assert newer_cached_file_path.exists()
+
+
 class TestDemo:
     @patch('betty.serve.AppServer', new_callable=lambda: _KeyboardInterruptedServer)
     def test(self, m_server):
@@ -172,7 +200,33 @@ class TestGenerate:
         render_args, render_kwargs = m_generate.call_args
         assert 1 == len(render_args)
         assert isinstance(render_args[0], App)
-        assert {} == render_kwargs
+        assert {'incremental': False, 'jobs': 1} == render_kwargs
+
+    @patch('betty.generate.generate', new_callable=AsyncMock)
+    @patch('betty.load.load', new_callable=AsyncMock)
+    def test_with_incremental(self, m_load, m_generate):
+        configuration = ProjectConfiguration()
+        configuration.write()
+        runner = CliRunner()
+        result = runner.invoke(main, ('-c', str(configuration.configuration_file_path), 'generate', '--incremental'), catch_exceptions=False)
+        assert 0 == result.exit_code
+
+        m_generate.assert_called_once()
+        render_args, render_kwargs = m_generate.call_args
+        assert {'incremental': True, 'jobs': 1} == render_kwargs
+
+    @patch('betty.generate.generate', new_callable=AsyncMock)
+    @patch('betty.load.load', new_callable=AsyncMock)
+    def test_with_jobs(self, m_load, m_generate):
+        configuration = ProjectConfiguration()
+        configuration.write()
+        runner = CliRunner()
+        result = runner.invoke(main, ('-c', str(configuration.configuration_file_path), 'generate', '--jobs', '2'), catch_exceptions=False)
+        assert 0 == result.exit_code
+
+        m_generate.assert_called_once()
+        render_args, render_kwargs = m_generate.call_args
+        assert {'incremental': False, 'jobs': 2} == render_kwargs
 
 
 class _KeyboardInterruptedServer(Server):
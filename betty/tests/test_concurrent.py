@@ -40,6 +40,17 @@ class TestExceptionRaisingAwaitableExecutor:
         assert future.result() is True
         assert [True, True] == tracker
 
+    def test_wait_with_exception_should_raise(self) -> None:
+        def _task():
+            raise RuntimeError()
+
+        sut = ExceptionRaisingAwaitableExecutor(ThreadPoolExecutor())
+        sut.submit(_task)
+        with pytest.raises(RuntimeError):
+            sut.wait()
+        # The error was raised once, and shutting down does not raise it again.
+        sut.shutdown()
+
     def test_wait_with_mapped_tasks(self) -> None:
         tracker = []
 
@@ -1,9 +1,10 @@
+import os
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
 import pytest
 
-from betty.fs import iterfiles, FileSystem, hashfile
+from betty.fs import iterfiles, FileSystem, hashfile, hashfilecontent
 
 
 class TestIterfiles:
@@ -34,6 +35,22 @@ class TestHashfile:
         assert hashfile(file_path_1) != hashfile(file_path_2)
 
 
+class TestHashfilecontent:
+    def test_hashfilecontent_with_moved_file(self, tmp_path: Path):
+        file_path = tmp_path / 'file'
+        file_path.write_bytes(b'Hello, world!')
+        file_hash = hashfilecontent(file_path)
+        moved_file_path = tmp_path / 'moved-file'
+        file_path.rename(moved_file_path)
+        os.utime(moved_file_path, (0, 0))
+        assert file_hash == hashfilecontent(moved_file_path)
+
+    def test_hashfilecontent_with_different_files(self):
+        file_path_1 = Path(__file__).parents[1] / 'assets' / 'public' / 'static' / 'betty-16x16.png'
+        file_path_2 = Path(__file__).parents[1] / 'assets' / 'public' / 'static' / 'betty-512x512.png'
+        assert hashfilecontent(file_path_1) != hashfilecontent(file_path_2)
+
+
 class TestFileSystem:
     async def test_open(self):
         with TemporaryDirectory() as source_path_1:
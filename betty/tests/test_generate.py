@@ -1,15 +1,20 @@
+import asyncio
 import json as stdjson
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, Future
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 
 import html5lib
 import pytest
+from PIL import UnidentifiedImageError
 
-from betty import json
+from betty import json, generate as generate_module
 from betty.app import App
-from betty.generate import generate
-from betty.model.ancestry import Person, Place, Source, PlaceName, File, Event, Citation
+from betty.generate import generate, _generate_concurrently
+from betty.media_type import MediaType
+from betty.model.ancestry import Person, Place, Source, PlaceName, File, Event, Citation, PersonName
 from betty.model.event_type import Birth
 from betty.project import LocaleConfiguration, EntityTypeConfiguration
 
@@ -31,6 +36,35 @@ def assert_betty_json(app: App, url_path: str, schema_definition: str) -> Path:
     return file_path
 
 
+_IMAGE_PATH = Path(__file__).parents[1] / 'assets' / 'public' / 'static' / 'betty-512x512.png'
+
+
+def _write_person_template(tmp_path: Path, template: str) -> None:
+    """
+    Override the person page template for the project in the given directory.
+    """
+    person_template_file_path = tmp_path / 'assets' / 'templates' / 'entity' / 'page--person.html.j2'
+    person_template_file_path.parent.mkdir(parents=True)
+    person_template_file_path.write_text(template)
+
+
+def _app_with_file(tmp_path: Path, image_path: Path = _IMAGE_PATH, person_count: int = 1) -> App:
+    """
+    Create an app for the project in the given directory, whose people all have the same image file.
+
+    Apps for the same directory share the same project, and therefore the same output.
+    """
+    file = File('F1', image_path, media_type=MediaType('image/png'))
+    people = [Person(f'P{i}') for i in range(person_count)]
+    for person in people:
+        person.files.append(file)
+    app = App()
+    app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+    app.project.ancestry.entities.append(file, *people)
+    app.image_executor = ThreadPoolExecutor()
+    return app
+
+
 class TestGenerate:
     async def test_html_lang(self):
         app = App()
@@ -202,3 +236,331 @@ class TestSitemapGenerate:
         with open(app.project.configuration.www_directory_path / 'sitemap.xml') as f:
             sitemap_doc = etree.parse(f)
         schema.validate(sitemap_doc)
+
+
+class TestGenerateConcurrently:
+    @pytest.fixture(autouse=True)
+    def _concurrency(self, monkeypatch) -> None:
+        monkeypatch.setattr(generate_module, '_GENERATE_CONCURRENCY', 2)
+
+    async def test_should_limit_concurrency(self) -> None:
+        running = 0
+        max_running = 0
+        done = []
+
+        async def _coroutine(index: int) -> None:
+            nonlocal running, max_running
+            running += 1
+            max_running = max(running, max_running)
+            await asyncio.sleep(0)
+            running -= 1
+            done.append(index)
+
+        async def _coroutines():
+            for index in range(10):
+                yield _coroutine(index)
+
+        await _generate_concurrently(_coroutines())
+        assert list(range(10)) == sorted(done)
+        assert 2 == max_running
+
+    async def test_should_produce_lazily(self) -> None:
+        produced = 0
+        max_pending = 0
+        done = 0
+
+        async def _coroutine() -> None:
+            nonlocal done
+            await asyncio.sleep(0)
+            done += 1
+
+        async def _coroutines():
+            nonlocal produced, max_pending
+            for _index in range(100):
+                produced += 1
+                max_pending = max(produced - done, max_pending)
+                yield _coroutine()
+
+        await _generate_concurrently(_coroutines())
+        assert 100 == done
+        # At most two coroutines are running, two are queued, and one is waiting to be queued.
+        assert max_pending <= 5
+
+    async def test_should_raise_errors(self) -> None:
+        async def _coroutine() -> None:
+            raise RuntimeError
+
+        async def _coroutines():
+            for _index in range(10):
+                yield _coroutine()
+
+        with pytest.raises(RuntimeError):
+            await _generate_concurrently(_coroutines())
+
+
+class _RecordingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__()
+        self.submitted_args = []
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        self.submitted_args.append(args)
+        return super().submit(fn, *args, **kwargs)
+
+
+class TestGenerateWithJobs:
+    async def test(self, tmp_path: Path) -> None:
+        app = App()
+        app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+        app.project.configuration.locales.replace([
+            LocaleConfiguration('en-US', 'en'),
+            LocaleConfiguration('nl-NL', 'nl'),
+        ])
+        app.project.ancestry.entities.append(Person('P0'), Person('P1'), Person('P2'), Person('P3'))
+        with app:
+            await generate(app, jobs=2)
+        for person_id in ('P0', 'P1', 'P2', 'P3'):
+            for locale in ('en', 'nl'):
+                assert_betty_html(app, f'/{locale}/person/{person_id}/index.html')
+                assert_betty_json(app, f'/{locale}/person/{person_id}/index.json', 'person')
+        with open(app.project.configuration.www_directory_path / 'nl' / 'person' / 'P1' / 'index.html') as f:
+            assert 'Persoon P1' in f.read()
+
+    async def test_with_incremental(self, tmp_path: Path) -> None:
+        app = App()
+        app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+        app.project.ancestry.entities.append(Person('P0'), Person('P1'))
+        with app:
+            await generate(app, incremental=True, jobs=2)
+        page_path = app.project.configuration.www_directory_path / 'person' / 'P0' / 'index.html'
+        with open(page_path, 'w') as f:
+            f.write('Betty was here')
+        app = App()
+        app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+        app.project.ancestry.entities.append(Person('P0'))
+        with app:
+            await generate(app, incremental=True, jobs=2)
+        with open(page_path) as f:
+            assert 'Betty was here' == f.read()
+        assert not (app.project.configuration.www_directory_path / 'person' / 'P1').exists()
+
+    async def test_should_derive_images_once(self, tmp_path: Path) -> None:
+        _write_person_template(tmp_path, '{{ entity.files | first | image(99) }}')
+        app = _app_with_file(tmp_path, person_count=8)
+        image_executor = _RecordingExecutor()
+        with app:
+            app.image_executor = image_executor
+            await generate(app, jobs=2)
+        assert 1 == len(image_executor.submitted_args)
+        assert (app.project.configuration.www_directory_path / 'file' / 'F1-99x-.png').exists()
+
+
+class TestGenerateOutput:
+    def _app(self, tmp_path: Path) -> App:
+        app = App()
+        # Builds must share the same project to share the same output.
+        app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+        app.project.ancestry.entities.append(Person('P0'))
+        return app
+
+    async def test_should_replace_previous_output(self, tmp_path: Path) -> None:
+        app = self._app(tmp_path)
+        with app:
+            await generate(app)
+        stale_file_path = app.project.configuration.output_directory_path / 'stale'
+        stale_file_path.touch()
+        with app:
+            await generate(app)
+        assert (app.project.configuration.www_directory_path / 'person' / 'P0' / 'index.html').exists()
+        assert not stale_file_path.exists()
+        assert tmp_path / 'output' == app.project.configuration.output_directory_path
+        assert [tmp_path / 'output'] == [path for path in tmp_path.iterdir() if path.name.startswith('output')]
+
+    async def test_should_keep_previous_output_if_generation_fails(self, monkeypatch, tmp_path: Path) -> None:
+        app = self._app(tmp_path)
+        with app:
+            await generate(app)
+
+        async def _generate_failure(*args, **kwargs) -> None:
+            raise RuntimeError
+
+        monkeypatch.setattr(generate_module, '_generate', _generate_failure)
+        with app:
+            with pytest.raises(RuntimeError):
+                await generate(app)
+        assert (app.project.configuration.www_directory_path / 'person' / 'P0' / 'index.html').exists()
+        assert not (tmp_path / 'output.staging').exists()
+
+    async def test_with_corrupt_image_should_raise(self, tmp_path: Path) -> None:
+        _write_person_template(tmp_path, '{{ entity.files | first | image(99) }}')
+        image_path = tmp_path / 'image.png'
+        image_path.write_bytes(b'not an image')
+        app = _app_with_file(tmp_path, image_path)
+        with app:
+            with pytest.raises(UnidentifiedImageError):
+                await generate(app)
+
+    @pytest.mark.skipif(sys.platform == 'win32', reason='Windows does not support POSIX file permissions.')
+    async def test_should_set_permissions(self, tmp_path: Path) -> None:
+        app = self._app(tmp_path)
+        previous_umask = os.umask(0o077)
+        try:
+            with app:
+                await generate(app)
+        finally:
+            os.umask(previous_umask)
+        page_path = app.project.configuration.www_directory_path / 'person' / 'P0' / 'index.html'
+        assert 0o644 == page_path.stat().st_mode & 0o777
+        assert 0o755 == page_path.parent.stat().st_mode & 0o777
+        assert 0o755 == app.project.configuration.output_directory_path.stat().st_mode & 0o777
+
+    @pytest.mark.skipif(sys.platform == 'win32', reason='Windows does not support POSIX file permissions.')
+    async def test_should_set_permissions_of_published_files(self, tmp_path: Path) -> None:
+        _write_person_template(tmp_path, '{{ entity.files | first | image(99) }} {{ entity.files | first | file }}')
+        image_path = tmp_path / 'image.png'
+        image_path.write_bytes(_IMAGE_PATH.read_bytes())
+        image_path.chmod(0o600)
+        app = _app_with_file(tmp_path, image_path)
+        previous_umask = os.umask(0o077)
+        try:
+            with app:
+                await generate(app)
+        finally:
+            os.umask(previous_umask)
+        assert 0o644 == (app.project.configuration.www_directory_path / 'file' / 'F1-99x-.png').stat().st_mode & 0o777
+        assert 0o644 == (app.project.configuration.www_directory_path / 'file' / 'F1' / 'file' / 'image.png').stat().st_mode & 0o777
+        assert 0o600 == image_path.stat().st_mode & 0o777
+
+    @pytest.mark.skipif(sys.platform == 'win32', reason='Windows does not support POSIX file permissions.')
+    async def test_should_set_permissions_of_copied_assets(self, tmp_path: Path) -> None:
+        asset_path = tmp_path / 'assets' / 'public' / 'static' / 'private.txt'
+        asset_path.parent.mkdir(parents=True)
+        asset_path.write_text('I will say zis only once.')
+        asset_path.chmod(0o600)
+        app = self._app(tmp_path)
+        previous_umask = os.umask(0o077)
+        try:
+            with app:
+                await generate(app)
+        finally:
+            os.umask(previous_umask)
+        assert 0o644 == (app.project.configuration.www_directory_path / 'private.txt').stat().st_mode & 0o777
+        assert 0o600 == asset_path.stat().st_mode & 0o777
+
+
+class TestGenerateUnchangedPages:
+    def _app(self, tmp_path: Path, person: Person) -> App:
+        app = App()
+        # Builds must share the same project to share the same output.
+        app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+        app.project.ancestry.entities.append(person)
+        return app
+
+    async def _generate(self, app: App) -> Path:
+        with app:
+            await generate(app)
+        return app.project.configuration.www_directory_path / 'person' / 'P0' / 'index.html'
+
+    async def test_should_keep_unchanged_pages(self, tmp_path: Path) -> None:
+        page_path = await self._generate(self._app(tmp_path, Person('P0')))
+        os.utime(page_path, (0, 0))
+        await self._generate(self._app(tmp_path, Person('P0')))
+        assert 0 == page_path.stat().st_mtime
+
+    async def test_should_keep_unchanged_derived_images(self, tmp_path: Path) -> None:
+        _write_person_template(tmp_path, '{{ entity.files | first | image(99) }}')
+        app = _app_with_file(tmp_path)
+        await self._generate(app)
+        derived_image_path = app.project.configuration.www_directory_path / 'file' / 'F1-99x-.png'
+        os.utime(derived_image_path, (0, 0))
+        await self._generate(_app_with_file(tmp_path))
+        assert 0 == derived_image_path.stat().st_mtime
+
+    async def test_should_restore_output_moved_aside_by_interrupted_build(self, tmp_path: Path) -> None:
+        page_path = await self._generate(self._app(tmp_path, Person('P0')))
+        os.utime(page_path, (0, 0))
+        # Interrupt a build after it moved the previous output aside, but before it moved the new output into place.
+        output_directory_path = tmp_path / 'output'
+        os.replace(output_directory_path, tmp_path / 'output.old')
+        await self._generate(self._app(tmp_path, Person('P0')))
+        assert 0 == page_path.stat().st_mtime
+        assert not (tmp_path / 'output.old').exists()
+
+    async def test_should_write_changed_pages(self, tmp_path: Path) -> None:
+        page_path = await self._generate(self._app(tmp_path, Person('P0')))
+        os.utime(page_path, (0, 0))
+        person = Person('P0')
+        person.private = True
+        await self._generate(self._app(tmp_path, person))
+        assert 0 != page_path.stat().st_mtime
+
+
+class TestIncrementalGenerate:
+    def _app(self, tmp_path: Path, *people: Person) -> App:
+        app = App()
+        # Incremental builds must share the same project to share the same output.
+        app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+        app.project.ancestry.entities.append(*people)
+        return app
+
+    async def _generate(self, app: App) -> None:
+        with app:
+            await generate(app, incremental=True)
+
+    def _page_path(self, app: App, person_id: str) -> Path:
+        return app.project.configuration.www_directory_path / 'person' / person_id / 'index.html'
+
+    async def test_should_keep_unchanged_pages(self, tmp_path: Path) -> None:
+        app = self._app(tmp_path, Person('P0'))
+        await self._generate(app)
+        with open(self._page_path(app, 'P0'), 'w') as f:
+            f.write('Betty was here')
+        await self._generate(self._app(tmp_path, Person('P0')))
+        with open(self._page_path(app, 'P0')) as f:
+            assert 'Betty was here' == f.read()
+
+    async def test_should_render_changed_pages(self, tmp_path: Path) -> None:
+        app = self._app(tmp_path, Person('P0'))
+        await self._generate(app)
+        with open(self._page_path(app, 'P0'), 'w') as f:
+            f.write('Betty was here')
+        person = Person('P0')
+        person.private = True
+        await self._generate(self._app(tmp_path, person))
+        with open(self._page_path(app, 'P0')) as f:
+            assert 'Betty was here' != f.read()
+
+    async def test_should_render_pages_with_changed_dependencies(self, tmp_path: Path) -> None:
+        parent = Person('P0')
+        child = Person('P1')
+        child.parents.append(parent)
+        PersonName(parent, 'Jane')
+        app = self._app(tmp_path, parent, child)
+        await self._generate(app)
+        with open(self._page_path(app, 'P1'), 'w') as f:
+            f.write('Betty was here')
+        parent = Person('P0')
+        child = Person('P1')
+        child.parents.append(parent)
+        PersonName(parent, 'Janet')
+        await self._generate(self._app(tmp_path, parent, child))
+        with open(self._page_path(app, 'P1')) as f:
+            assert 'Betty was here' != f.read()
+
+    @pytest.mark.parametrize('jobs', [1, 2])
+    async def test_should_keep_files_published_by_unchanged_pages(self, jobs: int, tmp_path: Path) -> None:
+        _write_person_template(tmp_path, '{{ entity.files | first | image(99) }} {{ entity.files | first | file }}')
+        for _build in range(2):
+            app = _app_with_file(tmp_path)
+            with app:
+                await generate(app, incremental=True, jobs=jobs)
+        assert (app.project.configuration.www_directory_path / 'file' / 'F1-99x-.png').exists()
+        assert (app.project.configuration.www_directory_path / 'file' / 'F1' / 'file' / 'betty-512x512.png').exists()
+
+    async def test_should_remove_stale_pages(self, tmp_path: Path) -> None:
+        app = self._app(tmp_path, Person('P0'), Person('P1'))
+        await self._generate(app)
+        await self._generate(self._app(tmp_path, Person('P0')))
+        assert self._page_path(app, 'P0').exists()
+        assert not self._page_path(app, 'P1').exists()
+        assert not self._page_path(app, 'P1').parent.exists()
@@ -0,0 +1,198 @@
+import os
+import shutil
+import sqlite3
+from concurrent.futures import Executor
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Optional
+from unittest.mock import patch, Mock, call
+
+import pytest
+from PIL import Image
+
+from betty import image
+from betty.image import derive_image, derive_image_set, derive_pdf_image, submit_derivatives
+from betty.lock import Locks
+
+_IMAGE_PATH = Path(__file__).parents[1] / 'assets' / 'public' / 'static' / 'betty-512x512.png'
+
+
+class TestDeriveImage:
+    def test_should_derive_image(self, tmp_path: Path) -> None:
+        derive_image(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', 'image.png', 99, None)
+        with Image.open(tmp_path / 'www' / 'image.png') as image:
+            assert 99 == image.width
+
+    def test_should_reuse_cached_image_for_moved_source_file(self, tmp_path: Path) -> None:
+        cache_directory_path = tmp_path / 'cache'
+        source_file_path = tmp_path / 'image.png'
+        shutil.copyfile(_IMAGE_PATH, source_file_path)
+        derive_image(source_file_path, cache_directory_path, tmp_path / 'www-1', 'image.png', 99, 99)
+        moved_source_file_path = tmp_path / 'moved-image.png'
+        source_file_path.rename(moved_source_file_path)
+        os.utime(moved_source_file_path)
+        derive_image(moved_source_file_path, cache_directory_path, tmp_path / 'www-2', 'image.png', 99, 99)
+        assert 1 == len(list(cache_directory_path.iterdir()))
+        assert (tmp_path / 'www-2' / 'image.png').exists()
+
+    def test_should_cache_images_with_different_sizes_separately(self, tmp_path: Path) -> None:
+        cache_directory_path = tmp_path / 'cache'
+        derive_image(_IMAGE_PATH, cache_directory_path, tmp_path / 'www', 'image-99x.png', 99, None)
+        derive_image(_IMAGE_PATH, cache_directory_path, tmp_path / 'www', 'image-x99.png', None, 99)
+        derive_image(_IMAGE_PATH, cache_directory_path, tmp_path / 'www', 'image-99x99.png', 99, 99)
+        assert 3 == len(list(cache_directory_path.iterdir()))
+
+    def test_should_record_cached_image_use(self, tmp_path: Path) -> None:
+        cache_directory_path = tmp_path / 'cache'
+        derive_image(_IMAGE_PATH, cache_directory_path, tmp_path / 'www-1', 'image.png', 99, None)
+        cache_file_path = next(cache_directory_path.iterdir())
+        with closing(sqlite3.connect(tmp_path / 'cache.sqlite3')) as connection:
+            connection.execute('UPDATE cache_file_uses SET used_ns = 0')
+            connection.commit()
+        derive_image(_IMAGE_PATH, cache_directory_path, tmp_path / 'www-2', 'image.png', 99, None)
+        with closing(sqlite3.connect(tmp_path / 'cache.sqlite3')) as connection:
+            assert 0 < connection.execute('SELECT used_ns FROM cache_file_uses WHERE name = ?', (cache_file_path.name,)).fetchone()[0]
+
+    def test_should_not_touch_cached_image(self, tmp_path: Path) -> None:
+        cache_directory_path = tmp_path / 'cache'
+        derive_image(_IMAGE_PATH, cache_directory_path, tmp_path / 'www-1', 'image.png', 99, None)
+        # Cache files may be linked into the output, so they share their modification times with the derived images.
+        os.utime(tmp_path / 'www-1' / 'image.png', (0, 0))
+        derive_image(_IMAGE_PATH, cache_directory_path, tmp_path / 'www-2', 'image.png', 99, None)
+        assert 0 == (tmp_path / 'www-1' / 'image.png').stat().st_mtime
+
+
+class TestDeriveImageIndex:
+    def test_should_not_read_indexed_source_file(self, tmp_path: Path) -> None:
+        derive_image(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www-1', 'image.png', 99, None)
+        # Forget the connection, so the index must be read from disk.
+        image._index_connections.clear()
+        with patch('betty.image.hashfilecontent') as m_hashfilecontent, patch('PIL.Image.open') as m_open:
+            derive_image(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www-2', 'image.png', 99, None)
+        m_hashfilecontent.assert_not_called()
+        m_open.assert_not_called()
+        assert (tmp_path / 'www-2' / 'image.png').exists()
+
+    def test_should_reindex_changed_source_file(self, tmp_path: Path) -> None:
+        source_file_path = tmp_path / 'image.png'
+        shutil.copyfile(_IMAGE_PATH, source_file_path)
+        derive_image(source_file_path, tmp_path / 'cache', tmp_path / 'www-1', 'image.png', 99, None)
+        Image.new('RGB', (199, 199)).save(source_file_path)
+        derive_image(source_file_path, tmp_path / 'cache', tmp_path / 'www-2', 'image.png', 99, None)
+        assert 2 == len(list((tmp_path / 'cache').iterdir()))
+
+    def test_should_reuse_cached_image_for_sizes_larger_than_source_file(self, tmp_path: Path) -> None:
+        derive_image(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www-1', 'image.png', 999, None)
+        with patch('PIL.Image.open') as m_open:
+            derive_image(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www-2', 'image.png', 1999, None)
+        m_open.assert_not_called()
+        assert 1 == len(list((tmp_path / 'cache').iterdir()))
+        with Image.open(tmp_path / 'www-2' / 'image.png') as derived_image:
+            assert 512 == derived_image.width
+
+
+class TestDeriveImageSet:
+    def test_should_derive_images(self, tmp_path: Path) -> None:
+        derive_image_set(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', (
+            ('image-99x.png', 99, None),
+            ('image-99x.webp', 99, None),
+            ('image-199x199.png', 199, 199),
+        ))
+        with Image.open(tmp_path / 'www' / 'image-99x.png') as image:
+            assert 99 == image.width
+        with Image.open(tmp_path / 'www' / 'image-99x.webp') as image:
+            assert 'WEBP' == image.format
+            assert 99 == image.width
+        with Image.open(tmp_path / 'www' / 'image-199x199.png') as image:
+            assert (199, 199) == image.size
+
+    def test_should_open_source_file_once(self, tmp_path: Path) -> None:
+        # Index the source file, which reads its header.
+        derive_image(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', 'image-9x.png', 9, None)
+        with patch('PIL.Image.open', wraps=Image.open) as m_open:
+            derive_image_set(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', (
+                ('image-99x.png', 99, None),
+                ('image-199x.png', 199, None),
+                ('image-299x.png', 299, None),
+            ))
+        m_open.assert_called_once_with(_IMAGE_PATH)
+
+    def test_should_not_open_source_file_for_cached_images(self, tmp_path: Path) -> None:
+        derivatives = (
+            ('image-99x.png', 99, None),
+            ('image-199x.png', 199, None),
+        )
+        derive_image_set(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www-1', derivatives)
+        with patch('PIL.Image.open', wraps=Image.open) as m_open:
+            derive_image_set(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www-2', derivatives)
+        m_open.assert_not_called()
+
+    def test_with_overlapping_sets(self, tmp_path: Path) -> None:
+        derive_image_set(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', (
+            ('image-99x.png', 99, None),
+            ('image-199x.png', 199, None),
+        ))
+        derive_image_set(_IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', (
+            ('image-199x.png', 199, None),
+            ('image-299x.png', 299, None),
+        ))
+        with Image.open(tmp_path / 'www' / 'image-299x.png') as derived_image:
+            assert 299 == derived_image.width
+
+
+class TestSubmitDerivatives:
+    def test_should_submit_unclaimed_derivatives_only(self, tmp_path: Path) -> None:
+        executor = Mock(Executor)
+        locks = Locks()
+        submit_derivatives(executor, locks, derive_image_set, _IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', (
+            ('image-99x.png', 99, None),
+            ('image-199x.png', 199, None),
+        ))
+        submit_derivatives(executor, locks, derive_image_set, _IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', (
+            ('image-199x.png', 199, None),
+            ('image-299x.png', 299, None),
+        ))
+        submit_derivatives(executor, locks, derive_image_set, _IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', (
+            ('image-99x.png', 99, None),
+        ))
+        assert [
+            call(derive_image_set, _IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', (
+                ('image-99x.png', 99, None),
+                ('image-199x.png', 199, None),
+            )),
+            call(derive_image_set, _IMAGE_PATH, tmp_path / 'cache', tmp_path / 'www', (
+                ('image-299x.png', 299, None),
+            )),
+        ] == executor.submit.call_args_list
+
+
+class TestDerivePdfImage:
+    @pytest.mark.parametrize('expected_size, width, height', [
+        ((600, None), 600, None),
+        ((None, 600), None, 600),
+        ((600, None), 600, 600),
+    ])
+    def test_should_render_first_page_only(self, expected_size: Any, width: Optional[int], height: Optional[int], tmp_path: Path) -> None:
+        source_file_path = tmp_path / 'document.pdf'
+        source_file_path.write_bytes(b'%PDF-1.4')
+        with patch('pdf2image.pdfinfo_from_path') as m_pdfinfo_from_path, \
+                patch('pdf2image.convert_from_path', return_value=[Image.new('RGB', (600, 849))]) as m_convert_from_path:
+            derive_pdf_image(source_file_path, tmp_path / 'cache', tmp_path / 'www', 'document.jpg', width, height)
+        m_pdfinfo_from_path.assert_not_called()
+        m_convert_from_path.assert_called_once_with(source_file_path, first_page=1, last_page=1, fmt='jpeg', size=expected_size)
+        assert (tmp_path / 'www' / 'document.jpg').exists()
+
+    def test_should_render_wide_page_again_to_cover_height(self, tmp_path: Path) -> None:
+        source_file_path = tmp_path / 'document.pdf'
+        source_file_path.write_bytes(b'%PDF-1.4')
+        with patch('pdf2image.convert_from_path', side_effect=[
+            [Image.new('RGB', (600, 424))],
+            [Image.new('RGB', (849, 600))],
+        ]) as m_convert_from_path:
+            derive_pdf_image(source_file_path, tmp_path / 'cache', tmp_path / 'www', 'document.jpg', 600, 600)
+        assert [
+            call(source_file_path, first_page=1, last_page=1, fmt='jpeg', size=(600, None)),
+            call(source_file_path, first_page=1, last_page=1, fmt='jpeg', size=(None, 600)),
+        ] == m_convert_from_path.call_args_list
+        with Image.open(tmp_path / 'www' / 'document.jpg') as image:
+            assert (600, 600) == image.size
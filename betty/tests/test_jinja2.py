@@ -4,8 +4,11 @@ from typing import List, Dict, Optional, Iterable, Type, ContextManager
 from unittest.mock import Mock
 
 import pytest
+from jinja2 import TemplateNotFound
 
+from betty import fs
 from betty.app import App
+from betty.cache import clear
 from betty.jinja2 import Jinja2Renderer, _Citer, Jinja2Provider
 from betty.locale import Date, Datey, DateRange, Localized
 from betty.media_type import MediaType
@@ -25,6 +28,73 @@ class TestJinja2Provider:
         assert isinstance(sut.filters, dict)
 
 
+class TestEnvironment:
+    @pytest.fixture(autouse=True)
+    def _cache_directory_path(self, monkeypatch, tmp_path: Path) -> None:
+        monkeypatch.setattr(fs, 'CACHE_DIRECTORY_PATH', tmp_path / 'cache')
+
+    def _cached_bytecode_file_paths(self) -> List[Path]:
+        return list((fs.CACHE_DIRECTORY_PATH / 'jinja2').rglob('*.cache'))
+
+    def test_should_cache_bytecode(self) -> None:
+        with App() as app:
+            app.jinja2_environment.get_template('base.html.j2')
+        assert self._cached_bytecode_file_paths()
+
+    def test_should_load_cached_bytecode(self) -> None:
+        with App() as app:
+            app.jinja2_environment.get_template('base.html.j2')
+        with App() as app:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                monkeypatch.setattr(app.jinja2_environment, 'compile', Mock(side_effect=AssertionError('The template was compiled.')))
+                app.jinja2_environment.get_template('base.html.j2')
+
+    async def test_clear_should_clear_cached_bytecode(self) -> None:
+        with App() as app:
+            app.jinja2_environment.get_template('base.html.j2')
+            await clear()
+            assert not self._cached_bytecode_file_paths()
+            # Clearing the cache must not prevent the environment from caching bytecode again.
+            app.jinja2_environment.get_template('head.html.j2')
+        assert self._cached_bytecode_file_paths()
+
+
+class TestEnvironmentNegotiateTemplate:
+    def test_should_return_first_existing_template(self) -> None:
+        with App() as app:
+            template = app.jinja2_environment.negotiate_template([
+                'non-existent.html.j2',
+                'base.html.j2',
+                'head.html.j2',
+            ])
+            assert 'base.html.j2' == template.name
+
+    def test_without_existing_templates_should_raise_template_not_found(self) -> None:
+        with App() as app:
+            with pytest.raises(TemplateNotFound):
+                app.jinja2_environment.negotiate_template([
+                    'non-existent.html.j2',
+                    'another-non-existent.html.j2',
+                ])
+
+    def test_should_negotiate_once(self) -> None:
+        with App() as app:
+            app.jinja2_environment.negotiate_template(['non-existent.html.j2', 'base.html.j2'])
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                monkeypatch.setattr(app.jinja2_environment, 'list_templates', Mock(side_effect=AssertionError('The templates were listed again.')))
+                template = app.jinja2_environment.negotiate_template(['non-existent.html.j2', 'base.html.j2'])
+            assert 'base.html.j2' == template.name
+
+    def test_clear_negotiated_templates(self, tmp_path: Path) -> None:
+        with App() as app:
+            app.project.configuration.configuration_file_path = tmp_path / 'betty.json'
+            assert 'base.html.j2' == app.jinja2_environment.negotiate_template(['project.html.j2', 'base.html.j2']).name
+            (tmp_path / 'assets' / 'templates').mkdir(parents=True)
+            (tmp_path / 'assets' / 'templates' / 'project.html.j2').write_text('')
+            app.jinja2_environment.clear_negotiated_templates()
+            assert 'project.html.j2' == app.jinja2_environment.negotiate_template(['project.html.j2', 'base.html.j2']).name
+
+
 class TestJinja2Renderer:
     async def test_render_file(self) -> None:
         with App() as app:
@@ -166,7 +236,7 @@ class FilterFileTest(TemplateTestCase):
                 assert ((app.project.configuration.www_directory_path / file_path[1:]).exists())
 
 
-class FilterImageTest(TemplateTestCase):
+class TestFilterImage(TemplateTestCase):
     image_path = Path(__file__).parents[1] / 'assets' / 'public' / 'static' / 'betty-512x512.png'
 
     @pytest.mark.parametrize('expected, template, file', [
@@ -196,6 +266,47 @@ class FilterImageTest(TemplateTestCase):
                 pass
 
 
+class TestFilterImageSet(TemplateTestCase):
+    image_path = Path(__file__).parents[1] / 'assets' / 'public' / 'static' / 'betty-512x512.png'
+
+    @pytest.mark.parametrize('expected, template', [
+        ('/file/F1-99x-.png 99w, /file/F1-199x-.png 199w',
+         '{{ file | image_set([99, 199]) }}'),
+        ('/file/F1-99x99.png 99w, /file/F1-199x199.png 199w',
+         '{{ file | image_set([(99, 99), (199, 199)]) }}'),
+        ('/file/F1-99x99.png',
+         '{{ (file | image_set([(99, 99), (199, 199)])).urls[0] }}'),
+        ('/file/F1-99x-.webp 99w, /file/F1-199x-.webp 199w',
+         '{{ (file | image_set([99, 199], webp=True)).webp_srcset }}'),
+    ])
+    def test(self, expected: str, template: str) -> None:
+        file = File('F1', self.image_path, media_type=MediaType('image/png'))
+        with self._render(template_string=template, data={
+            'file': file,
+        }) as (actual, app):
+            assert expected == actual
+            for url in actual.split(', '):
+                file_path = url.split(' ')[0]
+                assert (app.project.configuration.www_directory_path / file_path[1:]).exists()
+
+    def test_with_overlapping_sizes(self) -> None:
+        file = File('F1', self.image_path, media_type=MediaType('image/png'))
+        template = '{{ file | image(99) }} {{ file | image_set([99, 199]) }} {{ file | image_set([199, 299]) }}'
+        with self._render(template_string=template, data={
+            'file': file,
+        }) as (actual, app):
+            for destination_name in ('F1-99x-.png', 'F1-199x-.png', 'F1-299x-.png'):
+                assert (app.project.configuration.www_directory_path / 'file' / destination_name).exists()
+
+    def test_without_sizes(self) -> None:
+        file = File('F1', self.image_path, media_type=MediaType('image/png'))
+        with pytest.raises(ValueError):
+            with self._render(template_string='{{ file | image_set([]) }}', data={
+                'file': file,
+            }):
+                pass
+
+
 class GlobalCiterTest(TemplateTestCase):
     def test_cite(self):
         citation1 = Mock(Citation)
@@ -1,6 +1,7 @@
 import json as stdjson
 from tempfile import NamedTemporaryFile
 
+import pytest
 from geopy import Point
 
 from betty import json
@@ -14,6 +15,29 @@ from betty.model.event_type import Birth
 from betty.project import LocaleConfiguration
 
 
+class TestDumps:
+    def test_should_encode_entity(self) -> None:
+        person = Person('P1')
+        PersonName(person, 'Jane', 'Doë')
+        Presence(person, Subject(), Event('E1', Birth(), Date(1970, 1, 1)))
+        app = App()
+        app.project.configuration.locales.replace([
+            LocaleConfiguration('en-US', 'en'),
+            LocaleConfiguration('nl-NL', 'nl'),
+        ])
+        with app:
+            assert stdjson.dumps(person, cls=JSONEncoder.get_factory(app)) == json.dumps(person, app)
+
+    def test_with_unsupported_value_should_raise_type_error(self) -> None:
+        with App() as app:
+            with pytest.raises(TypeError):
+                json.dumps(object(), app)
+
+
+class _JSONEncoderTestPerson(Person):
+    pass
+
+
 class TestJSONEncoder:
     def assert_encodes(self, expected, data, schema_definition: str):
         app = App()
@@ -26,6 +50,11 @@ class TestJSONEncoder:
         json.validate(encoded_data, schema_definition, app)
         assert expected == encoded_data
 
+    def test_subclass_should_encode(self) -> None:
+        with App() as app:
+            encoded_data = stdjson.loads(stdjson.dumps(_JSONEncoderTestPerson('P1'), cls=JSONEncoder.get_factory(app)))
+        assert 'https://schema.org/Person' == encoded_data['@type']
+
     def test_coordinates_should_encode(self):
         latitude = 12.345
         longitude = -54.321
@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import Iterable, Type, Set
+
+import pytest
+
+from betty import fs
+from betty.app import App
+from betty.app.extension import Extension
+from betty.load import load, CacheableLoader, Loader
+from betty.model.ancestry import Person
+from betty.project import ExtensionConfiguration
+
+
+class _CountingLoader(Extension, Loader):
+    load_count = 0
+
+    async def load(self) -> None:
+        type(self).load_count += 1
+        self.app.project.ancestry.entities.append(Person('P0'))
+
+
+class _NonCacheableLoader(_CountingLoader):
+    pass
+
+
+class _CacheableLoader(_CountingLoader, CacheableLoader):
+    source_file_path: Path
+
+    def loader_source_file_paths(self) -> Iterable[Path]:
+        yield self.source_file_path
+
+
+class _DependsOnCacheableLoader(Extension):
+    @classmethod
+    def depends_on(cls) -> Set[Type[Extension]]:
+        return {_CacheableLoader}
+
+
+class TestLoad:
+    @pytest.fixture(autouse=True)
+    def _cache_directory_path(self, monkeypatch, tmp_path: Path) -> None:
+        monkeypatch.setattr(fs, 'CACHE_DIRECTORY_PATH', tmp_path / 'cache')
+        _NonCacheableLoader.load_count = 0
+        _CacheableLoader.load_count = 0
+        _CacheableLoader.source_file_path = tmp_path / 'source'
+        _CacheableLoader.source_file_path.write_text('Some source data.')
+        self._configuration_file_path = tmp_path / 'betty.json'
+
+    def _app(self) -> App:
+        app = App()
+        # The cache is scoped to the project, so all apps must share the same project.
+        app.project.configuration.configuration_file_path = self._configuration_file_path
+        return app
+
+    async def _load(self, *extension_types: Type[Extension]) -> App:
+        with self._app() as app:
+            for extension_type in extension_types:
+                app.project.configuration.extensions.add(ExtensionConfiguration(extension_type))
+            await load(app)
+        return app
+
+    async def test_load_should_load_from_cache(self) -> None:
+        await self._load(_CacheableLoader)
+        app = await self._load(_CacheableLoader)
+        assert 1 == _CacheableLoader.load_count
+        assert 'P0' in app.project.ancestry.entities[Person]
+
+    async def test_load_with_changed_source_file_should_not_load_from_cache(self) -> None:
+        await self._load(_CacheableLoader)
+        _CacheableLoader.source_file_path.write_text('Some other source data.')
+        await self._load(_CacheableLoader)
+        assert 2 == _CacheableLoader.load_count
+
+    async def test_load_with_changed_configuration_should_not_load_from_cache(self) -> None:
+        await self._load(_CacheableLoader)
+        await self._load(_CacheableLoader, _DependsOnCacheableLoader)
+        assert 2 == _CacheableLoader.load_count
+
+    async def test_load_with_non_cacheable_loader_should_not_load_from_cache(self) -> None:
+        await self._load(_NonCacheableLoader)
+        await self._load(_NonCacheableLoader)
+        assert 2 == _NonCacheableLoader.load_count
+
+    async def test_load_with_existing_entities_should_not_load_from_cache(self) -> None:
+        await self._load(_CacheableLoader)
+        with self._app() as app:
+            app.project.configuration.extensions.add(ExtensionConfiguration(_CacheableLoader))
+            app.project.ancestry.entities.append(Person('P1'))
+            await load(app)
+        assert 2 == _CacheableLoader.load_count
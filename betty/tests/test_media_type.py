@@ -1,3 +1,4 @@
+import pickle
 from typing import Optional, List, Dict
 
 import pytest
@@ -38,3 +39,7 @@ class TestMediaType:
     def test_invalid_type_should_raise_error(self, media_type: str):
         with pytest.raises(InvalidMediaType):
             MediaType(media_type)
+
+    def test_pickle(self) -> None:
+        sut = MediaType('text/html; charset=UTF-8')
+        assert sut == pickle.loads(pickle.dumps(sut))
@@ -1,8 +1,12 @@
+import os
+import sys
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from unittest.mock import patch
 
-from betty.os import link_or_copy
+import pytest
+
+from betty.os import link_or_copy, makedirs, opener, copy, copytree
 
 
 class TestLinkOrCopy:
@@ -31,3 +35,106 @@ class TestLinkOrCopy:
             link_or_copy(source_path, destination_path)
             with open(destination_path) as f:
                 assert content == f.read()
+
+    def test_with_replace(self, tmp_path: Path):
+        source_path = tmp_path / 'source'
+        source_path.write_text('I will say zis only once.')
+        previous_source_path = tmp_path / 'previous-source'
+        previous_source_path.write_text('Listen very carefully.')
+        destination_path = tmp_path / 'destination'
+        link_or_copy(previous_source_path, destination_path)
+        link_or_copy(source_path, destination_path, replace=True)
+        assert 'I will say zis only once.' == destination_path.read_text()
+        assert 'Listen very carefully.' == previous_source_path.read_text()
+
+    def test_with_replace_and_same_file(self, tmp_path: Path):
+        source_path = tmp_path / 'source'
+        source_path.write_text('I will say zis only once.')
+        destination_path = tmp_path / 'destination'
+        link_or_copy(source_path, destination_path)
+        link_or_copy(source_path, destination_path, replace=True)
+        assert 'I will say zis only once.' == destination_path.read_text()
+
+    @pytest.mark.skipif(sys.platform == 'win32', reason='Windows does not support POSIX file permissions.')
+    def test_with_private_source(self, tmp_path: Path):
+        source_path = tmp_path / 'source'
+        source_path.write_text('I will say zis only once.')
+        source_path.chmod(0o600)
+        destination_path = tmp_path / 'destination'
+        previous_umask = os.umask(0o077)
+        try:
+            link_or_copy(source_path, destination_path)
+        finally:
+            os.umask(previous_umask)
+        assert 'I will say zis only once.' == destination_path.read_text()
+        assert not os.path.samefile(source_path, destination_path)
+        assert 0o644 == destination_path.stat().st_mode & 0o777
+        assert 0o600 == source_path.stat().st_mode & 0o777
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='Windows does not support POSIX file permissions.')
+class TestMakedirs:
+    def test(self, tmp_path: Path):
+        directory_path = tmp_path / 'parent' / 'directory'
+        previous_umask = os.umask(0o077)
+        try:
+            makedirs(directory_path)
+        finally:
+            os.umask(previous_umask)
+        assert 0o755 == directory_path.stat().st_mode & 0o777
+        assert 0o755 == directory_path.parent.stat().st_mode & 0o777
+
+    def test_with_existing_directory(self, tmp_path: Path):
+        directory_path = tmp_path / 'directory'
+        directory_path.mkdir(mode=0o700)
+        makedirs(directory_path)
+        assert 0o700 == directory_path.stat().st_mode & 0o777
+
+    def test_with_existing_file(self, tmp_path: Path):
+        file_path = tmp_path / 'file'
+        file_path.touch()
+        with pytest.raises(FileExistsError):
+            makedirs(file_path)
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='Windows does not support POSIX file permissions.')
+class TestOpener:
+    def test(self, tmp_path: Path):
+        file_path = tmp_path / 'file'
+        previous_umask = os.umask(0o077)
+        try:
+            with open(file_path, 'w', opener=opener) as f:
+                f.write('I will say zis only once.')
+        finally:
+            os.umask(previous_umask)
+        assert 'I will say zis only once.' == file_path.read_text()
+        assert 0o644 == file_path.stat().st_mode & 0o777
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='Windows does not support POSIX file permissions.')
+class TestCopy:
+    def test(self, tmp_path: Path):
+        source_path = tmp_path / 'source'
+        source_path.write_text('I will say zis only once.')
+        source_path.chmod(0o600)
+        os.utime(source_path, (0, 0))
+        destination_path = tmp_path / 'destination'
+        copy(source_path, destination_path)
+        assert 'I will say zis only once.' == destination_path.read_text()
+        assert 0o644 == destination_path.stat().st_mode & 0o777
+        assert 0 == destination_path.stat().st_mtime
+        assert 0o600 == source_path.stat().st_mode & 0o777
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='Windows does not support POSIX file permissions.')
+class TestCopytree:
+    def test(self, tmp_path: Path):
+        source_path = tmp_path / 'source'
+        (source_path / 'directory').mkdir(parents=True, mode=0o700)
+        (source_path / 'directory' / 'file').write_text('I will say zis only once.')
+        (source_path / 'directory' / 'file').chmod(0o600)
+        destination_path = tmp_path / 'destination'
+        copytree(source_path, destination_path)
+        assert 'I will say zis only once.' == (destination_path / 'directory' / 'file').read_text()
+        assert 0o755 == (destination_path / 'directory').stat().st_mode & 0o777
+        assert 0o644 == (destination_path / 'directory' / 'file').stat().st_mode & 0o777
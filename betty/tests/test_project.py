@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from pathlib import Path
 from typing import Type, Dict, Any
 
 import pytest
@@ -505,6 +506,20 @@ class TestEntityTypeConfigurationMapping(ConfigurationCollectionMappingTestBase)
 
 
 class TestProjectConfiguration:
+    def test_output_directory_path(self, tmp_path: Path) -> None:
+        sut = ProjectConfiguration()
+        sut.configuration_file_path = tmp_path / 'betty.json'
+        assert tmp_path / 'output' == sut.output_directory_path
+        assert tmp_path / 'output' / 'www' == sut.www_directory_path
+
+    def test_output_directory_path_with_override(self, tmp_path: Path) -> None:
+        sut = ProjectConfiguration()
+        sut.configuration_file_path = tmp_path / 'betty.json'
+        sut.output_directory_path = tmp_path / 'staging'
+        assert tmp_path / 'staging' / 'www' == sut.www_directory_path
+        del sut.output_directory_path
+        assert tmp_path / 'output' == sut.output_directory_path
+
     def test_base_url(self):
         sut = ProjectConfiguration()
         base_url = 'https://example.com'
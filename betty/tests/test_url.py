@@ -66,6 +66,19 @@ class TestLocalizedPathUrlGenerator:
             with app.acquire_locale('en'):
                 assert '/en/index.html' == sut.generate('/index.html', 'text/html')
 
+    def test_generate_after_configuration_change(self):
+        with App() as app:
+            sut = ContentNegotiationPathUrlGenerator(app)
+            assert '/index.html' == sut.generate('/index.html', 'text/html')
+            app.project.configuration.root_path = 'betty'
+            app.project.configuration.clean_urls = True
+            assert '/betty' == sut.generate('/index.html', 'text/html')
+            app.project.configuration.locales.replace([
+                LocaleConfiguration('nl-NL', 'nl'),
+                LocaleConfiguration('en-US', 'en'),
+            ])
+            assert '/betty/en' == sut.generate('/index.html', 'text/html')
+
 
 class EntityUrlGeneratorTestUrlyEntity(UserFacingEntity, Entity):
     pass
@@ -88,6 +101,10 @@ class TestEntityUrlGenerator:
                 sut.generate(EntityUrlGeneratorTestNonUrlyEntity(), 'text/html')
 
 
+class AppUrlGeneratorTestPerson(Person):
+    pass
+
+
 class TestAppUrlGenerator:
     @pytest.mark.parametrize('expected, resource', [
         ('/index.html', '/index.html'),
@@ -103,6 +120,11 @@ class TestAppUrlGenerator:
             sut = AppUrlGenerator(app)
             assert expected == sut.generate(resource, 'text/html')
 
+    def test_generate_with_entity_subclass(self):
+        with App() as app:
+            sut = AppUrlGenerator(app)
+            assert '/person/P1/index.html' == sut.generate(AppUrlGeneratorTestPerson('P1'), 'text/html')
+
     def test_generate_with_invalid_value(self):
         with App() as app:
             sut = AppUrlGenerator(app)
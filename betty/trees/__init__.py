@@ -1,7 +1,6 @@
 import logging
 import subprocess
 from pathlib import Path
-from shutil import copy2
 from typing import Optional, Set, Type, List, TYPE_CHECKING
 
 from betty.cache import CacheScope
@@ -10,9 +9,10 @@ if TYPE_CHECKING:
     from betty.builtins import _
 
 from betty.app.extension import Extension, UserFacingExtension
-from betty.generate import Generator
+from betty.generate import Generator, add_file
 from betty.html import CssProvider, JsProvider
 from betty.npm import _Npm, NpmBuilder, npm
+from betty.os import copy
 
 
 class Trees(UserFacingExtension, CssProvider, JsProvider, Generator, NpmBuilder):
@@ -27,8 +27,8 @@ class Trees(UserFacingExtension, CssProvider, JsProvider, Generator, NpmBuilder)
         logging.getLogger().info('Built the interactive family trees.')
 
     def _copy_npm_build(self, source_directory_path: Path, destination_directory_path: Path) -> None:
-        copy2(source_directory_path / 'trees.css', destination_directory_path / 'trees.css')
-        copy2(source_directory_path / 'trees.js', destination_directory_path / 'trees.js')
+        copy(source_directory_path / 'trees.css', destination_directory_path / 'trees.css')
+        copy(source_directory_path / 'trees.js', destination_directory_path / 'trees.js')
 
     @classmethod
     def npm_cache_scope(cls) -> CacheScope:
@@ -37,6 +37,8 @@ class Trees(UserFacingExtension, CssProvider, JsProvider, Generator, NpmBuilder)
     async def generate(self) -> None:
         assets_directory_path = await self.app.extensions[_Npm].ensure_assets(self)
         self._copy_npm_build(assets_directory_path, self.app.project.configuration.www_directory_path)
+        await add_file(self.app.project.configuration.www_directory_path / 'trees.css')
+        await add_file(self.app.project.configuration.www_directory_path / 'trees.js')
 
     @classmethod
     def assets_directory_path(cls) -> Optional[Path]:
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
-from contextlib import suppress
-from typing import Any, Optional, Type
+from typing import Any, Optional, Type, Dict, Tuple
 
 from betty.app import App
 from betty.locale import negotiate_locale
@@ -24,17 +23,18 @@ class StaticUrlGenerator:
 class ContentNegotiationPathUrlGenerator(ContentNegotiationUrlGenerator):
     def __init__(self, app: App):
         self._app = app
+        self._path_url_builder = _PathUrlBuilder(app.project.configuration)
 
     def generate(self, resource: Any, media_type: str, absolute: bool = False) -> str:
-        return _generate_from_path(self._app.project.configuration, resource, absolute, self._app.locale)
+        return self._path_url_builder.build(resource, absolute, self._app.locale)
 
 
 class StaticPathUrlGenerator(StaticUrlGenerator):
     def __init__(self, configuration: ProjectConfiguration):
-        self._configuration = configuration
+        self._path_url_builder = _PathUrlBuilder(configuration)
 
     def generate(self, resource: Any, absolute: bool = False, ) -> str:
-        return _generate_from_path(self._configuration, resource, absolute)
+        return self._path_url_builder.build(resource, absolute)
 
 
 class _EntityUrlGenerator(ContentNegotiationUrlGenerator):
@@ -42,11 +42,12 @@ class _EntityUrlGenerator(ContentNegotiationUrlGenerator):
         self._app = app
         self._entity_type = entity_type
         self._pattern = f'{camel_case_to_kebab_case(get_entity_type_name(entity_type))}/{{entity_id}}/index.{{extension}}'
+        self._path_url_builder = _PathUrlBuilder(app.project.configuration)
 
     def generate(self, entity: UserFacingEntity, media_type: str, absolute: bool = False) -> str:
         if not isinstance(entity, self._entity_type):
             raise ValueError('%s is not a %s' % (type(entity), self._entity_type))
-        return _generate_from_path(self._app.project.configuration, self._pattern.format(
+        return self._path_url_builder.build(self._pattern.format(
             entity_id=entity.id,
             extension=EXTENSIONS[media_type],
         ), absolute, self._app.locale)
@@ -54,26 +55,68 @@ class _EntityUrlGenerator(ContentNegotiationUrlGenerator):
 
 class AppUrlGenerator(ContentNegotiationUrlGenerator):
     def __init__(self, app: App):
-        self._generators = [
-            *(
-                _EntityUrlGenerator(app, entity_type)
-                for entity_type in app.entity_types
-                if issubclass(entity_type, UserFacingEntity)
-            ),
-            ContentNegotiationPathUrlGenerator(app),
-        ]
+        self._entity_url_generators: Dict[Type, Optional[_EntityUrlGenerator]] = {
+            entity_type: _EntityUrlGenerator(app, entity_type)
+            for entity_type in app.entity_types
+            if issubclass(entity_type, UserFacingEntity)
+        }
+        self._path_url_generator = ContentNegotiationPathUrlGenerator(app)
 
     def generate(self, resource: Any, media_type: str, absolute: bool = False) -> str:
-        for generator in self._generators:
-            with suppress(ValueError):
-                return generator.generate(resource, media_type, absolute)
-        raise ValueError('No URL generator found for %s.' % (
-            resource if isinstance(resource, str) else type(resource)))
+        if isinstance(resource, str):
+            return self._path_url_generator.generate(resource, media_type, absolute)
+        resource_type = type(resource)
+        try:
+            entity_url_generator = self._entity_url_generators[resource_type]
+        except KeyError:
+            entity_url_generator = self._entity_url_generators[resource_type] = self._get_entity_url_generator(resource_type)
+        if entity_url_generator is None:
+            raise ValueError('No URL generator found for %s.' % resource_type)
+        return entity_url_generator.generate(resource, media_type, absolute)
+
+    def _get_entity_url_generator(self, resource_type: Type) -> Optional[_EntityUrlGenerator]:
+        # Resources may be of subclasses of the entity types URLs can be generated for.
+        for ancestor_type in resource_type.__mro__[1:]:
+            entity_url_generator = self._entity_url_generators.get(ancestor_type)
+            if entity_url_generator is not None:
+                return entity_url_generator
+        return None
+
+
+class _PathUrlBuilder:
+    """
+    Build URLs from paths.
+
+    The base URL, root path, and locale alias of a URL depend on the project configuration only, so they are combined
+    into prefixes once, until the configuration changes.
+    """
+
+    def __init__(self, configuration: ProjectConfiguration):
+        self._configuration = configuration
+        self._prefixes: Dict[Tuple[bool, Optional[str]], str] = {}
+        self._clean_urls: Optional[bool] = None
+        configuration.react(self._clear)
+
+    def _clear(self) -> None:
+        self._prefixes.clear()
+        self._clean_urls = None
+
+    def build(self, path: str, absolute: bool = False, locale: Optional[str] = None) -> str:
+        if not isinstance(path, str):
+            raise ValueError('%s is not a string.' % type(path))
+        try:
+            prefix = self._prefixes[absolute, locale]
+        except KeyError:
+            prefix = self._prefixes[absolute, locale] = _build_prefix(self._configuration, absolute, locale)
+        if self._clean_urls is None:
+            self._clean_urls = self._configuration.clean_urls
+        url = prefix + path.strip('/')
+        if self._clean_urls and url.endswith('/index.html'):
+            url = url[:-10]
+        return url.rstrip('/')
 
 
-def _generate_from_path(configuration: ProjectConfiguration, path: str, absolute: bool = False, locale: Optional[str] = None) -> str:
-    if not isinstance(path, str):
-        raise ValueError('%s is not a string.' % type(path))
+def _build_prefix(configuration: ProjectConfiguration, absolute: bool, locale: Optional[str]) -> str:
     url = configuration.base_url if absolute else ''
     url += '/'
     if configuration.root_path:
@@ -95,7 +138,4 @@ def _generate_from_path(configuration: ProjectConfiguration, path: str, absolute
             except KeyError:
                 raise ValueError(f'Cannot generate URLs in "{locale}", because it cannot be resolved to any of the enabled project locales: {", ".join(project_locales)}')
         url += locale_configuration.alias + '/'
-    url += path.strip('/')
-    if configuration.clean_urls and url.endswith('/index.html'):
-        url = url[:-10]
-    return url.rstrip('/')
+    return url
@@ -150,10 +150,10 @@ class _Populator:
 
     async def populate(self) -> None:
         locales = set(map(lambda x: x.alias, self._app.project.configuration.locales))
-        await asyncio.gather(*[  # type: ignore
+        await asyncio.gather(*[
             self._populate_entity(entity, locales)
-            for entity  # type: ignore
-            in self._app.project.ancestry.entities
+            for entity
+            in self._app.project.ancestry.entities.iter_by_entity_types(HasLinks)
         ])
 
     async def _populate_entity(self, entity: Entity, locales: Set[str]) -> None:
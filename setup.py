@@ -60,6 +60,9 @@ SETUP = {
         'typing_extensions ~= 4.4.0; python_version < "3.11"',
     ],
     'extras_require': {
+        'brotli': [
+            'brotli ~= 1.0',
+        ],
         'development': [
             'aioresponses ~= 0.7.3',
             'autopep8 ~= 2.0.0',
@@ -97,6 +100,7 @@ SETUP = {
         'betty.extensions': [
             'betty.anonymizer.Anonymizer=betty.anonymizer.Anonymizer',
             'betty.cleaner.Cleaner=betty.cleaner.Cleaner',
+            'betty.compressor.Compressor=betty.compressor.Compressor',
             'betty.cotton_candy.CottonCandy=betty.cotton_candy.CottonCandy',
             'betty.demo.Demo=betty.demo.Demo',
             'betty.deriver.Deriver=betty.deriver.Deriver',